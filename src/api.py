@@ -1,9 +1,27 @@
+import atexit
 import psycopg2
+import threading
 import time
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+from werkzeug.exceptions import BadRequest
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
+from db_pool import ConnectionPool, PoolTimeout
+from dedup import DedupWindow, DuplicateCheckin, seq_verdict
+from device_cache import (DeviceState, DeviceStateCache, RedisDeviceStateCache,
+                          LastSeenCoalescer, CacheInvalidationListener, INVALIDATE_CHANNEL)
+from flap_detector import FlapDetector
+from fleet_summary import FleetSummary
+from ingest_queue import IngestQueue, QueueFull
+from staleness import HEARTBEAT_TIMEOUTS, DEFAULT_TIMEOUT as HEARTBEAT_DEFAULT_TIMEOUT, StalenessWatchdog
+import codec
+import ingest
+import events
+import history_export
+import partition_maintenance
+import rollup
+
 # --- KONFIGURASI DATABASE ---
 PG_HOST = "localhost"
 PG_PORT = 5432
@@ -12,6 +30,97 @@ PG_PASSWORD = "v1r"  # Ganti sesuai password Anda
 PG_DATABASE = "hospital_iot_db"  # Ganti sesuai nama database Anda
 # ----------------------------
 
+# --- KONFIGURASI CONNECTION POOL ---
+POOL_MIN_CONN = 2        # koneksi yang langsung dibuka saat startup
+POOL_MAX_CONN = 20       # batas atas koneksi bersamaan (sesuaikan dengan max_connections)
+POOL_TIMEOUT = 5         # detik menunggu koneksi bebas sebelum request ditolak (503)
+POOL_RECYCLE = 1800      # detik umur maksimum satu koneksi sebelum dibuat ulang
+POOL_HEALTH_CHECK = 30   # koneksi yang idle lebih lama dari ini dicek dulu dengan SELECT 1
+# ----------------------------
+
+# Batas jumlah item dalam satu request /api/v1/checkin/batch
+BATCH_MAX_ITEMS = 1000
+
+# Kamus pesan tambahan untuk payload ringkas (array JSON string); None = kamus bawaan codec.py
+CODEC_MESSAGE_FILE = None
+
+# --- KONFIGURASI MODE HISTORY ---
+# "all"     : setiap check-in menjadi satu baris device_history (perilaku lama)
+# "changes" : hanya transisi status/message yang menjadi baris baru; heartbeat
+#             yang sama cukup memperbarui last_seen & heartbeat_count run terakhir
+HISTORY_MODE = "all"
+# ----------------------------
+
+# --- KONFIGURASI PARTISI DEVICE_HISTORY ---
+PARTITION_GRANULARITY = "daily"      # "daily" atau "monthly"
+PARTITION_AHEAD = 7                  # jumlah partisi mendatang yang selalu disiapkan
+HISTORY_RETENTION_DAYS = 90          # partisi yang lebih tua dari ini dilepas; 0 = simpan semua
+PARTITION_DETACH_ONLY = False        # True: partisi kedaluwarsa hanya di-detach (arsip), tidak di-drop
+PARTITION_MAINTENANCE_INTERVAL = 3600  # detik antar putaran pemeliharaan di background
+# ----------------------------
+
+# --- KONFIGURASI ROLLUP ---
+ROLLUP_INTERVAL = 60                 # detik antar refresh rollup menit/jam/hari
+ROLLUP_DELAY = 60                    # detik terakhir yang belum di-rollup (check-in dalam perjalanan)
+ROLLUP_MINUTE_RETENTION_HOURS = 48   # rollup per menit hanya untuk tepi laporan
+ROLLUP_HOUR_RETENTION_DAYS = 90
+TIMELINE_DEFAULT_POINTS = 300        # jumlah bucket default endpoint timeline
+TIMELINE_MAX_POINTS = 2000
+EXPORT_BATCH_SIZE = 5000             # baris per batch ekspor device_history
+EXPORT_POOL_MAX_CONN = 2             # ekspor bersamaan; lebih dari ini dijawab 503
+# ----------------------------
+
+# --- KONFIGURASI RINGKASAN FLEET ---
+SUMMARY_RELOAD_INTERVAL = 600    # detik; muat ulang penuh berkala (mis. device yang dihapus)
+# ----------------------------
+
+# --- KONFIGURASI IDEMPOTENSI CHECK-IN ---
+# Check-in boleh membawa "seq" (naik per device) dan/atau "idempotency_key"
+# (atau header Idempotency-Key); retry duplikat dan update basi tidak ditulis ulang.
+CHECKIN_SEQ_WINDOW = 300         # detik; seq lebih kecil diterima lagi setelah device diam selama ini
+IDEMPOTENCY_KEY_TTL = 86400      # detik kunci idempotensi disimpan di checkin_idempotency
+DEDUP_MAX_DEVICES = 200000       # entri seq terakhir di memori (LRU)
+DEDUP_MAX_KEYS = 200000          # entri kunci idempotensi di memori (LRU)
+# ----------------------------
+
+# --- KONFIGURASI DETEKSI FLAPPING TICKET ---
+# Debounce 0 dan FLAP_HIGH sangat besar = perilaku lama (buka/tutup ticket seketika)
+TICKET_OPEN_DEBOUNCE = 30        # detik error/offline bertahan sebelum ticket dibuka
+TICKET_RESOLVE_DEBOUNCE = 60     # detik online bertahan sebelum ticket ditutup
+FLAP_WINDOW = 600                # detik jendela penghitungan perpindahan status
+FLAP_HIGH = 6                    # perpindahan dalam jendela -> device dianggap flapping
+FLAP_LOW = 2                     # ...dan berhenti flapping saat turun ke angka ini
+FLAP_QUIET = 300                 # detik online tenang sebelum ticket device flapping ditutup
+# ----------------------------
+
+# --- KONFIGURASI WATCHDOG HEARTBEAT ---
+# Device yang tidak check-in melewati timeout kategorinya ditandai offline oleh server
+STALENESS_ENABLED = True
+STALENESS_TICK = 1.0                 # detik antar pemeriksaan deadline
+STALENESS_RELOAD_INTERVAL = 600      # detik; gabungkan ulang isi tabel devices berkala
+# Timeout per kategori: HEARTBEAT_TIMEOUTS di staleness.py (satu definisi, di-import di atas)
+# ----------------------------
+
+# --- KONFIGURASI CACHE STATUS DEVICE ---
+# Heartbeat dengan status & message yang sama seperti cache dilayani lewat jalur cepat:
+# tanpa upsert devices dan tanpa query ticket; last_seen digabung dan ditulis per interval.
+DEVICE_CACHE_ENABLED = True
+DEVICE_CACHE_TTL = 300           # detik; batas atas umur entri jika invalidasi terlewat
+DEVICE_CACHE_REDIS_URL = None    # mis. "redis://localhost:6379/0" untuk cache bersama antar worker
+LAST_SEEN_FLUSH_INTERVAL = 1.0   # detik antar penulisan last_seen gabungan
+# ----------------------------
+
+# --- KONFIGURASI MODE INGEST ---
+# "sync"  : setiap check-in langsung di-commit sebelum response (default)
+# "queue" : check-in masuk antrian in-process dan ditulis per batch (group commit),
+#           response 202 dikirim tanpa menunggu fsync database
+INGEST_MODE = "sync"
+QUEUE_MAX_SIZE = 10000        # kapasitas antrian; jika penuh API menjawab 429
+QUEUE_FLUSH_SIZE = 500        # flush saat batch mencapai jumlah ini
+QUEUE_FLUSH_INTERVAL = 0.2    # ...atau paling lambat sekian detik setelah item pertama
+QUEUE_RETRY_AFTER = 1         # nilai header Retry-After (detik) saat antrian penuh
+# ----------------------------
+
 # Zona waktu lokal (Asia/Jakarta = WIB)
 LOCAL_TZ = ZoneInfo("Asia/Jakarta")
 
@@ -22,17 +131,105 @@ def local_timestamp():
 # Inisialisasi aplikasi Flask
 app = Flask(__name__)
 
+# Kamus pesan untuk check-in ringkas (indeks message -> teks), sama dengan /api/v1/codec
+checkin_messages = codec.load_messages(CODEC_MESSAGE_FILE)
+
+# Pool koneksi bersama untuk init_db, endpoint check-in, dan helper ticket.
+# Timezone sesi diatur lewat options agar setiap koneksi di pool memakai Asia/Jakarta.
+db_pool = ConnectionPool(
+    minconn=POOL_MIN_CONN,
+    maxconn=POOL_MAX_CONN,
+    timeout=POOL_TIMEOUT,
+    recycle=POOL_RECYCLE,
+    health_check_after=POOL_HEALTH_CHECK,
+    host=PG_HOST,
+    port=PG_PORT,
+    user=PG_USER,
+    password=PG_PASSWORD,
+    database=PG_DATABASE,
+    options="-c timezone=Asia/Jakarta",
+)
+
+PG_CONN_KWARGS = dict(host=PG_HOST, port=PG_PORT, user=PG_USER,
+                      password=PG_PASSWORD, database=PG_DATABASE)
+
+# Pool kecil terpisah untuk ekspor history: stream yang panjang tidak memakai koneksi
+# check-in, dan koneksinya dipakai ulang antar request ekspor (tanpa connect per request).
+export_pool = ConnectionPool(
+    minconn=0,
+    maxconn=EXPORT_POOL_MAX_CONN,
+    timeout=POOL_TIMEOUT,
+    recycle=POOL_RECYCLE,
+    health_check_after=POOL_HEALTH_CHECK,
+    options="-c timezone=Asia/Jakarta",
+    **PG_CONN_KWARGS,
+)
+
+# Cache status device + penulis last_seen gabungan untuk jalur cepat heartbeat
+if DEVICE_CACHE_REDIS_URL:
+    device_cache = RedisDeviceStateCache(DEVICE_CACHE_REDIS_URL, ttl=DEVICE_CACHE_TTL)
+else:
+    device_cache = DeviceStateCache(ttl=DEVICE_CACHE_TTL)
+last_seen_writer = LastSeenCoalescer(db_pool, interval=LAST_SEEN_FLUSH_INTERVAL)
+cache_listener = CacheInvalidationListener(device_cache, PG_CONN_KWARGS)
+
+# Saringan retry di memori; devices.last_seq & checkin_idempotency tetap penjaga akhirnya
+dedup_window = DedupWindow(seq_window=CHECKIN_SEQ_WINDOW, key_ttl=IDEMPOTENCY_KEY_TTL,
+                           max_devices=DEDUP_MAX_DEVICES, max_keys=DEDUP_MAX_KEYS)
+
+def log_resolved(items, created, resolved):
+    for ticket_id, device_id in resolved:
+        print(f"✅ Auto-resolved ticket: {ticket_id} for device: {device_id}")
+
+def forget_dropped(items):
+    """Check-in antrian yang dibuang writer boleh dikirim ulang oleh gateway."""
+    for i in items:
+        dedup_window.forget(i['device_id'], i.get('seq'), i.get('idempotency_key'))
+
+def after_batch_written(items, created, resolved):
+    """Dipanggil setelah batch (sinkron maupun dari antrian) ter-commit."""
+    # Batch menulis devices/tickets langsung, jadi entri cache device tersebut dibuang.
+    # Item yang ditolak filter_duplicates (duplikat/basi) tidak menulis apa pun:
+    # cache-nya tetap berlaku dan device tetap di jalur cepat
+    device_cache.invalidate_many({i['device_id'] for i in items if 'rejected' not in i})
+    log_resolved(items, created, resolved)
+
+# Deteksi flapping: kapan ticket dibuka/ditutup (debounce + histeresis) diputuskan
+# dari state di memori yang baru diubah setelah transaksi check-in ter-commit.
+flap_detector = FlapDetector(
+    open_debounce=TICKET_OPEN_DEBOUNCE,
+    resolve_debounce=TICKET_RESOLVE_DEBOUNCE,
+    flap_window=FLAP_WINDOW,
+    flap_high=FLAP_HIGH,
+    flap_low=FLAP_LOW,
+    flap_quiet=FLAP_QUIET,
+)
+
+# Antrian write-behind (hanya dipakai jika INGEST_MODE = "queue")
+ingest_queue = IngestQueue(
+    db_pool,
+    now_fn=local_timestamp,
+    maxsize=QUEUE_MAX_SIZE,
+    flush_size=QUEUE_FLUSH_SIZE,
+    flush_interval=QUEUE_FLUSH_INTERVAL,
+    history_mode=HISTORY_MODE,
+    on_flushed=after_batch_written,
+    on_dropped=forget_dropped,
+    flap_detector=flap_detector,
+    seq_window=CHECKIN_SEQ_WINDOW,
+)
+
+def queue_full_response(e):
+    print(f"Antrian ingest penuh: {e}")
+    resp = jsonify({"error": "Antrian check-in penuh, coba lagi"})
+    resp.headers['Retry-After'] = str(QUEUE_RETRY_AFTER)
+    return resp, 429
+
 # --- (A) Inisialisasi Database ---
 def init_db():
     print("Menghubungkan ke database PostgreSQL...")
     try:
-        conn = psycopg2.connect(
-            host=PG_HOST,
-            port=PG_PORT,
-            user=PG_USER,
-            password=PG_PASSWORD,
-            database=PG_DATABASE
-        )
+        conn = db_pool.getconn()
         cursor = conn.cursor()
 
         # Pastikan timezone database diatur ke Asia/Jakarta
@@ -48,28 +245,49 @@ def init_db():
         )
         ''')
 
-        # Tabel device_history
+        # Tabel device_history: partisi RANGE per periode pada kolom timestamp.
+        # Jika tabel lama (non-partisi) sudah ada, CREATE di bawah tidak berpengaruh;
+        # migrasikan dengan `python partition_maintenance.py --migrate`.
+        cursor.execute(partition_maintenance.CREATE_PARENT_SQL)
+
+        # Setiap baris history adalah satu "run" status: last_seen = heartbeat terakhir
+        # dalam run tersebut, heartbeat_count = jumlah check-in yang tergabung
         cursor.execute('''
-        CREATE TABLE IF NOT EXISTS device_history (
-            id SERIAL PRIMARY KEY,
-            device_id TEXT NOT NULL,
-            timestamp BIGINT NOT NULL,
-            status TEXT NOT NULL,
-            message TEXT,
-            created_at TIMESTAMP WITH TIME ZONE DEFAULT (now() AT TIME ZONE 'Asia/Jakarta')
-        )
+        ALTER TABLE device_history
+            ADD COLUMN IF NOT EXISTS last_seen BIGINT,
+            ADD COLUMN IF NOT EXISTS heartbeat_count INTEGER NOT NULL DEFAULT 1
         ''')
 
-        # Index
+        # Nomor urut check-in terakhir per device + kunci idempotensi (penjaga retry)
+        cursor.execute("ALTER TABLE devices ADD COLUMN IF NOT EXISTS last_seq BIGINT")
+
+        # Waktu tulis terakhir baris devices (check-in, heartbeat, flip watchdog); dipakai
+        # dashboard sebagai high-water mark delta fetch. Flip watchdog tidak mengubah
+        # last_seen, jadi last_seen tidak bisa menjadi penanda perubahan.
+        cursor.execute("ALTER TABLE devices ADD COLUMN IF NOT EXISTS row_updated_at BIGINT")
+        cursor.execute("UPDATE devices SET row_updated_at = last_seen WHERE row_updated_at IS NULL")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_row_updated ON devices(row_updated_at)")
         cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_history_device_id 
-        ON device_history(device_id)
+        CREATE TABLE IF NOT EXISTS checkin_idempotency (
+            device_id TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            created_at BIGINT NOT NULL,
+            PRIMARY KEY (device_id, idempotency_key)
+        )
         ''')
         cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_history_timestamp 
-        ON device_history(timestamp DESC)
+        CREATE INDEX IF NOT EXISTS idx_checkin_idempotency_created
+        ON checkin_idempotency(created_at)
         ''')
 
+        # Index (pada tabel partisi otomatis diturunkan ke setiap partisi)
+        for index_sql in partition_maintenance.CREATE_INDEXES_SQL:
+            cursor.execute(index_sql)
+
+        if not partition_maintenance.is_partitioned(cursor):
+            print("⚠️ device_history masih tabel biasa (non-partisi). "
+                  "Jalankan 'python partition_maintenance.py --migrate' untuk migrasi.")
+
         # Tabel tickets
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS tickets (
@@ -87,6 +305,14 @@ def init_db():
         )
         ''')
 
+        # Nomor urut ticket_id (TKT-timestamp-nomor)
+        cursor.execute("CREATE SEQUENCE IF NOT EXISTS ticket_seq")
+
+        # Jumlah pantulan (flapping) yang digabung ke satu ticket
+        cursor.execute('''
+        ALTER TABLE tickets ADD COLUMN IF NOT EXISTS flap_count INTEGER NOT NULL DEFAULT 0
+        ''')
+
         cursor.execute('''
         CREATE INDEX IF NOT EXISTS idx_tickets_device_id 
         ON tickets(device_id)
@@ -95,11 +321,39 @@ def init_db():
         CREATE INDEX IF NOT EXISTS idx_tickets_active 
         ON tickets(is_active)
         ''')
+        # Dashboard mengambil ticket yang berubah sejak high-water mark updated_at
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tickets_updated 
+        ON tickets(updated_at)
+        ''')
+
+        # Maksimal satu ticket aktif per device. Duplikat lama (hasil race sebelum
+        # index ini ada) ditutup dulu, hanya ticket aktif terbaru yang dipertahankan.
+        cursor.execute('''
+        UPDATE tickets t
+        SET is_active = FALSE, status = 'resolved',
+            resolved_at = t.updated_at, updated_at = t.updated_at
+        WHERE t.is_active = TRUE AND EXISTS (
+            SELECT 1 FROM tickets n
+            WHERE n.device_id = t.device_id AND n.is_active = TRUE
+              AND (n.created_at, n.ticket_id) > (t.created_at, t.ticket_id)
+        )
+        ''')
+        cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS uniq_tickets_active_device 
+        ON tickets(device_id) WHERE is_active = TRUE
+        ''')
+
+        # Tabel & function rollup (device_rollup_minute/_hour/_day)
+        rollup.ensure_rollup_schema(conn)
 
         conn.commit()
         cursor.close()
-        conn.close()
+        db_pool.putconn(conn)
+        maintain_partitions()
+        db_pool.warm()
         print(f"Database '{PG_DATABASE}' siap digunakan (zona waktu Asia/Jakarta).")
+        print(f"Connection pool aktif: {POOL_MIN_CONN}-{POOL_MAX_CONN} koneksi.")
 
     except psycopg2.OperationalError as e:
         print(f"GAGAL terhubung ke PostgreSQL: {e}")
@@ -108,110 +362,419 @@ def init_db():
         print(f"Error saat inisialisasi database: {e}")
         exit(1)
 
+# --- (A2) Pemeliharaan partisi device_history ---
+def maintain_partitions():
+    with db_pool.connection() as conn:
+        created, expired = partition_maintenance.run_maintenance(
+            conn,
+            ahead=PARTITION_AHEAD,
+            retention_days=HISTORY_RETENTION_DAYS,
+            granularity=PARTITION_GRANULARITY,
+            drop=not PARTITION_DETACH_ONLY,
+        )
+    if created:
+        print(f"Partisi device_history dibuat: {', '.join(created)}")
+    if expired:
+        print(f"Partisi device_history kedaluwarsa dilepas: {', '.join(expired)}")
+
+def purge_idempotency_keys():
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM checkin_idempotency WHERE created_at < %s",
+                       (local_timestamp() - IDEMPOTENCY_KEY_TTL,))
+        conn.commit()
+        cursor.close()
+
+def partition_maintenance_loop():
+    while True:
+        time.sleep(PARTITION_MAINTENANCE_INTERVAL)
+        try:
+            maintain_partitions()
+        except Exception as e:
+            print(f"Pemeliharaan partisi gagal: {e}")
+        try:
+            purge_idempotency_keys()
+        except Exception as e:
+            print(f"Pembersihan kunci idempotensi gagal: {e}")
+
+# --- (A3) Refresh rollup status perangkat ---
+def refresh_rollups():
+    with db_pool.connection() as conn:
+        return rollup.refresh_rollups(
+            conn,
+            delay=ROLLUP_DELAY,
+            minute_retention_hours=ROLLUP_MINUTE_RETENTION_HOURS,
+            hour_retention_days=ROLLUP_HOUR_RETENTION_DAYS,
+        )
+
+def rollup_loop():
+    while True:
+        try:
+            refresh_rollups()
+        except Exception as e:
+            print(f"Refresh rollup gagal: {e}")
+        time.sleep(ROLLUP_INTERVAL)
+
+# --- (A4) Ringkasan fleet di memori ---
+# Dimuat penuh saat start, saat listener event (re)connect, dan setiap
+# SUMMARY_RELOAD_INTERVAL detik; di antaranya diperbarui per event check-in.
+fleet_summary = FleetSummary()
+fleet_summary_reload = threading.Event()
+
+def on_fleet_event(event):
+    if event is None:
+        fleet_summary_reload.set()
+        staleness_reload.set()
+    else:
+        fleet_summary.apply_event(event)
+        flap_detector.apply_event(event)
+        if event['type'] == 'status':
+            # Device baru / transisi dari worker lain ikut diawasi watchdog
+            watchdog.touch(event['device_id'], local_timestamp(), event['status'])
+
+summary_listener = events.EventListener(PG_CONN_KWARGS, on_event=on_fleet_event)
+
+def fleet_summary_loop():
+    while True:
+        try:
+            with db_pool.connection() as conn:
+                fleet_summary.reload(conn)
+                flap_detector.reload(conn)
+        except Exception as e:
+            print(f"Muat ulang ringkasan fleet gagal: {e}")
+        fleet_summary_reload.wait(SUMMARY_RELOAD_INTERVAL)
+        fleet_summary_reload.clear()
+
+# --- (A5) Watchdog heartbeat ---
+# Deadline per device di heap (staleness.py); tick hanya memeriksa yang jatuh tempo.
+watchdog = StalenessWatchdog(timeouts=HEARTBEAT_TIMEOUTS, default_timeout=HEARTBEAT_DEFAULT_TIMEOUT)
+staleness_reload = threading.Event()
+
+def staleness_loop():
+    next_reload = 0
+    while True:
+        try:
+            if staleness_reload.is_set() or time.monotonic() >= next_reload:
+                staleness_reload.clear()
+                with db_pool.connection() as conn:
+                    watchdog.load(conn)
+                next_reload = time.monotonic() + STALENESS_RELOAD_INTERVAL
+            with db_pool.connection() as conn:
+                watchdog.check(conn, mark_device_offline, now=local_timestamp())
+        except Exception as e:
+            print(f"Watchdog heartbeat gagal: {e}")
+        time.sleep(STALENESS_TICK)
+
 # --- (B) Auto-create Ticket ---
-def create_ticket_if_needed(conn, device_id, status, message):
+# Satu statement atomik: INSERT ticket baru, atau jika device sudah punya ticket
+# aktif (partial unique index uniq_tickets_active_device) cukup perbarui ticket itu.
+# Check-in bersamaan untuk device yang sama tidak bisa lagi membuka ticket ganda.
+# flap_count hanya bisa naik: detektor di worker lain bisa punya hitungan lebih kecil.
+def create_ticket_if_needed(conn, device_id, status, message, notify=None, flap_count=0):
     if status not in ['error', 'offline']:
         return None
 
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT ticket_id FROM tickets 
-        WHERE device_id = %s AND is_active = TRUE
-        LIMIT 1
-    ''', (device_id,))
-    existing_ticket = cursor.fetchone()
-
     now = local_timestamp()
-    if existing_ticket:
-        cursor.execute('''
-            UPDATE tickets 
-            SET updated_at = %s, message = %s
-            WHERE ticket_id = %s
-        ''', (now, message, existing_ticket[0]))
-        cursor.close()
-        return existing_ticket[0]
-
-    ticket_id = f"TKT-{now}-{device_id[-4:]}"
     issue_type = 'ERROR' if status == 'error' else 'OFFLINE'
 
+    # ticket_id dari sequence ticket_seq: unik walau device berakhiran sama dibuka bersamaan
+    cursor = conn.cursor()
     cursor.execute('''
         INSERT INTO tickets 
-        (ticket_id, device_id, status, issue_type, message, created_at, updated_at, is_active)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, TRUE)
-    ''', (ticket_id, device_id, status, issue_type, message, now, now))
+        (ticket_id, device_id, status, issue_type, message, created_at, updated_at, is_active, flap_count)
+        VALUES ('TKT-' || %s::BIGINT || '-' || nextval('ticket_seq'), %s, %s, %s, %s, %s, %s, TRUE, %s)
+        ON CONFLICT (device_id) WHERE is_active = TRUE DO UPDATE
+        SET updated_at = EXCLUDED.updated_at, message = EXCLUDED.message,
+            flap_count = GREATEST(tickets.flap_count, EXCLUDED.flap_count)
+        RETURNING ticket_id, (xmax = 0) AS inserted
+    ''', (now, device_id, status, issue_type, message, now, now, flap_count))
+    ticket_id, inserted = cursor.fetchone()
+    if inserted and notify is not None:
+        notify.append(events.ticket_opened_event(device_id, ticket_id, issue_type))
 
     cursor.close()
     return ticket_id
 
 # --- (C) Auto-resolve Ticket ---
-def resolve_ticket_if_needed(conn, device_id, status):
+def resolve_ticket_if_needed(conn, device_id, status, notify=None):
     if status != 'online':
         return
 
+    now = local_timestamp()
     cursor = conn.cursor()
     cursor.execute('''
-        SELECT ticket_id FROM tickets 
+        UPDATE tickets 
+        SET is_active = FALSE, 
+            resolved_at = %s,
+            updated_at = %s,
+            status = 'resolved'
         WHERE device_id = %s AND is_active = TRUE
-    ''', (device_id,))
-    active_tickets = cursor.fetchall()
+        RETURNING ticket_id
+    ''', (now, now, device_id))
+    for ticket in cursor.fetchall():
+        print(f"✅ Auto-resolved ticket: {ticket[0]} for device: {device_id}")
+        if notify is not None:
+            notify.append(events.ticket_resolved_event(device_id, ticket[0]))
 
-    now = local_timestamp()
-    for ticket in active_tickets:
+    cursor.close()
+
+# --- (C2) Catat ke device_history ---
+# Mengembalikan key (id, timestamp) baris history (run) yang ditulis/diperpanjang.
+# timestamp ikut dipakai agar UPDATE langsung diarahkan ke satu partisi.
+def record_history(cursor, device_id, last_seen, status, message):
+    if HISTORY_MODE == "changes":
+        # Heartbeat tanpa perubahan: perpanjang run terakhir, tidak ada baris baru
         cursor.execute('''
-            UPDATE tickets 
-            SET is_active = FALSE, 
-                resolved_at = %s,
-                updated_at = %s,
-                status = 'resolved'
-            WHERE ticket_id = %s
-        ''', (now, now, ticket[0]))
-        print(f"✅ Auto-resolved ticket: {ticket[0]} for device: {device_id}")
+            UPDATE device_history
+            SET last_seen = %s, heartbeat_count = heartbeat_count + 1
+            WHERE (id, timestamp) = (
+                SELECT id, timestamp FROM device_history
+                WHERE device_id = %s
+                ORDER BY timestamp DESC, id DESC
+                LIMIT 1
+            )
+            AND status = %s AND message IS NOT DISTINCT FROM %s
+            RETURNING id, timestamp
+        ''', (last_seen, device_id, status, message))
+        row = cursor.fetchone()
+        if row:
+            return tuple(row)
+
+    cursor.execute('''
+        INSERT INTO device_history (device_id, timestamp, status, message, last_seen)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id, timestamp
+    ''', (device_id, last_seen, status, message, last_seen))
+    return tuple(cursor.fetchone())
+
+# --- (C3) Jalur cepat heartbeat ---
+# Status & message sama dengan cache: ticket tidak mungkin berubah, devices cukup
+# bump last_seen (digabung). Pada mode "changes" history pun cukup diperpanjang
+# lewat penulis gabungan; pada mode "all" baris history tetap di-insert.
+# Check-in dengan seq tetap melewati penjaga last_seq di database (UPDATE bersyarat)
+# sebelum history ditulis: retry yang mengenai worker lain, atau yang entri LRU-nya
+# sudah terbuang, ditolak dengan DuplicateCheckin tanpa baris history ganda.
+def fast_path_checkin(state, device_id, last_seen, status, message, seq=None):
+    if seq is None and HISTORY_MODE == "changes" and state.history_key is not None:
+        last_seen_writer.bump(device_id, last_seen, state.history_key)
+        return state.ticket_id
+
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        if seq is not None:
+            cursor.execute('''
+                UPDATE devices SET last_seen = GREATEST(last_seen, %s), last_seq = %s,
+                    row_updated_at = GREATEST(row_updated_at, %s)
+                WHERE device_id = %s
+                  AND (last_seq IS NULL OR last_seq < %s OR last_seen < %s - %s)
+                RETURNING 1
+            ''', (last_seen, seq, last_seen, device_id, seq, last_seen, CHECKIN_SEQ_WINDOW))
+            if cursor.fetchone() is None:
+                cursor.execute("SELECT last_seq, last_seen FROM devices WHERE device_id = %s",
+                               (device_id,))
+                row = cursor.fetchone()
+                if row is not None:
+                    raise DuplicateCheckin(seq_verdict(seq, row[0], row[1], last_seen,
+                                                       CHECKIN_SEQ_WINDOW) or "stale", row[0])
+        if HISTORY_MODE == "changes" and state.history_key is not None:
+            conn.commit()
+            cursor.close()
+            last_seen_writer.bump(device_id, last_seen, state.history_key)
+            return state.ticket_id
+        history_key = record_history(cursor, device_id, last_seen, status, message)
+        conn.commit()
+        cursor.close()
+    if seq is None:
+        last_seen_writer.bump(device_id, last_seen)
+    device_cache.set(device_id, state._replace(history_key=history_key))
+    return state.ticket_id
+
+# --- (C4) Transaksi check-in ---
+# Dipakai endpoint check-in dan watchdog heartbeat. Caller yang melakukan commit.
+# recorded_at = waktu baris history (default last_seen); devices.last_seen tetap last_seen.
+# Ticket dibuka/ditutup menurut keputusan flaps (flap_detector.begin()); force_ticket
+# melewati debounce buka. Caller memanggil flaps.commit() setelah conn.commit().
+# Retry (seq tidak naik / kunci idempotensi sudah ada) melempar DuplicateCheckin sebelum
+# ada yang ditulis; transaksi di-rollback saat koneksi kembali ke pool.
+def checkin_transaction(conn, device_id, status, message, last_seen, flaps, recorded_at=None,
+                        force_ticket=False, seq=None, idempotency_key=None):
+    cursor = conn.cursor()
+
+    if idempotency_key is not None:
+        cursor.execute('''
+            INSERT INTO checkin_idempotency (device_id, idempotency_key, created_at)
+            VALUES (%s, %s, %s)
+            ON CONFLICT DO NOTHING
+            RETURNING 1
+        ''', (device_id, idempotency_key, last_seen))
+        if cursor.fetchone() is None:
+            raise DuplicateCheckin("duplicate")
+
+    # Update devices; CTE prev membaca status sebelum upsert untuk deteksi transisi.
+    # Upsert bersyarat: seq yang tidak lebih besar dari last_seq (dalam jendela) dilewati.
+    # row_updated_at = waktu tulis (recorded_at untuk flip watchdog) agar delta dashboard melihatnya.
+    upsert_query = """
+    WITH prev AS (SELECT status FROM devices WHERE device_id = %s)
+    INSERT INTO devices (device_id, last_seen, status, message, last_seq, row_updated_at)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (device_id) DO UPDATE SET
+        last_seen = EXCLUDED.last_seen,
+        status = EXCLUDED.status,
+        message = EXCLUDED.message,
+        last_seq = COALESCE(EXCLUDED.last_seq, devices.last_seq),
+        row_updated_at = EXCLUDED.row_updated_at
+    WHERE EXCLUDED.last_seq IS NULL OR devices.last_seq IS NULL
+       OR EXCLUDED.last_seq > devices.last_seq
+       OR devices.last_seen < EXCLUDED.last_seen - %s
+    RETURNING (SELECT status FROM prev);
+    """
+    cursor.execute(upsert_query, (device_id, device_id, last_seen, status, message, seq,
+                                  recorded_at or last_seen, CHECKIN_SEQ_WINDOW))
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute("SELECT last_seq, last_seen FROM devices WHERE device_id = %s", (device_id,))
+        last_seq, previous_seen = cursor.fetchone()
+        raise DuplicateCheckin(seq_verdict(seq, last_seq, previous_seen, last_seen,
+                                           CHECKIN_SEQ_WINDOW) or "stale", last_seq)
+    previous_status = row[0]
+
+    # Tambah ke device_history
+    history_key = record_history(cursor, device_id, recorded_at or last_seen, status, message)
+
+    notify = []
+    if previous_status != status:
+        notify.append(events.status_event(device_id, status, previous_status))
+    ticket_id = None
+    decision = flaps.observe(device_id, status, recorded_at or last_seen, force=force_ticket)
+    if decision.action == "ticket":
+        ticket_id = create_ticket_if_needed(conn, device_id, status, message, notify,
+                                            decision.flap_count)
+        flaps.ticket_opened(device_id, ticket_id)
+    elif decision.action == "resolve":
+        # Ditutup per device_id (partial index ticket aktif), bukan per ticket_id di cache
+        resolve_ticket_if_needed(conn, device_id, status, notify)
+        flaps.ticket_resolved(device_id)
 
+    # NOTIFY ikut transaksi: dashboard hanya menerima event yang ter-commit
+    events.notify_events(cursor, notify)
     cursor.close()
+    return ticket_id, history_key
+
+# --- (C5) Penandaan offline oleh watchdog ---
+# Dipanggil dengan baris devices sudah terkunci. last_seen device tidak diubah;
+# baris history memakai waktu deteksi agar tidak jatuh di belakang watermark rollup.
+def mark_device_offline(conn, device_id, last_seen, now):
+    message = f"Heartbeat Timeout ({now - last_seen}s)"
+    flaps = flap_detector.begin()
+    ticket_id, history_key = checkin_transaction(conn, device_id, 'offline', message, last_seen,
+                                                 flaps, recorded_at=now, force_ticket=True)
+    # Worker lain membuang entri cache device ini (jalur cepat tidak boleh memakai status lama)
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_notify(%s, %s)", (INVALIDATE_CHANNEL, device_id))
+    cursor.close()
+    conn.commit()
+    flaps.commit()
+
+    if DEVICE_CACHE_ENABLED:
+        device_cache.set(device_id, DeviceState('offline', message, ticket_id, history_key))
+    print(f"⏱️ {device_id} tidak mengirim heartbeat selama {now - last_seen}s, ditandai offline "
+          f"(ticket {ticket_id})")
 
 # --- (D) Endpoint Check-in ---
+def duplicate_response(device_id, e):
+    """Retry duplikat dijawab 200 (gateway berhenti mengulang); update basi 409."""
+    response = {"success": e.reason == "duplicate", "device": device_id, e.reason: True}
+    if e.last_seq is not None:
+        response["last_seq"] = e.last_seq
+    if e.reason == "stale":
+        response["error"] = "seq lebih kecil dari check-in terakhir, update diabaikan"
+    return jsonify(response), 200 if e.reason == "duplicate" else 409
+
+def read_payload():
+    """Body request: JSON (default), NDJSON, MessagePack atau CBOR, opsional gzip/deflate."""
+    encoding = request.headers.get('Content-Encoding')
+    mimetype = (request.mimetype or '').lower()
+    if not encoding and mimetype in codec.JSON_TYPES:
+        return request.get_json()
+    return codec.decode_body(request.get_data(cache=False), mimetype, encoding)
+
 @app.route('/api/v1/checkin', methods=['POST'])
 def device_checkin():
     try:
-        data = request.get_json()
+        data = read_payload()
+        if not isinstance(data, dict):
+            return jsonify({"error": "Body check-in harus berupa objek"}), 400
+        data = codec.normalize_checkin(data, checkin_messages)
         device_id = data.get('device_id')
         status = data.get('status')
         message = data.get('message', '')
+        seq = data.get('seq')
+        idempotency_key = data.get('idempotency_key') or request.headers.get('Idempotency-Key')
 
         if not device_id or not status:
             return jsonify({"error": "Data 'device_id' atau 'status' tidak lengkap"}), 400
+        if seq is not None and (isinstance(seq, bool) or not isinstance(seq, int) or seq < 0):
+            return jsonify({"error": "'seq' harus bilangan bulat >= 0"}), 400
+        if idempotency_key is not None:
+            idempotency_key = str(idempotency_key)
 
         last_seen = local_timestamp()
+        duplicate = dedup_window.check(device_id, seq, idempotency_key, now=last_seen)
+        if duplicate is not None:
+            return duplicate_response(device_id, duplicate)
 
-        conn = psycopg2.connect(
-            host=PG_HOST, port=PG_PORT, user=PG_USER, 
-            password=PG_PASSWORD, database=PG_DATABASE
-        )
-        cursor = conn.cursor()
+        if INGEST_MODE == "queue":
+            if status not in ingest.VALID_STATUSES:
+                return jsonify({"error": f"Status '{status}' tidak dikenal"}), 400
+            # Dicatat sebelum masuk antrian: item yang dibuang writer dilupakan lewat
+            # forget_dropped. Retry yang lolos saringan memori dibuang writer antrian
+            # (ingest.filter_duplicates)
+            dedup_window.record(device_id, seq, idempotency_key, now=last_seen)
+            try:
+                ingest_queue.submit({
+                    "device_id": device_id, "status": status, "message": message,
+                    "last_seen": last_seen, "seq": seq, "idempotency_key": idempotency_key,
+                })
+            except QueueFull:
+                dedup_window.forget(device_id, seq, idempotency_key)
+                raise
+            watchdog.touch(device_id, last_seen, status)
+            return jsonify({
+                "success": True,
+                "device": device_id,
+                "queued": True,
+                "local_time": datetime.now(LOCAL_TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
+            }), 202
 
-        # Update devices
-        upsert_query = """
-        INSERT INTO devices (device_id, last_seen, status, message)
-        VALUES (%s, %s, %s, %s)
-        ON CONFLICT (device_id) DO UPDATE SET
-            last_seen = EXCLUDED.last_seen,
-            status = EXCLUDED.status,
-            message = EXCLUDED.message;
-        """
-        cursor.execute(upsert_query, (device_id, last_seen, status, message))
-
-        # Tambah ke device_history
-        cursor.execute('''
-            INSERT INTO device_history (device_id, timestamp, status, message)
-            VALUES (%s, %s, %s, %s)
-        ''', (device_id, last_seen, status, message))
+        state = device_cache.get(device_id) if DEVICE_CACHE_ENABLED else None
+        # Device yang keputusan ticket-nya masih menunggu debounce, dan check-in dengan
+        # kunci idempotensi (dicatat di database), tetap lewat jalur lengkap
+        if (state is not None and state.status == status and state.message == message
+                and idempotency_key is None and not flap_detector.pending(device_id)):
+            ticket_id = fast_path_checkin(state, device_id, last_seen, status, message, seq)
+            dedup_window.record(device_id, seq, now=last_seen)
+            watchdog.touch(device_id, last_seen, status)
+            response = {
+                "success": True,
+                "device": device_id,
+                "local_time": datetime.now(LOCAL_TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
+            }
+            if ticket_id:
+                response["ticket_created"] = ticket_id
+            return jsonify(response), 200
 
-        ticket_id = create_ticket_if_needed(conn, device_id, status, message)
-        resolve_ticket_if_needed(conn, device_id, status)
+        flaps = flap_detector.begin()
+        with db_pool.connection() as conn:
+            ticket_id, history_key = checkin_transaction(conn, device_id, status, message, last_seen,
+                                                         flaps, seq=seq,
+                                                         idempotency_key=idempotency_key)
+            conn.commit()
+        flaps.commit()
+        dedup_window.record(device_id, seq, idempotency_key, now=last_seen)
+        watchdog.touch(device_id, last_seen, status)
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+        if DEVICE_CACHE_ENABLED:
+            device_cache.set(device_id, DeviceState(status, message, ticket_id, history_key))
 
         response = {
             "success": True,
@@ -223,16 +786,311 @@ def device_checkin():
 
         return jsonify(response), 200
 
+    except codec.PayloadError as e:
+        return jsonify({"error": str(e)}), e.status
+    except DuplicateCheckin as e:
+        dedup_window.count(e)
+        return duplicate_response(device_id, e)
+    except QueueFull as e:
+        return queue_full_response(e)
+    except PoolTimeout as e:
+        print(f"Pool penuh pada /checkin: {e}")
+        return jsonify({"error": "Server sibuk, coba lagi"}), 503
     except Exception as e:
         print(f"Error pada /checkin: {e}")
         return jsonify({"error": str(e)}), 500
 
-# --- (E) Endpoint Root ---
+# --- (E) Endpoint Batch Check-in ---
+def parse_batch_payload():
+    """Membaca body batch: array, {"checkins": [...]}, atau NDJSON (satu objek per baris).
+
+    Array/objek boleh dikirim sebagai JSON, MessagePack atau CBOR, opsional gzip/deflate.
+    """
+    encoding = request.headers.get('Content-Encoding')
+    mimetype = (request.mimetype or '').lower()
+    if not encoding and mimetype not in codec.NDJSON_TYPES + codec.BINARY_TYPES:
+        data = request.get_json(force=True)
+    else:
+        data = codec.decode_body(request.get_data(cache=False), mimetype, encoding)
+    if isinstance(data, dict):
+        data = data.get('checkins')
+    if not isinstance(data, list):
+        raise ValueError("Body harus berupa array check-in")
+    return data
+
+def validate_batch_item(index, item):
+    """Mengembalikan (item_bersih, None) atau (None, hasil_error) untuk satu item batch."""
+    if not isinstance(item, dict):
+        return None, {"index": index, "success": False, "error": "Item harus berupa objek"}
+    try:
+        item = codec.normalize_checkin(item, checkin_messages)
+    except codec.PayloadError as e:
+        return None, {"index": index, "success": False, "error": str(e)}
+    device_id = item.get('device_id')
+    status = item.get('status')
+    if not device_id or not status:
+        return None, {"index": index, "device": device_id, "success": False,
+                      "error": "Data 'device_id' atau 'status' tidak lengkap"}
+    if status not in ingest.VALID_STATUSES:
+        return None, {"index": index, "device": device_id, "success": False,
+                      "error": f"Status '{status}' tidak dikenal"}
+    seq = item.get('seq')
+    if seq is not None and (isinstance(seq, bool) or not isinstance(seq, int) or seq < 0):
+        return None, {"index": index, "device": device_id, "success": False,
+                      "error": "'seq' harus bilangan bulat >= 0"}
+    idempotency_key = item.get('idempotency_key')
+    return {
+        "device_id": device_id,
+        "status": status,
+        "message": item.get('message', ''),
+        "seq": seq,
+        "idempotency_key": None if idempotency_key is None else str(idempotency_key),
+    }, None
+
+@app.route('/api/v1/checkin/batch', methods=['POST'])
+def device_checkin_batch():
+    try:
+        try:
+            raw_items = parse_batch_payload()
+        except codec.PayloadError as e:
+            return jsonify({"error": f"Payload batch tidak valid: {e}"}), e.status
+        except (ValueError, TypeError, BadRequest) as e:
+            return jsonify({"error": f"Payload batch tidak valid: {e}"}), 400
+
+        if len(raw_items) > BATCH_MAX_ITEMS:
+            return jsonify({"error": f"Maksimum {BATCH_MAX_ITEMS} item per batch"}), 413
+
+        last_seen = local_timestamp()
+        results = []
+        valid = []  # [(index, item)]
+        for index, raw in enumerate(raw_items):
+            item, error = validate_batch_item(index, raw)
+            if error:
+                results.append(error)
+                continue
+            item['last_seen'] = last_seen
+            duplicate = dedup_window.check(item['device_id'], item['seq'], item['idempotency_key'],
+                                           now=last_seen)
+            if duplicate is not None:
+                item['rejected'] = duplicate.reason
+            valid.append((index, item))
+
+        created, resolved = {}, []
+        queued = INGEST_MODE == "queue"
+        items = [item for _, item in valid if 'rejected' not in item]
+        if items:
+            if queued:
+                # Dicatat sebelum masuk antrian (lihat device_checkin); salinan: writer
+                # antrian menandai item duplikat/basi di thread-nya sendiri
+                for i in items:
+                    dedup_window.record(i['device_id'], i['seq'], i['idempotency_key'], now=last_seen)
+                try:
+                    ingest_queue.submit_many([dict(i) for i in items])
+                except QueueFull:
+                    forget_dropped(items)
+                    raise
+            else:
+                flaps = flap_detector.begin()
+                with db_pool.connection() as conn:
+                    created, resolved = ingest.write_checkins(conn, items, last_seen,
+                                                              history_mode=HISTORY_MODE,
+                                                              flaps=flaps,
+                                                              seq_window=CHECKIN_SEQ_WINDOW)
+                    conn.commit()
+                flaps.commit()
+                after_batch_written(items, created, resolved)
+            for i in items:
+                if 'rejected' in i:
+                    dedup_window.count(DuplicateCheckin(i['rejected']))
+                elif not queued:
+                    dedup_window.record(i['device_id'], i['seq'], i['idempotency_key'], now=last_seen)
+            watchdog.touch_many((i['device_id'], i['last_seen'], i['status'])
+                                for i in items if 'rejected' not in i)
+        duplicates = sum(1 for _, item in valid if 'rejected' in item)
+
+        # Ticket baru dilaporkan pada item terakhir milik device tersebut; retry duplikat
+        # dijawab sukses dengan "duplicate", update basi gagal dengan "stale"
+        last_index = {item['device_id']: index for index, item in valid if 'rejected' not in item}
+        for index, item in valid:
+            result = {"index": index, "device": item['device_id'], "success": True}
+            if 'rejected' in item:
+                result["success"] = item['rejected'] == "duplicate"
+                result[item['rejected']] = True
+                results.append(result)
+                continue
+            if queued:
+                result["queued"] = True
+            if last_index.get(item['device_id']) == index and item['device_id'] in created:
+                result["ticket_created"] = created[item['device_id']]
+            results.append(result)
+        results.sort(key=lambda r: r["index"])
+
+        return jsonify({
+            "success": True,
+            "received": len(raw_items),
+            "accepted": len(valid) - duplicates,
+            "rejected": len(raw_items) - len(valid),
+            "duplicates": duplicates,
+            "tickets_created": len(created),
+            "tickets_resolved": len(resolved),
+            "results": results,
+            "local_time": datetime.now(LOCAL_TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
+        }), 202 if queued else 200
+
+    except QueueFull as e:
+        return queue_full_response(e)
+    except PoolTimeout as e:
+        print(f"Pool penuh pada /checkin/batch: {e}")
+        return jsonify({"error": "Server sibuk, coba lagi"}), 503
+    except Exception as e:
+        print(f"Error pada /checkin/batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# --- (F) Endpoint Metrics ---
+@app.route('/api/v1/metrics')
+def metrics():
+    return jsonify({
+        "ingest_mode": INGEST_MODE,
+        "queue": ingest_queue.metrics(),
+        "pool": db_pool.stats(),
+        "device_cache": device_cache.stats(),
+        "last_seen_pending": last_seen_writer.pending(),
+        "staleness": watchdog.stats(),
+        "flapping": flap_detector.stats(),
+        "dedup": dedup_window.stats(),
+    }), 200
+
+# --- (F2) Endpoint Timeline Status Device ---
+# GET /api/v1/devices/<device_id>/timeline?from=<epoch>&to=<epoch>&points=<n>
+# Bucket dihitung di PostgreSQL (device_status_timeline), sehingga ukuran respons
+# ditentukan oleh `points`, bukan oleh panjang rentang atau jumlah check-in.
+@app.route('/api/v1/devices/<device_id>/timeline')
+def device_timeline(device_id):
+    try:
+        try:
+            end = int(request.args.get('to', local_timestamp()))
+            start = int(request.args.get('from', end - 24 * 3600))
+            points = int(request.args.get('points', TIMELINE_DEFAULT_POINTS))
+        except ValueError:
+            return jsonify({"error": "Parameter 'from', 'to' dan 'points' harus bilangan bulat"}), 400
+        if start >= end:
+            return jsonify({"error": "'from' harus lebih kecil dari 'to'"}), 400
+        points = max(1, min(points, TIMELINE_MAX_POINTS))
+
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT bucket_start, bucket_end, online_seconds, error_seconds, offline_seconds,
+                       transitions, dominant_status, worst_status
+                FROM device_status_timeline(%s, %s, %s, %s)
+            ''', (device_id, start, end, points))
+            columns = [c[0] for c in cursor.description]
+            buckets = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            cursor.close()
+            conn.commit()
+
+        return jsonify({
+            "device_id": device_id,
+            "from": start,
+            "to": end,
+            "points": len(buckets),
+            "buckets": buckets,
+        }), 200
+
+    except PoolTimeout as e:
+        print(f"Pool penuh pada /timeline: {e}")
+        return jsonify({"error": "Server sibuk, coba lagi"}), 503
+    except Exception as e:
+        print(f"Error pada /timeline: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# --- (F3) Endpoint Ekspor device_history ---
+# GET /api/v1/export/history?format=csv|parquet&device_id=..&status=..&from=..&to=..
+# device_id dan status boleh diulang atau dipisah koma; from/to epoch atau tanggal ISO.
+# Hasil di-stream per batch dari named cursor pada koneksi tersendiri (bukan dari
+# pool check-in), sehingga ekspor panjang tidak menahan koneksi ingest.
+def _list_arg(name):
+    values = [v.strip() for arg in request.args.getlist(name) for v in arg.split(',')]
+    return [v for v in values if v] or None
+
+@app.route('/api/v1/export/history')
+def export_history():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in history_export.FORMATS:
+        return jsonify({"error": f"Format harus salah satu dari {', '.join(history_export.FORMATS)}"}), 400
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401 - dependensi opsional untuk format parquet
+        except ImportError:
+            return jsonify({"error": "Format parquet membutuhkan paket pyarrow di server"}), 501
+    statuses = _list_arg('status')
+    unknown = set(statuses or ()) - set(ingest.VALID_STATUSES)
+    if unknown:
+        return jsonify({"error": f"Status tidak dikenal: {', '.join(sorted(unknown))}"}), 400
+    try:
+        filters = dict(device_ids=_list_arg('device_id'), statuses=statuses,
+                       start=history_export.parse_time(request.args.get('from')),
+                       end=history_export.parse_time(request.args.get('to')))
+    except ValueError as e:
+        return jsonify({"error": f"Parameter waktu tidak valid: {e}"}), 400
+
+    # Koneksi diambil sebelum response dimulai agar pool yang penuh masih bisa dijawab 503
+    try:
+        conn = export_pool.getconn()
+    except PoolTimeout as e:
+        print(f"Pool ekspor penuh: {e}")
+        return jsonify({"error": "Ekspor lain sedang berjalan, coba lagi"}), 503
+
+    def generate():
+        yield from history_export.stream_export(conn, fmt, EXPORT_BATCH_SIZE, **filters)
+
+    filename = f"device_history_{datetime.now(LOCAL_TZ).strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    mimetype = "text/csv" if fmt == "csv" else "application/vnd.apache.parquet"
+    response = Response(stream_with_context(generate()), mimetype=mimetype,
+                        headers={"Content-Disposition": f"attachment; filename={filename}"})
+    # Selesai, gagal, atau klien memutus: koneksi kembali ke pool (transaksi di-rollback)
+    response.call_on_close(lambda: export_pool.putconn(conn))
+    return response
+
+# --- (F4) Endpoint Ringkasan Fleet ---
+# Dibaca dari memori (FleetSummary), tanpa query database. ETag = versi ringkasan,
+# sehingga klien yang mengirim If-None-Match mendapat 304 jika belum berubah.
+@app.route('/api/v1/summary')
+def summary():
+    response = jsonify(fleet_summary.snapshot())
+    response.set_etag(str(fleet_summary.version))
+    return response.make_conditional(request)
+
+# --- (F5) Endpoint Kontrak Codec ---
+# Kode status, key pendek dan kamus pesan untuk gateway yang mengirim payload ringkas.
+@app.route('/api/v1/codec')
+def codec_contract():
+    return jsonify(codec.describe(checkin_messages)), 200
+
+# --- (G) Endpoint Root ---
 @app.route('/')
 def index():
     now_str = datetime.now(LOCAL_TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
     return f"IT Support API Server running on local time: {now_str}"
 
+# Saat proses berhenti, kosongkan antrian dan last_seen gabungan agar tidak ada yang hilang.
+# atexit berjalan LIFO: antrian dikosongkan dulu, lalu last_seen.
+atexit.register(last_seen_writer.stop)
+atexit.register(ingest_queue.stop)
+
 if __name__ == '__main__':
     init_db()
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    threading.Thread(target=partition_maintenance_loop, name="partition-maintenance", daemon=True).start()
+    threading.Thread(target=rollup_loop, name="rollup-refresh", daemon=True).start()
+    summary_listener.start()
+    threading.Thread(target=fleet_summary_loop, name="fleet-summary", daemon=True).start()
+    if STALENESS_ENABLED:
+        threading.Thread(target=staleness_loop, name="staleness-watchdog", daemon=True).start()
+    if DEVICE_CACHE_ENABLED:
+        cache_listener.start()
+    if INGEST_MODE == "queue":
+        ingest_queue.start()
+        print(f"Mode ingest: queue (maks {QUEUE_MAX_SIZE} item, flush {QUEUE_FLUSH_SIZE} item / {QUEUE_FLUSH_INTERVAL}s)")
+    # Tanpa reloader: reloader Werkzeug menjalankan ulang __main__ di proses anak sehingga
+    # watchdog, rollup, pemeliharaan partisi dan ringkasan fleet berjalan dua kali
+    app.run(debug=True, use_reloader=False, host='0.0.0.0', port=5000)
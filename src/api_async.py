@@ -0,0 +1,382 @@
+"""
+Varian asyncio (ASGI) dari server check-in.
+
+Kontrak request/response endpoint / dan /api/v1/checkin sama persis dengan
+api.py (Flask), tetapi memakai driver async asyncpg dengan pool koneksi
+sehingga satu proses dapat melayani ribuan koneksi perangkat bersamaan.
+Skema database tetap dibuat oleh init_db() di api.py.
+
+Ticket dibuka/ditutup lewat FlapDetector yang sama (debounce + histeresis
+flapping); ticket aktif dari worker lain diketahui lewat LISTEN device_events
+dan muat ulang tabel tickets, seperti api.py. Retry (seq / idempotency_key)
+ditolak dengan penjaga yang sama: DedupWindow di memori, lalu upsert bersyarat
+devices.last_seq dan tabel checkin_idempotency di database. Body dibaca lewat
+codec.py seperti api.py: JSON, MessagePack atau CBOR, opsional gzip/deflate.
+
+Menjalankan:
+    python api_async.py
+    # atau: uvicorn api_async:app --host 0.0.0.0 --port 5001 --workers 4
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import asyncpg
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+import codec
+import events
+from dedup import DedupWindow, DuplicateCheckin, seq_verdict
+from flap_detector import FlapDetector
+
+# --- KONFIGURASI DATABASE ---
+PG_HOST = "localhost"
+PG_PORT = 5432
+PG_USER = "it_support_user"  # Ganti sesuai user Anda
+PG_PASSWORD = "v1r"  # Ganti sesuai password Anda
+PG_DATABASE = "hospital_iot_db"  # Ganti sesuai nama database Anda
+# ----------------------------
+
+# --- KONFIGURASI POOL & SERVER ---
+POOL_MIN_SIZE = 5
+POOL_MAX_SIZE = 50
+POOL_TIMEOUT = 5              # detik menunggu koneksi bebas sebelum 503
+POOL_MAX_IDLE = 300           # koneksi idle lebih lama dari ini ditutup
+POOL_MAX_QUERIES = 50000      # koneksi didaur ulang setelah sekian query
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 5001
+# ----------------------------
+
+# Mode device_history, sama seperti HISTORY_MODE di api.py ("all" / "changes")
+HISTORY_MODE = "all"
+
+# Kamus pesan tambahan untuk payload ringkas, sama seperti CODEC_MESSAGE_FILE di api.py
+CODEC_MESSAGE_FILE = None
+
+# --- KONFIGURASI IDEMPOTENSI CHECK-IN ---
+# Sama dengan api.py: "seq" (naik per device) dan/atau "idempotency_key" / header Idempotency-Key
+CHECKIN_SEQ_WINDOW = 300         # detik; seq lebih kecil diterima lagi setelah device diam selama ini
+DEDUP_MAX_DEVICES = 200000       # entri seq terakhir di memori (LRU)
+DEDUP_MAX_KEYS = 200000          # entri kunci idempotensi di memori (LRU)
+# ----------------------------
+
+# --- KONFIGURASI DETEKSI FLAPPING TICKET ---
+# Sama dengan api.py agar kedua server memutuskan ticket dengan cara yang sama
+TICKET_OPEN_DEBOUNCE = 30        # detik error/offline bertahan sebelum ticket dibuka
+TICKET_RESOLVE_DEBOUNCE = 60     # detik online bertahan sebelum ticket ditutup
+FLAP_WINDOW = 600                # detik jendela penghitungan perpindahan status
+FLAP_HIGH = 6                    # perpindahan dalam jendela -> device dianggap flapping
+FLAP_LOW = 2                     # ...dan berhenti flapping saat turun ke angka ini
+FLAP_QUIET = 300                 # detik online tenang sebelum ticket device flapping ditutup
+TICKET_EVENTS_ENABLED = True     # LISTEN device_events: ticket aktif yang dibuka worker lain
+TICKET_RELOAD_INTERVAL = 600     # detik; muat ulang ticket aktif berkala
+# ----------------------------
+
+# Zona waktu lokal (Asia/Jakarta = WIB)
+LOCAL_TZ = ZoneInfo("Asia/Jakarta")
+
+def local_timestamp():
+    """Mengembalikan epoch detik berdasarkan waktu lokal (Asia/Jakarta)."""
+    return int(datetime.now(LOCAL_TZ).timestamp())
+
+# SQL identik dengan api.py, hanya placeholder-nya gaya asyncpg ($1, $2, ...)
+# Upsert bersyarat: seq yang tidak lebih besar dari last_seq (dalam jendela) tidak
+# menghasilkan baris (RETURNING kosong), lihat api.checkin_transaction.
+UPSERT_DEVICE_SQL = """
+    WITH prev AS (SELECT status FROM devices WHERE device_id = $1)
+    INSERT INTO devices (device_id, last_seen, status, message, last_seq, row_updated_at)
+    VALUES ($1, $2, $3, $4, $5, $2)
+    ON CONFLICT (device_id) DO UPDATE SET
+        last_seen = EXCLUDED.last_seen,
+        status = EXCLUDED.status,
+        message = EXCLUDED.message,
+        last_seq = COALESCE(EXCLUDED.last_seq, devices.last_seq),
+        row_updated_at = EXCLUDED.row_updated_at
+    WHERE EXCLUDED.last_seq IS NULL OR devices.last_seq IS NULL
+       OR EXCLUDED.last_seq > devices.last_seq
+       OR devices.last_seen < EXCLUDED.last_seen - $6
+    RETURNING (SELECT status FROM prev)
+"""
+
+INSERT_IDEMPOTENCY_SQL = """
+    INSERT INTO checkin_idempotency (device_id, idempotency_key, created_at)
+    VALUES ($1, $2, $3)
+    ON CONFLICT DO NOTHING
+    RETURNING 1
+"""
+
+LAST_SEQ_SQL = "SELECT last_seq, last_seen FROM devices WHERE device_id = $1"
+
+INSERT_HISTORY_SQL = """
+    INSERT INTO device_history (device_id, timestamp, status, message, last_seen)
+    VALUES ($1, $2, $3, $4, $2)
+"""
+
+EXTEND_HISTORY_SQL = """
+    UPDATE device_history
+    SET last_seen = $2, heartbeat_count = heartbeat_count + 1
+    WHERE (id, timestamp) = (
+        SELECT id, timestamp FROM device_history
+        WHERE device_id = $1
+        ORDER BY timestamp DESC, id DESC
+        LIMIT 1
+    )
+    AND status = $3 AND message IS NOT DISTINCT FROM $4
+"""
+
+OPEN_TICKET_SQL = """
+    INSERT INTO tickets
+    (ticket_id, device_id, status, issue_type, message, created_at, updated_at, is_active, flap_count)
+    VALUES ('TKT-' || $6::BIGINT || '-' || nextval('ticket_seq'), $1, $2, $3, $4, $6, $6, TRUE, $5)
+    ON CONFLICT (device_id) WHERE is_active = TRUE DO UPDATE
+    SET updated_at = EXCLUDED.updated_at, message = EXCLUDED.message,
+        flap_count = GREATEST(tickets.flap_count, EXCLUDED.flap_count)
+    RETURNING ticket_id, (xmax = 0) AS inserted
+"""
+
+RESOLVE_TICKETS_SQL = """
+    UPDATE tickets
+    SET is_active = FALSE,
+        resolved_at = $1,
+        updated_at = $1,
+        status = 'resolved'
+    WHERE device_id = $2 AND is_active = TRUE
+    RETURNING ticket_id
+"""
+
+NOTIFY_EVENTS_SQL = "SELECT pg_notify($1, e) FROM unnest($2::TEXT[]) AS e"
+
+ACTIVE_TICKETS_SQL = "SELECT device_id, ticket_id, flap_count FROM tickets WHERE is_active = TRUE"
+
+# Kamus pesan untuk check-in ringkas (indeks message -> teks), sama dengan api.py
+checkin_messages = codec.load_messages(CODEC_MESSAGE_FILE)
+
+# Saringan retry di memori; devices.last_seq & checkin_idempotency tetap penjaga akhirnya
+dedup_window = DedupWindow(seq_window=CHECKIN_SEQ_WINDOW,
+                           max_devices=DEDUP_MAX_DEVICES, max_keys=DEDUP_MAX_KEYS)
+
+# State flapping di memori; diubah hanya setelah transaksi check-in ter-commit
+flap_detector = FlapDetector(
+    open_debounce=TICKET_OPEN_DEBOUNCE,
+    resolve_debounce=TICKET_RESOLVE_DEBOUNCE,
+    flap_window=FLAP_WINDOW,
+    flap_high=FLAP_HIGH,
+    flap_low=FLAP_LOW,
+    flap_quiet=FLAP_QUIET,
+)
+
+
+# --- (A) Ticket helpers ---
+async def create_ticket_if_needed(conn, device_id, status, message, notify, flap_count=0):
+    if status not in ['error', 'offline']:
+        return None
+    now = local_timestamp()
+    issue_type = 'ERROR' if status == 'error' else 'OFFLINE'
+    row = await conn.fetchrow(OPEN_TICKET_SQL, device_id, status, issue_type, message,
+                              flap_count, now)
+    if row['inserted']:
+        notify.append(events.ticket_opened_event(device_id, row['ticket_id'], issue_type))
+    return row['ticket_id']
+
+async def resolve_ticket_if_needed(conn, device_id, status, notify):
+    if status != 'online':
+        return
+    rows = await conn.fetch(RESOLVE_TICKETS_SQL, local_timestamp(), device_id)
+    for row in rows:
+        print(f"✅ Auto-resolved ticket: {row['ticket_id']} for device: {device_id}")
+        notify.append(events.ticket_resolved_event(device_id, row['ticket_id']))
+
+
+# --- (A2) Catat ke device_history ---
+async def record_history(conn, device_id, last_seen, status, message):
+    if HISTORY_MODE == "changes":
+        result = await conn.execute(EXTEND_HISTORY_SQL, device_id, last_seen, status, message)
+        if result != "UPDATE 0":
+            return
+    await conn.execute(INSERT_HISTORY_SQL, device_id, last_seen, status, message)
+
+
+# --- (A3) Transaksi check-in ---
+# Padanan api.checkin_transaction: ticket dibuka/ditutup menurut keputusan flaps
+# (flap_detector.begin()); caller memanggil flaps.commit() setelah transaksi ter-commit.
+# Retry melempar DuplicateCheckin sebelum ada yang ditulis (transaksi di-rollback).
+async def checkin_transaction(conn, device_id, status, message, last_seen, flaps,
+                              seq=None, idempotency_key=None):
+    if idempotency_key is not None:
+        if await conn.fetchval(INSERT_IDEMPOTENCY_SQL, device_id, idempotency_key, last_seen) is None:
+            raise DuplicateCheckin("duplicate")
+
+    row = await conn.fetchrow(UPSERT_DEVICE_SQL, device_id, last_seen, status, message,
+                              seq, CHECKIN_SEQ_WINDOW)
+    if row is None:
+        last_seq, previous_seen = await conn.fetchrow(LAST_SEQ_SQL, device_id)
+        raise DuplicateCheckin(seq_verdict(seq, last_seq, previous_seen, last_seen,
+                                           CHECKIN_SEQ_WINDOW) or "stale", last_seq)
+    previous_status = row[0]
+    await record_history(conn, device_id, last_seen, status, message)
+    notify = []
+    if previous_status != status:
+        notify.append(events.status_event(device_id, status, previous_status))
+    ticket_id = None
+    decision = flaps.observe(device_id, status, last_seen)
+    if decision.action == "ticket":
+        ticket_id = await create_ticket_if_needed(conn, device_id, status, message, notify,
+                                                  decision.flap_count)
+        flaps.ticket_opened(device_id, ticket_id)
+    elif decision.action == "resolve":
+        # Ditutup per device_id (partial index ticket aktif), bukan per ticket_id di memori
+        await resolve_ticket_if_needed(conn, device_id, status, notify)
+        flaps.ticket_resolved(device_id)
+    if notify:
+        await conn.execute(NOTIFY_EVENTS_SQL, events.EVENTS_CHANNEL,
+                           [json.dumps(event) for event in notify])
+    return ticket_id
+
+
+# --- (B) Endpoint Check-in ---
+def duplicate_response(device_id, e):
+    """Retry duplikat dijawab 200 (gateway berhenti mengulang); update basi 409."""
+    response = {"success": e.reason == "duplicate", "device": device_id, e.reason: True}
+    if e.last_seq is not None:
+        response["last_seq"] = e.last_seq
+    if e.reason == "stale":
+        response["error"] = "seq lebih kecil dari check-in terakhir, update diabaikan"
+    return JSONResponse(response, status_code=200 if e.reason == "duplicate" else 409)
+
+async def read_payload(request):
+    """Body request: JSON (default), MessagePack atau CBOR, opsional gzip/deflate."""
+    mimetype = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    return codec.decode_body(await request.body(), mimetype,
+                             request.headers.get('content-encoding'))
+
+async def device_checkin(request):
+    device_id = None
+    try:
+        data = await read_payload(request)
+        if not isinstance(data, dict):
+            return JSONResponse({"error": "Body check-in harus berupa objek"}, status_code=400)
+        data = codec.normalize_checkin(data, checkin_messages)
+        device_id = data.get('device_id')
+        status = data.get('status')
+        message = data.get('message', '')
+        seq = data.get('seq')
+        idempotency_key = data.get('idempotency_key') or request.headers.get('Idempotency-Key')
+
+        if not device_id or not status:
+            return JSONResponse({"error": "Data 'device_id' atau 'status' tidak lengkap"}, status_code=400)
+        if seq is not None and (isinstance(seq, bool) or not isinstance(seq, int) or seq < 0):
+            return JSONResponse({"error": "'seq' harus bilangan bulat >= 0"}, status_code=400)
+        if idempotency_key is not None:
+            idempotency_key = str(idempotency_key)
+
+        last_seen = local_timestamp()
+        duplicate = dedup_window.check(device_id, seq, idempotency_key, now=last_seen)
+        if duplicate is not None:
+            return duplicate_response(device_id, duplicate)
+        pool = request.app.state.pool
+
+        flaps = flap_detector.begin()
+        async with pool.acquire(timeout=POOL_TIMEOUT) as conn:
+            async with conn.transaction():
+                ticket_id = await checkin_transaction(conn, device_id, status, message,
+                                                      last_seen, flaps, seq, idempotency_key)
+        flaps.commit()
+        dedup_window.record(device_id, seq, idempotency_key, now=last_seen)
+
+        response = {
+            "success": True,
+            "device": device_id,
+            "local_time": datetime.now(LOCAL_TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
+        }
+        if ticket_id:
+            response["ticket_created"] = ticket_id
+
+        return JSONResponse(response, status_code=200)
+
+    except codec.PayloadError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status)
+    except DuplicateCheckin as e:
+        dedup_window.count(e)
+        return duplicate_response(device_id, e)
+    except asyncio.TimeoutError as e:
+        print(f"Pool penuh pada /checkin: {e}")
+        return JSONResponse({"error": "Server sibuk, coba lagi"}, status_code=503)
+    except Exception as e:
+        print(f"Error pada /checkin: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# --- (C) Endpoint Root ---
+async def index(request):
+    now_str = datetime.now(LOCAL_TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
+    return PlainTextResponse(f"IT Support API Server running on local time: {now_str}")
+
+
+# --- (D) Sinkronisasi ticket aktif ---
+# Event ticket dari worker lain (api.py, antrian ingest, dashboard) diterapkan ke
+# flap_detector; saat listener (re)connect ticket aktif dimuat ulang dari tabel tickets.
+async def ticket_reload_loop(pool, reload):
+    while True:
+        try:
+            async with pool.acquire(timeout=POOL_TIMEOUT) as conn:
+                flap_detector.load_active(await conn.fetch(ACTIVE_TICKETS_SQL))
+        except Exception as e:
+            print(f"Muat ulang ticket aktif gagal: {e}")
+        try:
+            await asyncio.wait_for(reload.wait(), TICKET_RELOAD_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        reload.clear()
+
+def start_ticket_sync(pool):
+    loop = asyncio.get_running_loop()
+    reload = asyncio.Event()
+
+    def on_event(event):
+        if event is None:
+            loop.call_soon_threadsafe(reload.set)
+        else:
+            flap_detector.apply_event(event)
+
+    events.EventListener(dict(host=PG_HOST, port=PG_PORT, user=PG_USER, password=PG_PASSWORD,
+                              database=PG_DATABASE), on_event=on_event).start()
+    return asyncio.create_task(ticket_reload_loop(pool, reload))
+
+
+# --- (E) Lifecycle pool ---
+@asynccontextmanager
+async def lifespan(app):
+    print("Membuat pool asyncpg ke PostgreSQL...")
+    app.state.pool = await asyncpg.create_pool(
+        host=PG_HOST, port=PG_PORT, user=PG_USER,
+        password=PG_PASSWORD, database=PG_DATABASE,
+        min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+        max_inactive_connection_lifetime=POOL_MAX_IDLE,
+        max_queries=POOL_MAX_QUERIES,
+        server_settings={"timezone": "Asia/Jakarta"},
+    )
+    print(f"Pool asyncpg aktif: {POOL_MIN_SIZE}-{POOL_MAX_SIZE} koneksi.")
+    ticket_sync = start_ticket_sync(app.state.pool) if TICKET_EVENTS_ENABLED else None
+    try:
+        yield
+    finally:
+        if ticket_sync is not None:
+            ticket_sync.cancel()
+        await app.state.pool.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/api/v1/checkin', device_checkin, methods=['POST']),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    uvicorn.run(app, host=SERVER_HOST, port=SERVER_PORT, log_level="warning")
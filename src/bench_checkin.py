@@ -0,0 +1,153 @@
+"""
+Benchmark jalur check-in: koneksi baru per request vs connection pool.
+
+Menjalankan pernyataan SQL yang sama seperti /api/v1/checkin dari beberapa
+thread selama durasi tertentu terhadap PostgreSQL lokal, lalu melaporkan
+requests/sec untuk kedua mode. Perangkat benchmark memakai prefix BENCH-
+dan dibersihkan setelah selesai.
+
+Contoh:
+    python bench_checkin.py --threads 16 --duration 10
+    python bench_checkin.py --http http://127.0.0.1:5000/api/v1/checkin
+"""
+import argparse
+import threading
+import time
+
+import psycopg2
+
+from api import (PG_HOST, PG_PORT, PG_USER, PG_PASSWORD, PG_DATABASE,
+                 create_ticket_if_needed, resolve_ticket_if_needed, local_timestamp)
+from db_pool import ConnectionPool
+
+CONN_KWARGS = dict(host=PG_HOST, port=PG_PORT, user=PG_USER,
+                   password=PG_PASSWORD, database=PG_DATABASE)
+DEVICE_PREFIX = "BENCH-"
+
+
+def do_checkin(conn, device_id, status, message):
+    """Urutan statement yang sama dengan device_checkin di api.py."""
+    now = local_timestamp()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO devices (device_id, last_seen, status, message, row_updated_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (device_id) DO UPDATE SET
+            last_seen = EXCLUDED.last_seen,
+            status = EXCLUDED.status,
+            message = EXCLUDED.message,
+            row_updated_at = EXCLUDED.row_updated_at;
+    """, (device_id, now, status, message, now))
+    cursor.execute('''
+        INSERT INTO device_history (device_id, timestamp, status, message)
+        VALUES (%s, %s, %s, %s)
+    ''', (device_id, now, status, message))
+    create_ticket_if_needed(conn, device_id, status, message)
+    resolve_ticket_if_needed(conn, device_id, status)
+    conn.commit()
+    cursor.close()
+
+
+def checkin_connect_per_request(device_id):
+    conn = psycopg2.connect(**CONN_KWARGS)
+    try:
+        do_checkin(conn, device_id, "online", "System OK")
+    finally:
+        conn.close()
+
+
+def make_pooled_checkin(pool):
+    def checkin(device_id):
+        with pool.connection() as conn:
+            do_checkin(conn, device_id, "online", "System OK")
+    return checkin
+
+
+def make_http_checkin(url):
+    import requests
+    local = threading.local()
+
+    def checkin(device_id):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        resp = session.post(url, json={"device_id": device_id, "status": "online",
+                                       "message": "System OK"}, timeout=5)
+        resp.raise_for_status()
+    return checkin
+
+
+def run(label, checkin_fn, threads, duration):
+    """Menjalankan checkin_fn dari banyak thread selama `duration` detik."""
+    counts = [0] * threads
+    errors = [0] * threads
+    stop_at = time.monotonic() + duration
+
+    def worker(idx):
+        device_id = f"{DEVICE_PREFIX}{idx:04d}"
+        while time.monotonic() < stop_at:
+            try:
+                checkin_fn(device_id)
+                counts[idx] += 1
+            except Exception:
+                errors[idx] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.monotonic()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    total = sum(counts)
+    rps = total / elapsed if elapsed else 0
+    print(f"{label:<24} {total:>8} req  {sum(errors):>6} err  {rps:>10.1f} req/s")
+    return rps
+
+
+def cleanup():
+    conn = psycopg2.connect(**CONN_KWARGS)
+    cursor = conn.cursor()
+    like = DEVICE_PREFIX + "%"
+    cursor.execute("DELETE FROM device_history WHERE device_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM tickets WHERE device_id LIKE %s", (like,))
+    cursor.execute("DELETE FROM devices WHERE device_id LIKE %s", (like,))
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark jalur check-in (req/s)")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="detik per mode")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="maxconn pool (default = jumlah thread)")
+    parser.add_argument("--http", metavar="URL",
+                        help="juga ukur server API yang sedang berjalan di URL ini")
+    parser.add_argument("--keep", action="store_true", help="jangan hapus data BENCH-")
+    args = parser.parse_args()
+
+    print(f"Benchmark check-in: {args.threads} thread, {args.duration:.0f}s per mode\n")
+    before = run("connect-per-request", checkin_connect_per_request,
+                 args.threads, args.duration)
+
+    pool = ConnectionPool(minconn=args.threads, maxconn=args.pool_size or args.threads,
+                          **CONN_KWARGS)
+    pool.warm()
+    after = run("pooled", make_pooled_checkin(pool), args.threads, args.duration)
+    pool.closeall()
+
+    if args.http:
+        run("http " + args.http, make_http_checkin(args.http), args.threads, args.duration)
+
+    if before:
+        print(f"\nSpeedup pool vs connect-per-request: {after / before:.2f}x")
+
+    if not args.keep:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Format payload check-in: JSON (default), MessagePack dan CBOR, dengan body
+opsional terkompresi gzip/deflate (header Content-Encoding).
+
+Gateway ward dengan bandwidth terbatas bisa mengirim bentuk ringkas:
+    {"d": "BED-MONITOR-101-ICU", "s": 0, "m": 0, "q": 1234}
+- key pendek: d = device_id, s = status, m = message, q = seq, k = idempotency_key
+- status sebagai kode enum kecil (STATUS_CODES)
+- message sebagai indeks kamus pesan (MESSAGE_DICTIONARY) atau teks biasa
+Bentuk panjang (key & teks lengkap) tetap diterima di semua format, jadi
+payload JSON lama tidak berubah. Kamus pesan bisa diperluas dari file JSON
+dan dipublikasikan API di /api/v1/codec agar gateway memakai indeks yang sama.
+
+msgpack dan cbor2 adalah dependensi opsional: hanya di-import saat format
+tersebut dipakai.
+"""
+import gzip
+import json
+import zlib
+
+# Kode status enum (urutan tidak boleh diubah; gateway menyimpan angkanya)
+STATUS_CODES = ("online", "error", "offline")
+STATUS_IDS = {status: code for code, status in enumerate(STATUS_CODES)}
+
+# Kamus pesan bawaan; entri baru hanya boleh ditambahkan di akhir
+MESSAGE_DICTIONARY = (
+    "System OK",
+    "Battery Low (15%)",
+    "Sensor Error 502",
+    "Temperature Drift",
+    "Connection Lost",
+    "Critical Failure",
+)
+
+JSON_TYPES = ("application/json",)
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+CBOR_TYPES = ("application/cbor",)
+BINARY_TYPES = MSGPACK_TYPES + CBOR_TYPES
+ENCODINGS = ("gzip", "deflate", "identity")
+
+MAX_BODY_BYTES = 10 * 1024 * 1024   # batas body setelah dekompresi
+
+SHORT_KEYS = {"d": "device_id", "s": "status", "m": "message", "q": "seq", "k": "idempotency_key"}
+
+
+class PayloadError(ValueError):
+    """Body tidak bisa dibaca; `status` = kode HTTP yang sebaiknya dikirim."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def load_messages(path):
+    """Kamus pesan: bawaan + entri tambahan dari file JSON (array string)."""
+    messages = list(MESSAGE_DICTIONARY)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            messages += [m for m in json.load(f) if m not in messages]
+    return tuple(messages)
+
+
+def decompress(body, encoding, limit=MAX_BODY_BYTES):
+    """Body sesuai Content-Encoding, dengan batas ukuran hasil dekompresi."""
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        data = body
+    elif encoding in ("gzip", "x-gzip", "deflate"):
+        # wbits: 16+ = gzip, 32+ = deteksi otomatis zlib/gzip; deflate mentah dicoba terakhir
+        modes = (16 + zlib.MAX_WBITS,) if encoding != "deflate" else (zlib.MAX_WBITS, -zlib.MAX_WBITS)
+        for wbits in modes:
+            try:
+                decompressor = zlib.decompressobj(wbits)
+                data = decompressor.decompress(body, limit + 1)
+                break
+            except zlib.error:
+                data = None
+        if data is None:
+            raise PayloadError(f"Body {encoding} rusak")
+    else:
+        raise PayloadError(f"Content-Encoding '{encoding}' tidak didukung", status=415)
+    if len(data) > limit:
+        raise PayloadError(f"Body melebihi {limit} byte setelah dekompresi", status=413)
+    return data
+
+
+def decode_body(body, mimetype, encoding=None):
+    """Bytes request -> objek Python menurut Content-Type (default JSON)."""
+    data = decompress(body, encoding)
+    mimetype = (mimetype or "").lower()
+    try:
+        if mimetype in MSGPACK_TYPES:
+            try:
+                import msgpack
+            except ImportError:
+                raise PayloadError("Format MessagePack butuh paket 'msgpack'", status=415)
+            return msgpack.unpackb(data, raw=False, strict_map_key=False)
+        if mimetype in CBOR_TYPES:
+            try:
+                import cbor2
+            except ImportError:
+                raise PayloadError("Format CBOR butuh paket 'cbor2'", status=415)
+            return cbor2.loads(data)
+        text = data.decode("utf-8")
+        if mimetype in NDJSON_TYPES:
+            return [json.loads(line) for line in text.splitlines() if line.strip()]
+        return json.loads(text)
+    except PayloadError:
+        raise
+    except Exception as e:
+        raise PayloadError(f"Body tidak valid: {e}")
+
+
+def normalize_checkin(item, messages=MESSAGE_DICTIONARY):
+    """Check-in bentuk ringkas/panjang -> dict key panjang dengan status & message teks.
+
+    Nilai yang tidak dikenal dibiarkan apa adanya agar validasi pemanggil yang menolak;
+    device_id dan message yang bukan teks (mis. map/bytes CBOR) ditolak di sini karena
+    kolom database-nya TEXT.
+    """
+    data = {SHORT_KEYS.get(key, key): value for key, value in item.items()}
+    status = data.get("status")
+    if isinstance(status, int) and not isinstance(status, bool) and 0 <= status < len(STATUS_CODES):
+        data["status"] = STATUS_CODES[status]
+    message = data.get("message", "")
+    if isinstance(message, int) and not isinstance(message, bool):
+        if not 0 <= message < len(messages):
+            raise PayloadError(f"Kode message {message} tidak ada di kamus")
+        message = messages[message]
+    if message is None:
+        message = ""
+    if not isinstance(message, str):
+        raise PayloadError("'message' harus berupa teks atau kode kamus pesan")
+    data["message"] = message
+    device_id = data.get("device_id")
+    if device_id is not None and not isinstance(device_id, str):
+        raise PayloadError("'device_id' harus berupa teks")
+    return data
+
+
+def encode_checkin(device_id, status, message, seq=None, messages=MESSAGE_DICTIONARY):
+    """Bentuk ringkas satu check-in (untuk gateway / simulator)."""
+    item = {"d": device_id, "s": STATUS_IDS.get(status, status)}
+    try:
+        item["m"] = messages.index(message)
+    except ValueError:
+        item["m"] = message
+    if seq is not None:
+        item["q"] = seq
+    return item
+
+
+def encode_body(obj, fmt="json", encoding=None):
+    """Objek -> (bytes, headers) siap dikirim; fmt: json, msgpack, cbor."""
+    if fmt == "msgpack":
+        import msgpack
+        body, content_type = msgpack.packb(obj, use_bin_type=True), MSGPACK_TYPES[0]
+    elif fmt == "cbor":
+        import cbor2
+        body, content_type = cbor2.dumps(obj), CBOR_TYPES[0]
+    else:
+        body, content_type = json.dumps(obj, separators=(",", ":")).encode("utf-8"), JSON_TYPES[0]
+    headers = {"Content-Type": content_type}
+    if encoding == "gzip":
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    elif encoding == "deflate":
+        body = zlib.compress(body)
+        headers["Content-Encoding"] = "deflate"
+    return body, headers
+
+
+def describe(messages=MESSAGE_DICTIONARY):
+    """Kontrak codec untuk gateway (dipublikasikan di /api/v1/codec)."""
+    return {
+        "content_types": {"json": JSON_TYPES[0], "ndjson": NDJSON_TYPES[0],
+                          "msgpack": MSGPACK_TYPES[0], "cbor": CBOR_TYPES[0]},
+        "content_encodings": list(ENCODINGS),
+        "short_keys": SHORT_KEYS,
+        "status_codes": list(STATUS_CODES),
+        "messages": list(messages),
+    }
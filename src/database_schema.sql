@@ -22,6 +22,8 @@ CREATE TABLE IF NOT EXISTS devices (
     last_seen BIGINT NOT NULL,
     status TEXT NOT NULL CHECK (status IN ('online', 'error', 'offline')),
     message TEXT,
+    last_seq BIGINT,
+    row_updated_at BIGINT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -29,44 +31,67 @@ CREATE TABLE IF NOT EXISTS devices (
 -- Index untuk query yang lebih cepat
 CREATE INDEX IF NOT EXISTS idx_devices_status ON devices(status);
 CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices(last_seen DESC);
+CREATE INDEX IF NOT EXISTS idx_devices_row_updated ON devices(row_updated_at);  -- delta fetch dashboard
 
 COMMENT ON TABLE devices IS 'Tabel utama yang menyimpan status terkini dari semua perangkat IoT';
 COMMENT ON COLUMN devices.device_id IS 'ID unik perangkat (Primary Key)';
 COMMENT ON COLUMN devices.last_seen IS 'Unix timestamp terakhir kali perangkat check-in';
 COMMENT ON COLUMN devices.status IS 'Status perangkat: online, error, atau offline';
 COMMENT ON COLUMN devices.message IS 'Pesan status atau deskripsi kondisi perangkat';
+COMMENT ON COLUMN devices.row_updated_at IS 'Unix timestamp penulisan terakhir baris ini (check-in, heartbeat, flip watchdog)';
+COMMENT ON COLUMN devices.last_seq IS 'Nomor urut check-in terakhir yang diterapkan (penjaga retry duplikat/basi)';
 
 -- ====================================================
 -- 2. TABEL DEVICE_HISTORY
 -- ====================================================
 -- Menyimpan SEMUA perubahan status perangkat untuk audit trail
+-- Setiap baris adalah satu "run": status berlaku sejak timestamp sampai baris
+-- berikutnya milik device yang sama. Pada HISTORY_MODE = "changes" (api.py)
+-- heartbeat tanpa perubahan hanya memperbarui last_seen & heartbeat_count.
+--
+-- Tabel di-partisi RANGE pada kolom timestamp (epoch detik), satu partisi
+-- per hari (atau per bulan). Partisi dibuat di muka dan partisi kedaluwarsa
+-- dilepas oleh partition_maintenance.py (dipanggil otomatis oleh api.py).
+-- Primary key wajib memuat kolom partisi, sehingga menjadi (id, timestamp).
 -- ====================================================
 
 CREATE TABLE IF NOT EXISTS device_history (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     device_id TEXT NOT NULL,
     timestamp BIGINT NOT NULL,
     status TEXT NOT NULL CHECK (status IN ('online', 'error', 'offline')),
     message TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    last_seen BIGINT,
+    heartbeat_count INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- Partisi default menampung baris di luar rentang partisi yang ada;
+-- job pemeliharaan memindahkannya saat partisi yang sesuai dibuat.
+CREATE TABLE IF NOT EXISTS device_history_default PARTITION OF device_history DEFAULT;
 
--- Index untuk query history berdasarkan device dan waktu
-CREATE INDEX IF NOT EXISTS idx_history_device_id ON device_history(device_id);
+-- Contoh partisi harian (nama: device_history_pYYYYMMDD, batas = epoch awal hari WIB):
+-- CREATE TABLE device_history_p20261018 PARTITION OF device_history
+--     FOR VALUES FROM (1792256400) TO (1792342800);
+
+-- Index untuk query history berdasarkan device dan waktu (diturunkan ke setiap partisi)
+CREATE INDEX IF NOT EXISTS idx_history_device_time ON device_history(device_id, timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_history_timestamp ON device_history(timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_history_status ON device_history(status);
-CREATE INDEX IF NOT EXISTS idx_history_device_time ON device_history(device_id, timestamp DESC);
 
 -- Foreign key relationship (optional, bisa diaktifkan jika diperlukan)
 -- ALTER TABLE device_history ADD CONSTRAINT fk_device_history_device 
 -- FOREIGN KEY (device_id) REFERENCES devices(device_id) ON DELETE CASCADE;
 
 COMMENT ON TABLE device_history IS 'History log dari semua perubahan status perangkat untuk analisis dan audit';
-COMMENT ON COLUMN device_history.id IS 'Auto-increment ID untuk setiap record history';
+COMMENT ON COLUMN device_history.id IS 'Auto-increment ID untuk setiap record history (unik bersama timestamp)';
 COMMENT ON COLUMN device_history.device_id IS 'ID perangkat yang mengalami perubahan status';
 COMMENT ON COLUMN device_history.timestamp IS 'Unix timestamp saat perubahan terjadi';
 COMMENT ON COLUMN device_history.status IS 'Status perangkat saat itu';
 COMMENT ON COLUMN device_history.message IS 'Deskripsi atau pesan terkait status';
+COMMENT ON COLUMN device_history.last_seen IS 'Unix timestamp heartbeat terakhir dalam run ini';
+COMMENT ON COLUMN device_history.heartbeat_count IS 'Jumlah check-in yang tergabung dalam run ini';
 
 -- ====================================================
 -- 3. TABEL TICKETS
@@ -74,6 +99,9 @@ COMMENT ON COLUMN device_history.message IS 'Deskripsi atau pesan terkait status
 -- Sistem ticketing untuk tracking issues dan penanganan
 -- ====================================================
 
+-- Nomor urut ticket_id: unik lintas batch, worker dan device berakhiran sama
+CREATE SEQUENCE IF NOT EXISTS ticket_seq;
+
 CREATE TABLE IF NOT EXISTS tickets (
     ticket_id TEXT PRIMARY KEY,
     device_id TEXT NOT NULL,
@@ -85,7 +113,8 @@ CREATE TABLE IF NOT EXISTS tickets (
     resolved_at BIGINT,
     assigned_to TEXT,
     notes TEXT,
-    is_active BOOLEAN DEFAULT TRUE
+    is_active BOOLEAN DEFAULT TRUE,
+    flap_count INTEGER NOT NULL DEFAULT 0
 );
 
 -- Index untuk query tickets
@@ -93,15 +122,20 @@ CREATE INDEX IF NOT EXISTS idx_tickets_device_id ON tickets(device_id);
 CREATE INDEX IF NOT EXISTS idx_tickets_active ON tickets(is_active);
 CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status);
 CREATE INDEX IF NOT EXISTS idx_tickets_created ON tickets(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_tickets_updated ON tickets(updated_at);  -- delta fetch dashboard
 CREATE INDEX IF NOT EXISTS idx_tickets_issue_type ON tickets(issue_type);
 CREATE INDEX IF NOT EXISTS idx_tickets_assigned ON tickets(assigned_to) WHERE assigned_to IS NOT NULL;
 
+-- Maksimal satu ticket aktif per device. Menjadi target ON CONFLICT pada API
+-- sehingga buka/perbarui ticket cukup satu statement atomik tanpa race.
+CREATE UNIQUE INDEX IF NOT EXISTS uniq_tickets_active_device ON tickets(device_id) WHERE is_active = TRUE;
+
 -- Foreign key relationship (optional)
 -- ALTER TABLE tickets ADD CONSTRAINT fk_tickets_device 
 -- FOREIGN KEY (device_id) REFERENCES devices(device_id) ON DELETE CASCADE;
 
 COMMENT ON TABLE tickets IS 'Sistem ticketing untuk tracking dan manajemen issues perangkat';
-COMMENT ON COLUMN tickets.ticket_id IS 'ID unik ticket (format: TKT-timestamp-devicecode)';
+COMMENT ON COLUMN tickets.ticket_id IS 'ID unik ticket (format: TKT-timestamp-nomor dari ticket_seq)';
 COMMENT ON COLUMN tickets.device_id IS 'ID perangkat yang mengalami masalah';
 COMMENT ON COLUMN tickets.status IS 'Status ticket: error, offline, atau resolved';
 COMMENT ON COLUMN tickets.issue_type IS 'Tipe masalah: ERROR atau OFFLINE';
@@ -112,6 +146,444 @@ COMMENT ON COLUMN tickets.resolved_at IS 'Unix timestamp saat ticket diselesaika
 COMMENT ON COLUMN tickets.assigned_to IS 'Nama teknisi yang ditugaskan menangani ticket';
 COMMENT ON COLUMN tickets.notes IS 'Catatan tambahan dari teknisi atau sistem';
 COMMENT ON COLUMN tickets.is_active IS 'Status aktif ticket (TRUE = masih open, FALSE = resolved)';
+COMMENT ON COLUMN tickets.flap_count IS 'Jumlah pantulan online <-> error/offline yang digabung ke ticket ini';
+
+-- ====================================================
+-- 3a. TABEL CHECKIN_IDEMPOTENCY
+-- ====================================================
+-- Kunci idempotensi check-in (body idempotency_key / header Idempotency-Key).
+-- Primary key menolak retry dengan kunci yang sama; baris lebih tua dari
+-- IDEMPOTENCY_KEY_TTL dihapus berkala oleh api.py. Retry dengan seq dijaga
+-- oleh devices.last_seq (upsert bersyarat).
+-- ====================================================
+
+CREATE TABLE IF NOT EXISTS checkin_idempotency (
+    device_id TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    created_at BIGINT NOT NULL,
+    PRIMARY KEY (device_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_checkin_idempotency_created ON checkin_idempotency(created_at);
+
+-- ====================================================
+-- 3b. TABEL ROLLUP STATUS PERANGKAT
+-- ====================================================
+-- Agregat per device per menit / jam / hari: detik di setiap status, jumlah
+-- transisi, dan ticket yang dibuka (menit: hanya bucket dengan aktivitas). Diisi inkremental oleh rollup.py
+-- (dijalankan periodik oleh api.py) lewat refresh_device_rollup().
+-- Laporan uptime membaca device_rollup_totals(), bukan device_history mentah;
+-- grafik timeline membaca device_status_timeline().
+-- DDL ini salinan verbatim ROLLUP_DDL di rollup.py (dicek tests/test_schema.py).
+-- ====================================================
+CREATE TABLE IF NOT EXISTS device_rollup_minute (
+    device_id TEXT NOT NULL,
+    bucket_start BIGINT NOT NULL,
+    online_seconds INTEGER NOT NULL DEFAULT 0,
+    error_seconds INTEGER NOT NULL DEFAULT 0,
+    offline_seconds INTEGER NOT NULL DEFAULT 0,
+    transitions INTEGER NOT NULL DEFAULT 0,
+    tickets_opened INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (device_id, bucket_start)
+);
+CREATE TABLE IF NOT EXISTS device_rollup_hour (LIKE device_rollup_minute INCLUDING ALL);
+CREATE TABLE IF NOT EXISTS device_rollup_day (LIKE device_rollup_minute INCLUDING ALL);
+
+CREATE INDEX IF NOT EXISTS idx_rollup_minute_bucket ON device_rollup_minute(bucket_start);
+CREATE INDEX IF NOT EXISTS idx_rollup_hour_bucket ON device_rollup_hour(bucket_start);
+CREATE INDEX IF NOT EXISTS idx_rollup_day_bucket ON device_rollup_day(bucket_start);
+
+-- Batas atas (eksklusif) data yang sudah di-rollup per granularity, dan bucket
+-- tertua yang masih disimpan (naik saat rollup lama dibuang oleh refresh_rollups)
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    granularity TEXT PRIMARY KEY,
+    watermark BIGINT NOT NULL,
+    retained_from BIGINT
+);
+ALTER TABLE rollup_watermarks ADD COLUMN IF NOT EXISTS retained_from BIGINT;
+
+-- Status setiap device tepat pada watermark (titik awal refresh berikutnya)
+CREATE TABLE IF NOT EXISTS rollup_device_cursor (
+    granularity TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (granularity, device_id)
+);
+
+CREATE OR REPLACE FUNCTION rollup_bucket_size(p_granularity TEXT)
+RETURNS INTEGER AS $$
+    SELECT CASE p_granularity WHEN 'minute' THEN 60 WHEN 'hour' THEN 3600 WHEN 'day' THEN 86400 END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Awal bucket untuk epoch p_ts; hari dimulai tengah malam WIB (UTC+7 = 25200 detik)
+CREATE OR REPLACE FUNCTION rollup_bucket(p_ts BIGINT, p_size INTEGER)
+RETURNS BIGINT AS $$
+    SELECT p_ts - ((p_ts + 25200) % p_size);
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Menghitung ulang bucket [watermark, p_to) untuk satu granularity dari device_history.
+-- Setiap baris history berlaku sampai baris berikutnya milik device yang sama.
+-- Granularity menit hanya menulis bucket device yang punya baris history atau ticket
+-- di menit itu; device yang diam tidak menambah devices x 1440 baris per hari.
+CREATE OR REPLACE FUNCTION refresh_device_rollup(
+    p_granularity TEXT,
+    p_to BIGINT,
+    p_backfill_from BIGINT DEFAULT NULL
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_size INTEGER := rollup_bucket_size(p_granularity);
+    v_from BIGINT;
+    v_to BIGINT;
+    v_rows INTEGER;
+BEGIN
+    IF v_size IS NULL THEN
+        RAISE EXCEPTION 'Granularity tidak dikenal: %', p_granularity;
+    END IF;
+    v_to := rollup_bucket(p_to, v_size);
+
+    SELECT watermark INTO v_from FROM rollup_watermarks
+    WHERE granularity = p_granularity FOR UPDATE;
+
+    IF v_from IS NULL THEN
+        -- Pertama kali: mulai dari data tertua (atau p_backfill_from jika lebih baru)
+        SELECT rollup_bucket(GREATEST(MIN(timestamp), COALESCE(p_backfill_from, MIN(timestamp))), v_size)
+        INTO v_from FROM device_history;
+        IF v_from IS NULL THEN
+            RETURN 0;
+        END IF;
+        INSERT INTO rollup_device_cursor (granularity, device_id, status)
+        SELECT DISTINCT ON (device_id) p_granularity, device_id, status
+        FROM device_history
+        WHERE timestamp < v_from
+        ORDER BY device_id, timestamp DESC, id DESC
+        ON CONFLICT (granularity, device_id) DO UPDATE SET status = EXCLUDED.status;
+        INSERT INTO rollup_watermarks (granularity, watermark, retained_from)
+        VALUES (p_granularity, v_from, v_from);
+    END IF;
+
+    IF v_to <= v_from THEN
+        RETURN 0;
+    END IF;
+
+    EXECUTE format($f$
+        WITH src AS (
+            SELECT device_id, $1::BIGINT AS ts, 0::BIGINT AS id, status, FALSE AS is_row
+            FROM rollup_device_cursor
+            WHERE granularity = $3
+            UNION ALL
+            SELECT device_id, timestamp, id, status, TRUE
+            FROM device_history
+            WHERE timestamp >= $1 AND timestamp < $2
+        ),
+        segs AS (
+            SELECT device_id, status, is_row, ts AS s_start,
+                   LEAD(ts, 1, $2::BIGINT) OVER w AS s_end,
+                   COALESCE(is_row AND status <> LAG(status) OVER w, FALSE) AS is_transition,
+                   ROW_NUMBER() OVER (PARTITION BY device_id ORDER BY ts DESC, is_row DESC, id DESC) AS rn_last
+            FROM src
+            WINDOW w AS (PARTITION BY device_id ORDER BY ts, is_row, id)
+        ),
+        pieces AS (
+            SELECT s.device_id, s.status, b AS bucket_start,
+                   LEAST(s.s_end, b + $4) - GREATEST(s.s_start, b) AS seconds,
+                   (s.is_transition AND b = rollup_bucket(s.s_start, $4))::INTEGER AS transitions,
+                   s.is_row AND b = rollup_bucket(s.s_start, $4) AS active
+            FROM segs s
+            CROSS JOIN LATERAL generate_series(
+                rollup_bucket(s.s_start, $4), GREATEST(s.s_end - 1, s.s_start), $4::BIGINT
+            ) AS b
+        ),
+        status_agg AS (
+            SELECT device_id, bucket_start,
+                   COALESCE(SUM(seconds) FILTER (WHERE status = 'online'), 0)::INTEGER AS online_seconds,
+                   COALESCE(SUM(seconds) FILTER (WHERE status = 'error'), 0)::INTEGER AS error_seconds,
+                   COALESCE(SUM(seconds) FILTER (WHERE status = 'offline'), 0)::INTEGER AS offline_seconds,
+                   SUM(transitions)::INTEGER AS transitions
+            FROM pieces
+            GROUP BY device_id, bucket_start
+            HAVING $3 <> 'minute' OR bool_or(active)
+        ),
+        ticket_agg AS (
+            SELECT device_id, rollup_bucket(created_at, $4) AS bucket_start, COUNT(*)::INTEGER AS opened
+            FROM tickets
+            WHERE created_at >= $1 AND created_at < $2
+            GROUP BY 1, 2
+        ),
+        upserted AS (
+            INSERT INTO %I (device_id, bucket_start, online_seconds, error_seconds,
+                            offline_seconds, transitions, tickets_opened)
+            SELECT COALESCE(s.device_id, t.device_id), COALESCE(s.bucket_start, t.bucket_start),
+                   COALESCE(s.online_seconds, 0), COALESCE(s.error_seconds, 0),
+                   COALESCE(s.offline_seconds, 0), COALESCE(s.transitions, 0), COALESCE(t.opened, 0)
+            FROM status_agg s
+            FULL JOIN ticket_agg t ON t.device_id = s.device_id AND t.bucket_start = s.bucket_start
+            ON CONFLICT (device_id, bucket_start) DO UPDATE SET
+                online_seconds = EXCLUDED.online_seconds,
+                error_seconds = EXCLUDED.error_seconds,
+                offline_seconds = EXCLUDED.offline_seconds,
+                transitions = EXCLUDED.transitions,
+                tickets_opened = EXCLUDED.tickets_opened
+            RETURNING 1
+        ),
+        cursor_update AS (
+            INSERT INTO rollup_device_cursor (granularity, device_id, status)
+            SELECT $3, device_id, status FROM segs WHERE rn_last = 1
+            ON CONFLICT (granularity, device_id) DO UPDATE SET status = EXCLUDED.status
+        )
+        SELECT COUNT(*) FROM upserted
+    $f$, 'device_rollup_' || p_granularity)
+    INTO v_rows
+    USING v_from, v_to, p_granularity, v_size;
+
+    UPDATE rollup_watermarks SET watermark = v_to WHERE granularity = p_granularity;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Total per device untuk rentang [p_from, p_to): hari penuh dibaca dari tabel harian
+-- dan jam penuh dari tabel jam, selama bucket itu masih disimpan ([retained_from,
+-- watermark)). Sisanya - potongan kurang dari satu jam di tepi, data setelah watermark,
+-- dan tepi yang lebih tua dari retensi rollup jam - dihitung dari device_status_spans(),
+-- sehingga tidak ada detik yang hilang. Biaya laporan 90 hari hampir sama dengan
+-- laporan 1 jam; potongan mentah terpanjang kurang dari satu hari (tepi lama di luar
+-- retensi jam).
+CREATE OR REPLACE FUNCTION device_rollup_totals(
+    p_from BIGINT,
+    p_to BIGINT,
+    p_device_id TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    device_id TEXT,
+    online_seconds BIGINT,
+    error_seconds BIGINT,
+    offline_seconds BIGINT,
+    transitions BIGINT,
+    tickets_opened BIGINT
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_days INT8RANGE[] := '{}';
+    v_hours INT8RANGE[] := '{}';
+    v_raw INT8RANGE[] := ARRAY[int8range(p_from, p_to)];
+    v_next INT8RANGE[];
+    v_range INT8RANGE;
+    v_gran RECORD;
+    v_lo BIGINT;
+    v_hi BIGINT;
+BEGIN
+    IF p_to <= p_from THEN
+        RETURN;
+    END IF;
+
+    -- Hari penuh dulu, lalu jam penuh pada sisa rentang; yang tersisa dibaca mentah
+    FOR v_gran IN
+        SELECT g.granularity, rollup_bucket_size(g.granularity) AS size,
+               COALESCE(w.retained_from, 0) AS retained_from, COALESCE(w.watermark, 0) AS watermark
+        FROM (VALUES (1, 'day'), (2, 'hour')) AS g(ord, granularity)
+        LEFT JOIN rollup_watermarks w ON w.granularity = g.granularity
+        ORDER BY g.ord
+    LOOP
+        v_next := '{}';
+        FOREACH v_range IN ARRAY v_raw LOOP
+            CONTINUE WHEN isempty(v_range);
+            v_lo := rollup_bucket(GREATEST(lower(v_range), v_gran.retained_from) + v_gran.size - 1,
+                                  v_gran.size);
+            v_hi := rollup_bucket(LEAST(upper(v_range), v_gran.watermark), v_gran.size);
+            IF v_hi > v_lo THEN
+                IF v_gran.granularity = 'day' THEN
+                    v_days := v_days || int8range(v_lo, v_hi);
+                ELSE
+                    v_hours := v_hours || int8range(v_lo, v_hi);
+                END IF;
+                v_next := v_next || int8range(lower(v_range), v_lo) || int8range(v_hi, upper(v_range));
+            ELSE
+                v_next := v_next || v_range;
+            END IF;
+        END LOOP;
+        v_raw := v_next;
+    END LOOP;
+
+    RETURN QUERY
+    WITH raw_spans AS (
+        -- Dimulai satu detik sebelum potongan agar baris tepat di tepi bawah tetap
+        -- punya pembanding untuk menghitung transisi
+        SELECT sp.device_id, sp.status,
+               sp.span_end - GREATEST(sp.span_start, lower(rng.r)) AS seconds,
+               COALESCE(sp.span_start >= lower(rng.r)
+                        AND sp.status <> LAG(sp.status) OVER (PARTITION BY rng.r, sp.device_id
+                                                              ORDER BY sp.span_start),
+                        FALSE) AS is_transition
+        FROM unnest(v_raw) AS rng(r)
+        CROSS JOIN LATERAL device_status_spans(lower(rng.r) - 1, upper(rng.r), p_device_id) sp
+        WHERE NOT isempty(rng.r)
+    ),
+    parts AS (
+        SELECT r.device_id, r.online_seconds, r.error_seconds, r.offline_seconds,
+               r.transitions, r.tickets_opened
+        FROM unnest(v_days) AS d(rng)
+        JOIN device_rollup_day r
+          ON r.bucket_start >= lower(d.rng) AND r.bucket_start < upper(d.rng)
+        WHERE p_device_id IS NULL OR r.device_id = p_device_id
+        UNION ALL
+        SELECT r.device_id, r.online_seconds, r.error_seconds, r.offline_seconds,
+               r.transitions, r.tickets_opened
+        FROM unnest(v_hours) AS h(rng)
+        JOIN device_rollup_hour r
+          ON r.bucket_start >= lower(h.rng) AND r.bucket_start < upper(h.rng)
+        WHERE p_device_id IS NULL OR r.device_id = p_device_id
+        UNION ALL
+        SELECT s.device_id,
+               CASE WHEN s.status = 'online' THEN s.seconds ELSE 0 END,
+               CASE WHEN s.status = 'error' THEN s.seconds ELSE 0 END,
+               CASE WHEN s.status = 'offline' THEN s.seconds ELSE 0 END,
+               s.is_transition::INTEGER, 0
+        FROM raw_spans s
+        UNION ALL
+        SELECT t.device_id, 0, 0, 0, 0, 1
+        FROM unnest(v_raw) AS rng(r)
+        JOIN tickets t ON t.created_at >= lower(rng.r) AND t.created_at < upper(rng.r)
+        WHERE NOT isempty(rng.r)
+          AND (p_device_id IS NULL OR t.device_id = p_device_id)
+    )
+    SELECT p.device_id,
+           SUM(p.online_seconds)::BIGINT, SUM(p.error_seconds)::BIGINT,
+           SUM(p.offline_seconds)::BIGINT, SUM(p.transitions)::BIGINT,
+           SUM(p.tickets_opened)::BIGINT
+    FROM parts p
+    GROUP BY p.device_id;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Timeline status satu device untuk [p_from, p_to) dalam sekitar p_points bucket.
+-- Ukuran bucket dipilih dari daftar langkah "rapi" sehingga jumlah titik tetap
+-- kira-kira sama untuk rentang 1 jam maupun 90 hari. Per bucket: detik per status,
+-- transisi, status dominan (durasi terlama) dan status terburuk yang sempat terjadi.
+-- Bucket >= 1 jam yang sudah di-rollup dibaca dari device_rollup_hour; tepi rentang
+-- dan data setelah watermark dihitung dari device_history.
+CREATE OR REPLACE FUNCTION device_status_timeline(
+    p_device_id TEXT,
+    p_from BIGINT,
+    p_to BIGINT,
+    p_points INTEGER DEFAULT 300
+)
+RETURNS TABLE (
+    bucket_start BIGINT,
+    bucket_end BIGINT,
+    online_seconds BIGINT,
+    error_seconds BIGINT,
+    offline_seconds BIGINT,
+    transitions BIGINT,
+    dominant_status TEXT,
+    worst_status TEXT
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_step BIGINT;
+    v_lo BIGINT;
+    v_hi BIGINT;
+    v_rolled INT8RANGE;
+    v_raw INT8RANGE[];
+BEGIN
+    IF p_to <= p_from THEN
+        RETURN;
+    END IF;
+
+    SELECT s INTO v_step
+    FROM unnest(ARRAY[10, 15, 30, 60, 120, 300, 600, 900, 1800,
+                      3600, 7200, 10800, 21600, 43200, 86400]::BIGINT[]) AS s
+    WHERE s * GREATEST(p_points, 1) >= p_to - p_from
+    ORDER BY s
+    LIMIT 1;
+    IF v_step IS NULL THEN
+        v_step := CEIL((p_to - p_from)::NUMERIC / GREATEST(p_points, 1) / 86400)::BIGINT * 86400;
+    END IF;
+
+    -- Bucket utuh yang seluruhnya tercakup rollup jam: [data rollup tertua, watermark)
+    v_raw := ARRAY[int8range(p_from, p_to)];
+    IF v_step >= 3600 THEN
+        SELECT rollup_bucket(MIN(r.bucket_start) + v_step - 1, v_step::INTEGER) INTO v_lo
+        FROM device_rollup_hour r WHERE r.device_id = p_device_id;
+        SELECT rollup_bucket(LEAST(w.watermark, p_to), v_step::INTEGER) INTO v_hi
+        FROM rollup_watermarks w WHERE w.granularity = 'hour';
+        -- GREATEST mengabaikan NULL: cek dulu bahwa rollup device ini memang ada
+        IF v_lo IS NOT NULL THEN
+            v_lo := GREATEST(v_lo, rollup_bucket(p_from + v_step - 1, v_step::INTEGER));
+        END IF;
+        IF v_hi > v_lo THEN
+            v_rolled := int8range(v_lo, v_hi);
+            v_raw := ARRAY[int8range(p_from, v_lo), int8range(v_hi, p_to)];
+        END IF;
+    END IF;
+
+    RETURN QUERY
+    WITH raw_spans AS (
+        SELECT sp.status, sp.span_start, sp.span_end, sp.is_transition
+        FROM unnest(v_raw) AS rng(r)
+        CROSS JOIN LATERAL (
+            SELECT runs.status,
+                   GREATEST(runs.timestamp, lower(rng.r)) AS span_start,
+                   LEAD(runs.timestamp, 1, upper(rng.r)) OVER w AS span_end,
+                   COALESCE(runs.timestamp >= lower(rng.r) AND runs.status <> LAG(runs.status) OVER w,
+                            FALSE) AS is_transition
+            FROM (
+                (SELECT h.timestamp, h.id, h.status
+                 FROM device_history h
+                 WHERE h.device_id = p_device_id AND h.timestamp < lower(rng.r)
+                 ORDER BY h.timestamp DESC, h.id DESC
+                 LIMIT 1)
+                UNION ALL
+                SELECT h.timestamp, h.id, h.status
+                FROM device_history h
+                WHERE h.device_id = p_device_id
+                  AND h.timestamp >= lower(rng.r) AND h.timestamp < upper(rng.r)
+            ) runs
+            WINDOW w AS (ORDER BY runs.timestamp, runs.id)
+        ) sp
+        WHERE NOT isempty(rng.r) AND sp.span_end > sp.span_start
+    ),
+    parts AS (
+        SELECT b AS bucket,
+               CASE WHEN s.status = 'online' THEN LEAST(s.span_end, b + v_step) - GREATEST(s.span_start, b) ELSE 0 END AS online_s,
+               CASE WHEN s.status = 'error' THEN LEAST(s.span_end, b + v_step) - GREATEST(s.span_start, b) ELSE 0 END AS error_s,
+               CASE WHEN s.status = 'offline' THEN LEAST(s.span_end, b + v_step) - GREATEST(s.span_start, b) ELSE 0 END AS offline_s,
+               (s.is_transition AND b = rollup_bucket(s.span_start, v_step::INTEGER))::INTEGER AS trans
+        FROM raw_spans s
+        CROSS JOIN LATERAL generate_series(
+            rollup_bucket(s.span_start, v_step::INTEGER), s.span_end - 1, v_step
+        ) AS b
+        UNION ALL
+        SELECT rollup_bucket(r.bucket_start, v_step::INTEGER), r.online_seconds, r.error_seconds,
+               r.offline_seconds, r.transitions
+        FROM device_rollup_hour r
+        WHERE v_rolled IS NOT NULL AND r.device_id = p_device_id
+          AND r.bucket_start >= lower(v_rolled) AND r.bucket_start < upper(v_rolled)
+    ),
+    buckets AS (
+        SELECT bucket, SUM(online_s)::BIGINT AS online_s, SUM(error_s)::BIGINT AS error_s,
+               SUM(offline_s)::BIGINT AS offline_s, SUM(trans)::BIGINT AS trans
+        FROM parts
+        GROUP BY bucket
+    )
+    SELECT GREATEST(b.bucket, p_from), LEAST(b.bucket + v_step, p_to),
+           b.online_s, b.error_s, b.offline_s, b.trans,
+           CASE WHEN b.offline_s >= b.online_s AND b.offline_s >= b.error_s THEN 'offline'
+                WHEN b.error_s >= b.online_s THEN 'error'
+                ELSE 'online' END,
+           CASE WHEN b.offline_s > 0 THEN 'offline'
+                WHEN b.error_s > 0 THEN 'error'
+                ELSE 'online' END
+    FROM buckets b
+    WHERE b.online_s + b.error_s + b.offline_s > 0
+    ORDER BY b.bucket;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+COMMENT ON TABLE device_rollup_minute IS 'Rollup status per device per menit, hanya menit dengan baris history atau ticket (disimpan 48 jam)';
+COMMENT ON TABLE device_rollup_hour IS 'Rollup status per device per jam';
+COMMENT ON TABLE device_rollup_day IS 'Rollup status per device per hari (tengah malam WIB)';
+COMMENT ON FUNCTION device_rollup_totals IS 'Total detik per status, transisi, dan ticket per device untuk rentang waktu dari rollup';
+COMMENT ON FUNCTION device_status_timeline IS 'Timeline status satu device dengan jumlah bucket tetap (detik per status, transisi, status dominan/terburuk)';
 
 -- ====================================================
 -- 4. VIEWS (Optional - untuk kemudahan query)
@@ -159,35 +631,174 @@ FROM tickets;
 
 COMMENT ON VIEW ticket_statistics IS 'Statistik ticketing system';
 
+-- View uptime per device (24 jam, 7 hari, 30 hari) dari rollup
+CREATE OR REPLACE VIEW device_uptime_summary AS
+SELECT 
+    d.device_id,
+    ROUND(100.0 * r1.online_seconds / NULLIF(r1.online_seconds + r1.error_seconds + r1.offline_seconds, 0), 2) AS uptime_24h,
+    ROUND(100.0 * r7.online_seconds / NULLIF(r7.online_seconds + r7.error_seconds + r7.offline_seconds, 0), 2) AS uptime_7d,
+    ROUND(100.0 * r30.online_seconds / NULLIF(r30.online_seconds + r30.error_seconds + r30.offline_seconds, 0), 2) AS uptime_30d,
+    COALESCE(r30.transitions, 0) AS transitions_30d,
+    COALESCE(r30.tickets_opened, 0) AS tickets_opened_30d
+FROM devices d
+LEFT JOIN device_rollup_totals(EXTRACT(EPOCH FROM NOW())::BIGINT - 86400, EXTRACT(EPOCH FROM NOW())::BIGINT) r1
+    ON r1.device_id = d.device_id
+LEFT JOIN device_rollup_totals(EXTRACT(EPOCH FROM NOW())::BIGINT - 7 * 86400, EXTRACT(EPOCH FROM NOW())::BIGINT) r7
+    ON r7.device_id = d.device_id
+LEFT JOIN device_rollup_totals(EXTRACT(EPOCH FROM NOW())::BIGINT - 30 * 86400, EXTRACT(EPOCH FROM NOW())::BIGINT) r30
+    ON r30.device_id = d.device_id;
+
+COMMENT ON VIEW device_uptime_summary IS 'Uptime per device 24 jam / 7 hari / 30 hari dari tabel rollup';
+
 -- ====================================================
 -- 5. FUNCTIONS (Optional - untuk automasi)
 -- ====================================================
 
--- Function untuk menghitung uptime device dalam periode tertentu
+-- Span status per device dalam jendela [p_from, p_to): setiap baris history berlaku
+-- sampai baris berikutnya (LEAD), baris terakhir sebelum jendela memberi status awal.
+-- Dasar semua perhitungan uptime berbasis durasi. Dibangkitkan dari status_spans.SPANS_SQL
+-- (status_spans.SPANS_FUNCTION_DDL); tests/test_schema.py memastikan keduanya identik.
+CREATE OR REPLACE FUNCTION device_status_spans(
+    p_from BIGINT,
+    p_to BIGINT,
+    p_device_id TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    device_id TEXT,
+    status TEXT,
+    span_start BIGINT,
+    span_end BIGINT
+) AS $$
+    WITH runs AS (
+        SELECT prev.device_id, prev.id, prev.timestamp, prev.status
+        FROM devices d
+        CROSS JOIN LATERAL (
+            SELECT h.device_id, h.id, h.timestamp, h.status
+            FROM device_history h
+            WHERE h.device_id = d.device_id AND h.timestamp < p_from
+            ORDER BY h.timestamp DESC, h.id DESC
+            LIMIT 1
+        ) prev
+        WHERE p_device_id IS NULL OR d.device_id = p_device_id
+        UNION ALL
+        SELECT h.device_id, h.id, h.timestamp, h.status
+        FROM device_history h
+        WHERE h.timestamp >= p_from AND h.timestamp < p_to
+          AND (p_device_id IS NULL OR h.device_id = p_device_id)
+    ),
+    spans AS (
+        SELECT device_id, status,
+               GREATEST(timestamp, p_from) AS span_start,
+               LEAD(timestamp, 1, p_to) OVER (PARTITION BY device_id ORDER BY timestamp, id) AS span_end
+        FROM runs
+    )
+    SELECT device_id, status, span_start, span_end
+    FROM spans
+    WHERE span_end > span_start
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION device_status_spans IS 'Span status per device (time-weighted) untuk jendela waktu sembarang';
+
+-- Uptime per device per shift jaga (Pagi 07-14, Siang 14-21, Malam 21-07 WIB)
+CREATE OR REPLACE FUNCTION device_uptime_by_shift(
+    p_from BIGINT,
+    p_to BIGINT,
+    p_device_id TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    device_id TEXT,
+    shift TEXT,
+    online_seconds BIGINT,
+    total_seconds BIGINT,
+    uptime_percentage NUMERIC
+) AS $$
+    WITH shifts (shift, begin_hour, end_hour) AS (
+        VALUES ('Pagi', 7, 14), ('Siang', 14, 21), ('Malam', 21, 31)
+    ),
+    windows AS (
+        SELECT s.shift,
+               EXTRACT(EPOCH FROM (d + make_interval(hours => s.begin_hour)) AT TIME ZONE 'Asia/Jakarta')::BIGINT AS w_start,
+               EXTRACT(EPOCH FROM (d + make_interval(hours => s.end_hour)) AT TIME ZONE 'Asia/Jakarta')::BIGINT AS w_end
+        FROM generate_series(
+                 ((to_timestamp(p_from) AT TIME ZONE 'Asia/Jakarta')::DATE - 1)::TIMESTAMP,
+                 (to_timestamp(p_to) AT TIME ZONE 'Asia/Jakarta')::DATE::TIMESTAMP,
+                 INTERVAL '1 day') AS d
+        CROSS JOIN shifts s
+    ),
+    overlaps AS (
+        SELECT sp.device_id, w.shift, sp.status,
+               LEAST(sp.span_end, w.w_end) - GREATEST(sp.span_start, w.w_start) AS seconds
+        FROM device_status_spans(p_from, p_to, p_device_id) sp
+        JOIN windows w ON sp.span_start < w.w_end AND sp.span_end > w.w_start
+    ),
+    totals AS (
+        SELECT o.device_id, o.shift,
+               COALESCE(SUM(o.seconds) FILTER (WHERE o.status = 'online'), 0)::BIGINT AS online_seconds,
+               SUM(o.seconds)::BIGINT AS total_seconds
+        FROM overlaps o
+        GROUP BY o.device_id, o.shift
+    )
+    SELECT t.device_id, t.shift, t.online_seconds, t.total_seconds,
+           ROUND(100.0 * t.online_seconds / NULLIF(t.total_seconds, 0), 2)
+    FROM totals t;
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION device_uptime_by_shift IS 'Uptime time-weighted per device per shift jaga';
+
+-- Function uptime langsung dari device_history (dipakai jika rollup belum pernah dijalankan)
+CREATE OR REPLACE FUNCTION calculate_device_uptime_raw(
+    p_device_id TEXT,
+    p_hours INTEGER DEFAULT 24
+)
+RETURNS NUMERIC AS $$
+DECLARE
+    v_to BIGINT := EXTRACT(EPOCH FROM NOW())::BIGINT;
+    v_from BIGINT := EXTRACT(EPOCH FROM NOW() - (p_hours || ' hours')::INTERVAL)::BIGINT;
+    v_total_seconds NUMERIC;
+    v_online_seconds NUMERIC;
+BEGIN
+    SELECT SUM(sp.span_end - sp.span_start),
+           SUM(sp.span_end - sp.span_start) FILTER (WHERE sp.status = 'online')
+    INTO v_total_seconds, v_online_seconds
+    FROM device_status_spans(v_from, v_to, p_device_id) sp;
+
+    IF v_total_seconds IS NULL OR v_total_seconds <= 0 THEN
+        RETURN 0;
+    END IF;
+
+    RETURN ROUND(100.0 * COALESCE(v_online_seconds, 0) / v_total_seconds, 2);
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION calculate_device_uptime_raw IS 'Uptime device dari data history mentah (time-weighted)';
+
+-- Function untuk menghitung uptime device dalam periode tertentu.
+-- Membaca rollup hari/jam sehingga biaya periode 90 hari hampir sama dengan 1 jam;
+-- tepi periode dan data setelah watermark dihitung dari device_status_spans().
 CREATE OR REPLACE FUNCTION calculate_device_uptime(
     p_device_id TEXT,
     p_hours INTEGER DEFAULT 24
 )
 RETURNS NUMERIC AS $$
 DECLARE
-    v_total_records INTEGER;
-    v_online_records INTEGER;
-    v_uptime_pct NUMERIC;
+    v_to BIGINT := EXTRACT(EPOCH FROM NOW())::BIGINT;
+    v_from BIGINT := EXTRACT(EPOCH FROM NOW() - (p_hours || ' hours')::INTERVAL)::BIGINT;
+    v_total_seconds NUMERIC;
+    v_online_seconds NUMERIC;
 BEGIN
-    SELECT 
-        COUNT(*),
-        COUNT(*) FILTER (WHERE status = 'online')
-    INTO v_total_records, v_online_records
-    FROM device_history
-    WHERE device_id = p_device_id
-      AND timestamp >= EXTRACT(EPOCH FROM NOW() - (p_hours || ' hours')::INTERVAL);
-    
-    IF v_total_records = 0 THEN
+    IF NOT EXISTS (SELECT 1 FROM rollup_watermarks WHERE granularity = 'minute') THEN
+        RETURN calculate_device_uptime_raw(p_device_id, p_hours);
+    END IF;
+
+    SELECT r.online_seconds + r.error_seconds + r.offline_seconds, r.online_seconds
+    INTO v_total_seconds, v_online_seconds
+    FROM device_rollup_totals(v_from, v_to, p_device_id) r;
+
+    IF v_total_seconds IS NULL OR v_total_seconds <= 0 THEN
         RETURN 0;
     END IF;
-    
-    v_uptime_pct := ROUND(100.0 * v_online_records / v_total_records, 2);
-    RETURN v_uptime_pct;
+
+    RETURN ROUND(100.0 * v_online_seconds / v_total_seconds, 2);
 END;
 $$ LANGUAGE plpgsql;
 
@@ -220,15 +831,29 @@ COMMENT ON FUNCTION calculate_device_uptime IS 'Menghitung persentase uptime dev
 -- Query 7: Hitung uptime device tertentu dalam 24 jam terakhir
 -- SELECT calculate_device_uptime('BED-MONITOR-101-ICU', 24);
 
--- Query 8: Top 5 devices dengan masalah terbanyak
--- SELECT device_id, COUNT(*) as issue_count
--- FROM device_history
--- WHERE status IN ('error', 'offline')
---   AND timestamp >= EXTRACT(EPOCH FROM NOW() - INTERVAL '7 days')
--- GROUP BY device_id
--- ORDER BY issue_count DESC
+-- Query 8: Top 5 devices dengan masalah terbanyak (7 hari terakhir, dari rollup)
+-- SELECT device_id,
+--        tickets_opened,
+--        transitions,
+--        ROUND((error_seconds + offline_seconds) / 3600.0, 2) AS problem_hours
+-- FROM device_rollup_totals(EXTRACT(EPOCH FROM NOW() - INTERVAL '7 days')::BIGINT,
+--                           EXTRACT(EPOCH FROM NOW())::BIGINT)
+-- ORDER BY tickets_opened DESC, problem_hours DESC
 -- LIMIT 5;
 
+-- Query 8b: Uptime 24 jam / 7 hari / 30 hari semua device
+-- SELECT * FROM device_uptime_summary ORDER BY uptime_30d NULLS FIRST;
+
+-- Query 8c: Uptime per shift jaga untuk satu device, 7 hari terakhir
+-- SELECT * FROM device_uptime_by_shift(EXTRACT(EPOCH FROM NOW() - INTERVAL '7 days')::BIGINT,
+--                                      EXTRACT(EPOCH FROM NOW())::BIGINT,
+--                                      'BED-MONITOR-101-ICU');
+
+-- Query 8d: Timeline status satu device 90 hari terakhir dalam ~300 bucket
+-- SELECT * FROM device_status_timeline('BED-MONITOR-101-ICU',
+--                                      EXTRACT(EPOCH FROM NOW() - INTERVAL '90 days')::BIGINT,
+--                                      EXTRACT(EPOCH FROM NOW())::BIGINT, 300);
+
 -- Query 9: Rata-rata response time resolving tickets
 -- SELECT 
 --     AVG(resolved_at - created_at) / 60 as avg_resolution_minutes
@@ -240,13 +865,34 @@ COMMENT ON FUNCTION calculate_device_uptime IS 'Menghitung persentase uptime dev
 -- WHERE is_active = TRUE AND assigned_to IS NULL
 -- ORDER BY created_at;
 
+-- Query 11: Ticket history per halaman (keyset pagination, dipakai dashboard).
+-- Halaman berikutnya dimulai setelah (created_at, ticket_id) baris terakhir halaman
+-- sebelumnya; idx_tickets_created dibaca sejauh satu halaman tanpa OFFSET.
+-- SELECT ticket_id, device_id, issue_type, is_active, message, assigned_to, created_at
+-- FROM tickets
+-- WHERE issue_type = 'OFFLINE'
+--   AND created_at <= 1700000000
+--   AND (created_at, ticket_id) < (1700000000, 'TKT-1700000000-42')
+-- ORDER BY created_at DESC, ticket_id DESC
+-- LIMIT 50;
+
 -- ====================================================
 -- 7. MAINTENANCE (Optional)
 -- ====================================================
 
--- Untuk membersihkan history lama (lebih dari 90 hari)
--- DELETE FROM device_history 
--- WHERE created_at < NOW() - INTERVAL '90 days';
+-- Untuk membersihkan history lama (lebih dari 90 hari): tidak lagi memakai DELETE.
+-- Partisi yang seluruhnya lebih tua dari masa retensi di-DETACH lalu di-DROP
+-- (tanpa bloat dan tanpa VACUUM panjang):
+--   python partition_maintenance.py --retention-days 90
+--   python partition_maintenance.py --retention-days 90 --detach-only   -- simpan sebagai arsip
+-- Secara manual:
+-- ALTER TABLE device_history DETACH PARTITION device_history_p20260701;
+-- DROP TABLE device_history_p20260701;
+
+-- Refresh rollup manual (biasanya otomatis oleh api.py setiap ROLLUP_INTERVAL):
+--   python rollup.py
+-- atau per granularity:
+-- SELECT refresh_device_rollup('minute', EXTRACT(EPOCH FROM NOW())::BIGINT - 60);
 
 -- Untuk archive resolved tickets lama (lebih dari 30 hari)
 -- UPDATE tickets 
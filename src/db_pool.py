@@ -0,0 +1,191 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolTimeout(Exception):
+    """Dilempar jika tidak ada koneksi bebas dalam batas waktu tunggu."""
+
+
+class ConnectionPool:
+    """Pool koneksi PostgreSQL yang terbatas (bounded) dan thread-safe.
+
+    - maxconn: jumlah maksimum koneksi yang boleh terbuka bersamaan
+    - minconn: jumlah koneksi yang disiapkan oleh warm()
+    - timeout: detik menunggu koneksi bebas sebelum PoolTimeout
+    - recycle: umur maksimum koneksi (detik) sebelum dibuat ulang
+    - health_check_after: koneksi yang menganggur lebih lama dari ini dicek dengan SELECT 1
+    Sisa keyword argument diteruskan ke psycopg2.connect().
+    """
+
+    def __init__(self, minconn=1, maxconn=10, timeout=5.0, recycle=1800,
+                 health_check_after=30, **conn_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("minconn/maxconn tidak valid")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.recycle = recycle
+        self.health_check_after = health_check_after
+        self._conn_kwargs = conn_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = []        # [(conn, last_used)] - LIFO agar koneksi "hangat" dipakai dulu
+        self._born = {}        # id(conn) -> waktu koneksi dibuat
+        self._size = 0         # total koneksi terbuka (idle + dipakai)
+        self._waiting = 0
+        self._closed = False
+
+    # --- Pembuatan / penutupan koneksi fisik ---
+    def _connect(self):
+        conn = psycopg2.connect(**self._conn_kwargs)
+        self._born[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        self._born.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - self._born.get(id(conn), 0) > self.recycle:
+            return False
+        if time.monotonic() - last_used > self.health_check_after:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def warm(self):
+        """Membuka koneksi sampai minconn agar request pertama tidak membayar biaya connect."""
+        opened = []
+        with self._cond:
+            needed = max(0, self.minconn - self._size)
+            self._size += needed
+        try:
+            for _ in range(needed):
+                opened.append(self._connect())
+        except Exception:
+            with self._cond:
+                self._size -= needed - len(opened)
+                self._cond.notify_all()
+            raise
+        finally:
+            with self._cond:
+                now = time.monotonic()
+                self._idle.extend((conn, now) for conn in opened)
+                self._cond.notify_all()
+
+    # --- API utama ---
+    def getconn(self, timeout=None):
+        """Mengambil koneksi dari pool; menunggu paling lama `timeout` detik."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Pool sudah ditutup")
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"Tidak ada koneksi bebas dalam {self.timeout}s (maxconn={self.maxconn})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    conn, last_used = None, None
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._is_healthy(conn, last_used):
+                return conn
+
+            # Koneksi rusak atau sudah terlalu tua: buang, lalu ganti dengan yang baru
+            self._discard(conn)
+            try:
+                return self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+    def putconn(self, conn, discard=False):
+        """Mengembalikan koneksi ke pool. Transaksi yang masih terbuka akan di-rollback."""
+        if not discard and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        with self._cond:
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager: `with pool.connection() as conn:`.
+
+        Commit tetap tanggung jawab pemanggil; jika terjadi exception transaksi
+        di-rollback, dan koneksi dibuang bila error berasal dari koneksinya sendiri.
+        """
+        conn = self.getconn(timeout)
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": self._waiting,
+                "maxconn": self.maxconn,
+            }
@@ -0,0 +1,125 @@
+"""
+De-duplikasi check-in yang dikirim ulang (retry gateway saat timeout).
+
+Check-in boleh membawa salah satu atau keduanya:
+- seq             : nomor urut per device yang selalu naik. seq <= seq terakhir
+                    adalah duplikat (sama) atau update basi yang datang
+                    terlambat (lebih kecil) dan ditolak.
+- idempotency_key : kunci bebas per device (body atau header Idempotency-Key);
+                    kunci yang sama dalam key_ttl detik dianggap duplikat.
+
+DedupWindow adalah saringan murah di memori (LRU terbatas, O(1) per check-in).
+Sumber kebenaran tetap database: devices.last_seq (upsert bersyarat) dan
+tabel checkin_idempotency (primary key), sehingga retry yang mengenai worker
+lain atau entri yang sudah terdorong keluar dari LRU tetap tertolak.
+
+Urutan seq hanya berlaku dalam `seq_window` detik sejak check-in terakhir:
+device yang restart dan memulai seq dari awal diterima lagi setelah diam
+selama jendela tersebut.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+SEQ_WINDOW = 300         # detik; seq lebih kecil dari ini setelah diam lama dianggap reset
+KEY_TTL = 86400          # detik kunci idempotensi disimpan
+MAX_DEVICES = 200000     # entri seq terakhir per device di memori
+MAX_KEYS = 200000        # entri kunci idempotensi di memori
+
+
+class DuplicateCheckin(Exception):
+    """Check-in duplikat atau basi; API menjawab tanpa menulis apa pun."""
+
+    def __init__(self, reason, last_seq=None):
+        super().__init__(reason)
+        self.reason = reason        # "duplicate" atau "stale"
+        self.last_seq = last_seq
+
+
+def seq_verdict(seq, last_seq, last_seen, now, window=SEQ_WINDOW):
+    """None jika seq boleh diterapkan, selain itu "duplicate" / "stale"."""
+    if seq is None or last_seq is None or seq > last_seq:
+        return None
+    if last_seen is not None and now - last_seen > window:
+        return None   # device diam lebih lama dari jendela: anggap seq di-reset
+    return "duplicate" if seq == last_seq else "stale"
+
+
+class DedupWindow:
+    def __init__(self, seq_window=SEQ_WINDOW, key_ttl=KEY_TTL,
+                 max_devices=MAX_DEVICES, max_keys=MAX_KEYS):
+        self.seq_window = seq_window
+        self.key_ttl = key_ttl
+        self.max_devices = max_devices
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._seqs = OrderedDict()   # device_id -> (seq, waktu diterima)
+        self._keys = OrderedDict()   # (device_id, key) -> waktu diterima
+        self.duplicates = 0
+        self.stale = 0
+
+    def check(self, device_id, seq=None, key=None, now=None):
+        """None jika check-in baru menurut jendela memori, selain itu DuplicateCheckin."""
+        now = int(time.time()) if now is None else now
+        with self._lock:
+            if key is not None:
+                seen_at = self._keys.get((device_id, key))
+                if seen_at is not None and now - seen_at <= self.key_ttl:
+                    self.duplicates += 1
+                    return DuplicateCheckin("duplicate", self._seqs.get(device_id, (None,))[0])
+            if seq is not None and device_id in self._seqs:
+                last_seq, seen_at = self._seqs[device_id]
+                verdict = seq_verdict(seq, last_seq, seen_at, now, self.seq_window)
+                if verdict is not None:
+                    if verdict == "duplicate":
+                        self.duplicates += 1
+                    else:
+                        self.stale += 1
+                    return DuplicateCheckin(verdict, last_seq)
+        return None
+
+    def record(self, device_id, seq=None, key=None, now=None):
+        """Catat check-in yang sudah diterapkan (dipanggil setelah commit / masuk antrian)."""
+        now = int(time.time()) if now is None else now
+        with self._lock:
+            if seq is not None:
+                previous = self._seqs.get(device_id)
+                if previous is None or seq > previous[0] or now - previous[1] > self.seq_window:
+                    self._seqs[device_id] = (seq, now)
+                self._seqs.move_to_end(device_id)
+                while len(self._seqs) > self.max_devices:
+                    self._seqs.popitem(last=False)
+            if key is not None:
+                self._keys[(device_id, key)] = now
+                self._keys.move_to_end((device_id, key))
+                while len(self._keys) > self.max_keys:
+                    self._keys.popitem(last=False)
+
+    def forget(self, device_id, seq=None, key=None):
+        """Lupakan check-in yang tercatat tetapi tidak pernah tertulis (dibuang writer antrian).
+
+        seq hanya dihapus jika masih seq terakhir device; retry berikutnya lalu
+        diputuskan oleh devices.last_seq di database.
+        """
+        with self._lock:
+            if seq is not None and self._seqs.get(device_id, (None,))[0] == seq:
+                del self._seqs[device_id]
+            if key is not None:
+                self._keys.pop((device_id, key), None)
+
+    def count(self, error):
+        """Hitung penolakan yang baru diketahui dari database."""
+        with self._lock:
+            if error.reason == "duplicate":
+                self.duplicates += 1
+            else:
+                self.stale += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "devices": len(self._seqs),
+                "keys": len(self._keys),
+                "duplicates": self.duplicates,
+                "stale": self.stale,
+            }
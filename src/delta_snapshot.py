@@ -0,0 +1,101 @@
+"""
+Snapshot tabel per proses yang diperbarui secara inkremental (delta fetch).
+
+Pemuatan pertama mengambil seluruh baris; setelah itu hanya baris dengan kolom
+high-water mark (mis. devices.row_updated_at, tickets.updated_at) lebih besar dari
+nilai terbesar yang sudah dilihat dikurangi `overlap` detik. Overlap menutup
+baris yang di-commit terlambat dengan timestamp lebih lama (antrian write-behind,
+last_seen gabungan). Baris hasil delta menggantikan baris lama dengan key sama.
+
+Pemanggil yang diberi tahu perubahan lewat LISTEN/NOTIFY memanggil mark_stale()
+saat ada event dan get(max_age=...) dengan umur panjang, sehingga snapshot tidak
+di-query setiap `min_interval` detik selama tidak ada perubahan.
+
+Penghapusan baris tidak terlihat lewat delta, jadi snapshot dimuat ulang penuh
+setiap `full_reload_interval` detik.
+
+`transform(df)` opsional dijalankan pada baris hasil fetch sebelum digabung
+(mis. kolom turunan seperti kategori device), sehingga kolom turunan hanya
+dihitung untuk baris yang berubah, bukan untuk seluruh snapshot setiap refresh.
+"""
+import threading
+import time
+
+import pandas as pd
+
+
+class DeltaSnapshot:
+    def __init__(self, fetch, key, hwm_column, sort_by=None, ascending=True,
+                 overlap=30, min_interval=2.0, full_reload_interval=600, transform=None):
+        # fetch(since) -> DataFrame; since=None berarti ambil semua baris
+        self.fetch = fetch
+        self.transform = transform
+        self.key = key
+        self.hwm_column = hwm_column
+        self.sort_by = sort_by or key
+        self.ascending = ascending
+        self.overlap = overlap
+        self.min_interval = min_interval
+        self.full_reload_interval = full_reload_interval
+
+        self._lock = threading.Lock()
+        self._df = None
+        self._hwm = None
+        self._refreshed_at = 0.0
+        self._full_at = 0.0
+        self.full_loads = 0
+        self.delta_loads = 0
+        self.last_delta_rows = 0
+
+    def get(self, max_age=None):
+        """DataFrame terbaru. Sesi yang datang bersamaan menunggu satu refresh yang sama.
+
+        max_age: umur snapshot (detik) sebelum delta fetch; default min_interval.
+        """
+        max_age = self.min_interval if max_age is None else max(max_age, self.min_interval)
+        with self._lock:
+            now = time.monotonic()
+            if self._df is None or now - self._full_at >= self.full_reload_interval:
+                self._load_full(now)
+            elif now - self._refreshed_at >= max_age:
+                self._load_delta(now)
+            return self._df.copy()
+
+    def mark_stale(self):
+        """Paksa delta fetch pada get() berikutnya (mis. setelah dashboard mengubah data)."""
+        with self._lock:
+            self._refreshed_at = 0.0
+
+    def _fetch(self, since):
+        df = self.fetch(since)
+        return self.transform(df) if self.transform else df
+
+    def _load_full(self, now):
+        df = self._fetch(None)
+        self._df = df.sort_values(self.sort_by, ascending=self.ascending, ignore_index=True)
+        self._hwm = df[self.hwm_column].max() if not df.empty else None
+        self._full_at = self._refreshed_at = now
+        self.full_loads += 1
+
+    def _load_delta(self, now):
+        since = None if self._hwm is None else int(self._hwm) - self.overlap
+        delta = self._fetch(since)
+        self._refreshed_at = now
+        self.delta_loads += 1
+        self.last_delta_rows = len(delta)
+        if delta.empty:
+            return
+        unchanged = self._df[~self._df[self.key].isin(delta[self.key])]
+        self._df = pd.concat([unchanged, delta], ignore_index=True).sort_values(
+            self.sort_by, ascending=self.ascending, ignore_index=True)
+        delta_hwm = delta[self.hwm_column].max()
+        self._hwm = delta_hwm if self._hwm is None else max(self._hwm, delta_hwm)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows": 0 if self._df is None else len(self._df),
+                "full_loads": self.full_loads,
+                "delta_loads": self.delta_loads,
+                "last_delta_rows": self.last_delta_rows,
+            }
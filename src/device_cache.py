@@ -0,0 +1,249 @@
+"""
+Cache status perangkat untuk API check-in.
+
+Menyimpan status, message, ticket aktif, dan key run history terakhir per
+device sehingga heartbeat yang tidak berubah bisa melewati upsert devices
+dan query ticket. Bump last_seen untuk heartbeat tersebut digabung
+(coalesced) dan ditulis periodik dalam satu UPDATE.
+
+- DeviceStateCache      : cache in-process (default)
+- RedisDeviceStateCache : cache bersama antar proses/worker (butuh paket redis)
+- CacheInvalidationListener : LISTEN di PostgreSQL; dashboard mengirim NOTIFY
+  saat mengubah ticket sehingga entri device terkait dibuang dari cache
+"""
+import json
+import select
+import threading
+import time
+from collections import namedtuple
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+
+# Channel NOTIFY untuk invalidasi; payload = device_id ('*' = kosongkan semua)
+INVALIDATE_CHANNEL = "device_cache_invalidate"
+
+# history_key = (id, timestamp) baris device_history yang sedang berjalan
+DeviceState = namedtuple("DeviceState", "status message ticket_id history_key")
+
+
+class DeviceStateCache:
+    def __init__(self, ttl=300, max_entries=200000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}   # device_id -> (DeviceState, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, device_id):
+        with self._lock:
+            entry = self._entries.get(device_id)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def set(self, device_id, state):
+        with self._lock:
+            if len(self._entries) >= self.max_entries and device_id not in self._entries:
+                # Cache penuh: buang entri yang sudah kedaluwarsa, jika masih penuh kosongkan
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[1] >= now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[device_id] = (state, time.monotonic() + self.ttl)
+
+    def invalidate(self, device_id):
+        with self._lock:
+            self._entries.pop(device_id, None)
+
+    def invalidate_many(self, device_ids):
+        with self._lock:
+            for device_id in device_ids:
+                self._entries.pop(device_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries),
+                    "hits": self.hits, "misses": self.misses}
+
+
+class RedisDeviceStateCache:
+    """Varian bersama: beberapa proses API memakai cache yang sama di Redis."""
+
+    KEY_PREFIX = "iot:device_state:"
+
+    def __init__(self, url, ttl=300):
+        import redis  # dependensi opsional, hanya jika cache bersama dipakai
+        self._redis = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, device_id):
+        raw = self._redis.get(self.KEY_PREFIX + device_id)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        status, message, ticket_id, history_key = json.loads(raw)
+        return DeviceState(status, message, ticket_id, tuple(history_key) if history_key else None)
+
+    def set(self, device_id, state):
+        self._redis.set(self.KEY_PREFIX + device_id, json.dumps(list(state)), ex=self.ttl)
+
+    def invalidate(self, device_id):
+        self._redis.delete(self.KEY_PREFIX + device_id)
+
+    def invalidate_many(self, device_ids):
+        keys = [self.KEY_PREFIX + device_id for device_id in device_ids]
+        if keys:
+            self._redis.delete(*keys)
+
+    def clear(self):
+        keys = list(self._redis.scan_iter(self.KEY_PREFIX + "*"))
+        if keys:
+            self._redis.delete(*keys)
+
+    def stats(self):
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses}
+
+
+class LastSeenCoalescer:
+    """Menggabungkan bump last_seen (dan heartbeat run history) lalu menulisnya per interval."""
+
+    def __init__(self, pool, interval=1.0):
+        self.pool = pool
+        self.interval = interval
+        self._devices = {}   # device_id -> last_seen terbaru
+        self._runs = {}      # history_key -> [last_seen, jumlah heartbeat]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushes = 0
+
+    def bump(self, device_id, last_seen, history_key=None):
+        self._ensure_started()
+        with self._lock:
+            if last_seen > self._devices.get(device_id, 0):
+                self._devices[device_id] = last_seen
+            if history_key is not None:
+                run = self._runs.setdefault(history_key, [last_seen, 0])
+                run[0] = max(run[0], last_seen)
+                run[1] += 1
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="last-seen-flush", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            devices, self._devices = self._devices, {}
+            runs, self._runs = self._runs, {}
+        if not devices and not runs:
+            return
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                if devices:
+                    execute_values(cursor, """
+                        UPDATE devices AS d
+                        SET last_seen = v.last_seen,
+                            row_updated_at = GREATEST(d.row_updated_at, v.last_seen)
+                        FROM (VALUES %s) AS v(device_id, last_seen)
+                        WHERE d.device_id = v.device_id AND d.last_seen < v.last_seen
+                    """, list(devices.items()), template="(%s, %s::BIGINT)",
+                        page_size=len(devices))
+                if runs:
+                    execute_values(cursor, """
+                        UPDATE device_history AS h
+                        SET last_seen = GREATEST(h.last_seen, v.last_seen),
+                            heartbeat_count = h.heartbeat_count + v.beats
+                        FROM (VALUES %s) AS v(id, ts, last_seen, beats)
+                        WHERE h.id = v.id AND h.timestamp = v.ts
+                    """, [(run_id, ts, ls, beats) for (run_id, ts), (ls, beats) in runs.items()],
+                        template="(%s::BIGINT, %s::BIGINT, %s::BIGINT, %s::INTEGER)",
+                        page_size=len(runs))
+                conn.commit()
+                cursor.close()
+            self.flushes += 1
+        except Exception as e:
+            print(f"Gagal menulis last_seen gabungan ({len(devices)} device): {e}")
+            # Kembalikan ke buffer agar dicoba lagi pada interval berikutnya
+            with self._lock:
+                for device_id, last_seen in devices.items():
+                    if last_seen > self._devices.get(device_id, 0):
+                        self._devices[device_id] = last_seen
+                for key, (last_seen, beats) in runs.items():
+                    run = self._runs.setdefault(key, [last_seen, 0])
+                    run[0] = max(run[0], last_seen)
+                    run[1] += beats
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._devices)
+
+
+class CacheInvalidationListener:
+    """Thread yang LISTEN pada INVALIDATE_CHANNEL dan membuang entri cache terkait.
+
+    Jika koneksi listener terputus, notifikasi yang terlewat tidak bisa diketahui,
+    jadi seluruh cache dikosongkan setiap kali listener tersambung (ulang).
+    """
+
+    def __init__(self, cache, conn_kwargs, channel=INVALIDATE_CHANNEL, reconnect_delay=5):
+        self.cache = cache
+        self.conn_kwargs = conn_kwargs
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.conn_kwargs)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {self.channel};")
+                self.cache.clear()
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        device_id = conn.notifies.pop(0).payload
+                        if device_id == "*":
+                            self.cache.clear()
+                        else:
+                            self.cache.invalidate(device_id)
+            except Exception as e:
+                print(f"Listener invalidasi cache terputus: {e}")
+                self.cache.clear()
+                time.sleep(self.reconnect_delay)
+            finally:
+                if conn is not None:
+                    conn.close()
@@ -0,0 +1,68 @@
+"""
+Registry tipe perangkat: device_id -> (kategori, ikon) untuk dashboard.
+
+Setiap aturan berupa (pola regex, kategori, ikon) dan dicocokkan dengan
+re.search terhadap device_id; aturan pertama yang cocok menang, device tanpa
+aturan yang cocok masuk kategori default. Pola bisa berupa potongan nama
+("BED-MONITOR"), prefix ("^ICU-") atau regex bebas ("MRI|CT-SCANNER").
+
+Pola dikompilasi sekali saat registry dibuat. categorize_series() bekerja
+per kolom (str.contains per aturan lalu np.select), tanpa pemanggilan fungsi
+Python per baris, sehingga tetap cepat untuk puluhan ribu device.
+
+Aturan bisa diganti lewat file JSON:
+    [{"pattern": "^DIALYSIS-", "category": "Renal Care", "icon": "🩸"}, ...]
+"""
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+# (pola, kategori, ikon); urutan menentukan prioritas
+DEVICE_TYPES = (
+    ("BED-MONITOR", "Patient Monitoring", "🛏️"),
+    ("INFUSION-PUMP", "Infusion Systems", "💉"),
+    ("TEMP-SENSOR", "Environmental Sensors", "🌡️"),
+    ("VENTILATOR", "Respiratory Equipment", "🫁"),
+    ("MRI|CT-SCANNER", "Imaging Systems", "📷"),
+)
+DEFAULT_TYPE = ("Other Devices", "⚙️")
+
+
+class DeviceRegistry:
+    def __init__(self, rules=DEVICE_TYPES, default=DEFAULT_TYPE):
+        self.rules = tuple(rules)
+        self.default = default
+        self._patterns = [re.compile(pattern) for pattern, _, _ in self.rules]
+        # Indeks terakhir = default
+        self._categories = np.array([c for _, c, _ in self.rules] + [default[0]], dtype=object)
+        self._icons = np.array([i for _, _, i in self.rules] + [default[1]], dtype=object)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, encoding="utf-8") as f:
+            rules = json.load(f)
+        return cls([(r["pattern"], r["category"], r["icon"]) for r in rules])
+
+    def categorize(self, device_id):
+        """(kategori, ikon) untuk satu device_id."""
+        for pattern, (_, category, icon) in zip(self._patterns, self.rules):
+            if pattern.search(device_id):
+                return category, icon
+        return self.default
+
+    def rule_index(self, device_ids):
+        """Indeks aturan pertama yang cocok per device_id (len(rules) = default)."""
+        ids = pd.Series(device_ids, dtype=object).astype(str)
+        if ids.empty or not self._patterns:
+            return np.full(len(ids), len(self.rules), dtype=np.int64)
+        matches = [ids.str.contains(pattern, regex=True).to_numpy() for pattern in self._patterns]
+        return np.select(matches, list(range(len(self.rules))), default=len(self.rules))
+
+    def categorize_series(self, device_ids):
+        """DataFrame kolom category & icon, sejajar dengan device_ids."""
+        index = device_ids.index if isinstance(device_ids, pd.Series) else None
+        idx = self.rule_index(device_ids)
+        return pd.DataFrame({"category": self._categories[idx], "icon": self._icons[idx]},
+                            index=index)
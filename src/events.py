@@ -0,0 +1,113 @@
+"""
+Event perubahan perangkat lewat PostgreSQL LISTEN/NOTIFY.
+
+API mengirim NOTIFY pada channel EVENTS_CHANNEL di dalam transaksi check-in,
+sehingga event hanya terkirim jika data benar-benar ter-commit:
+  {"type": "status", "device_id": ..., "status": ..., "previous": ...}
+  {"type": "ticket_opened", "device_id": ..., "ticket_id": ..., "issue_type": ...}
+  {"type": "ticket_resolved", "device_id": ..., "ticket_id": ...}
+Heartbeat tanpa perubahan status tidak menghasilkan event.
+
+Dashboard memakai satu EventListener per proses: thread yang LISTEN lalu
+menaikkan `version` dan memanggil callback, tanpa query apa pun saat idle.
+"""
+import json
+import select
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extensions
+
+EVENTS_CHANNEL = "device_events"
+
+
+def status_event(device_id, status, previous):
+    return {"type": "status", "device_id": device_id, "status": status, "previous": previous}
+
+def ticket_opened_event(device_id, ticket_id, issue_type=None):
+    return {"type": "ticket_opened", "device_id": device_id, "ticket_id": ticket_id,
+            "issue_type": issue_type}
+
+def ticket_resolved_event(device_id, ticket_id):
+    return {"type": "ticket_resolved", "device_id": device_id, "ticket_id": ticket_id}
+
+
+def notify_events(cursor, events, channel=EVENTS_CHANNEL):
+    """Mengirim semua event dalam satu statement; terkirim ke listener saat commit."""
+    if not events:
+        return
+    cursor.execute("SELECT pg_notify(%s, e) FROM unnest(%s::TEXT[]) AS e",
+                   (channel, [json.dumps(event) for event in events]))
+
+
+class EventListener:
+    """Thread LISTEN bersama untuk semua sesi dashboard dalam satu proses.
+
+    - version naik setiap ada event (sesi cukup membandingkan angka, tanpa query)
+    - recent menyimpan event terakhir untuk notifikasi di UI
+    - on_event(event) dipanggil dari thread listener
+    Saat (re)connect version juga dinaikkan karena event selama terputus tidak diketahui.
+    """
+
+    def __init__(self, conn_kwargs, on_event=None, channel=EVENTS_CHANNEL,
+                 reconnect_delay=5, keep=200):
+        self.conn_kwargs = conn_kwargs
+        self.on_event = on_event
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.recent = deque(maxlen=keep)   # [(version, event)]
+        self.version = 0
+        self.connected = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="device-events", daemon=True)
+                self._thread.start()
+        return self
+
+    def _publish(self, event):
+        with self._lock:
+            self.version += 1
+            if event is not None:
+                self.recent.append((self.version, event))
+        if self.on_event:
+            self.on_event(event)
+
+    def events_since(self, version):
+        with self._lock:
+            return [event for v, event in self.recent if v > version]
+
+    def _run(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.conn_kwargs)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {self.channel};")
+                self.connected = True
+                self._publish(None)
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        payload = conn.notifies.pop(0).payload
+                        try:
+                            event = json.loads(payload)
+                        except ValueError:
+                            event = {"type": "unknown", "payload": payload}
+                        self._publish(event)
+            except Exception as e:
+                print(f"Listener event perangkat terputus: {e}")
+                self.connected = False
+                time.sleep(self.reconnect_delay)
+            finally:
+                self.connected = False
+                if conn is not None:
+                    conn.close()
@@ -0,0 +1,246 @@
+"""
+Deteksi flapping dan de-duplikasi alert untuk mesin ticket API.
+
+Tanpa detektor, device yang bolak-balik online <-> error membuka dan menutup
+ticket baru pada setiap pantulan. FlapDetector menyimpan state per device di
+memori API (tanpa query tambahan per check-in) dan memutuskan aksi ticket:
+
+- buka   : status bermasalah (error/offline) bertahan >= open_debounce detik
+- tutup  : status online bertahan >= resolve_debounce detik
+- flapping: jumlah perpindahan kelas (online <-> bermasalah) dalam flap_window
+  mencapai flap_high. Selama flapping ticket dibuka tanpa debounce dan hanya
+  ditutup setelah online tenang flap_quiet detik; status flapping baru berakhir
+  saat perpindahan dalam jendela turun ke flap_low (histeresis).
+- Setiap kali device kembali bermasalah selama ticket masih aktif, pantulan
+  dihitung (flap_count) dan ticket yang sama diperbarui, bukan ticket baru.
+
+Keputusan dibuat dalam FlapTransaction (FlapDetector.begin()) di atas salinan
+state device; state detektor baru berubah lewat commit() setelah transaksi
+database ter-commit. Transaksi yang gagal - atau batch antrian ingest yang
+diulang per item - cukup dibuang, sehingga pantulan tidak terhitung dua kali
+dan timer debounce/histeresis tidak bergeser.
+
+Ticket aktif per device diketahui dari transaksi yang membuka/menutupnya
+(RETURNING ticket_id), dari event ticket_opened / ticket_resolved (events.py)
+dan dari muat ulang tabel tickets. Device yang status ticket-nya belum
+diketahui (mis. worker/CLI tanpa listener, atau listener yang terputus) tetap
+ditutup setelah online stabil: UPDATE ... WHERE device_id AND is_active memakai
+partial index uniq_tickets_active_device, tanpa bergantung pada ticket_id di cache.
+"""
+import threading
+from collections import deque, namedtuple
+
+PROBLEM_STATUSES = ('error', 'offline')
+
+OPEN_DEBOUNCE = 30       # detik status bermasalah bertahan sebelum ticket dibuka
+RESOLVE_DEBOUNCE = 60    # detik status online bertahan sebelum ticket ditutup
+FLAP_WINDOW = 600        # detik jendela penghitungan perpindahan
+FLAP_HIGH = 6            # perpindahan dalam jendela -> mulai flapping
+FLAP_LOW = 2             # perpindahan dalam jendela <= ini -> flapping berakhir
+FLAP_QUIET = 300         # detik online tenang sebelum ticket device flapping ditutup
+
+# action: "ticket" (buka/perbarui ticket aktif), "resolve", atau None
+Decision = namedtuple("Decision", "action flap_count flapping ticket_id")
+
+
+class _DeviceState:
+    __slots__ = ("problem", "since", "flips", "flapping", "ticket_id", "ticket_known", "flap_count")
+
+    def __init__(self):
+        self.problem = None      # kelas status terakhir (True = error/offline)
+        self.since = None        # waktu masuk kelas status terakhir
+        self.flips = deque()     # waktu perpindahan kelas dalam flap_window
+        self.flapping = False
+        self.ticket_id = None    # ticket aktif (dari transaksi / event / muat ulang)
+        self.ticket_known = False  # False: ada tidaknya ticket aktif belum diketahui
+        self.flap_count = 0      # pantulan selama ticket aktif
+
+    def copy(self):
+        other = _DeviceState()
+        other.problem, other.since, other.flapping = self.problem, self.since, self.flapping
+        other.flips = deque(self.flips)
+        other.ticket_id, other.ticket_known = self.ticket_id, self.ticket_known
+        other.flap_count = self.flap_count
+        return other
+
+
+class FlapTransaction:
+    """Keputusan ticket untuk satu transaksi database (satu check-in atau satu batch).
+
+    observe() bekerja pada salinan state; ticket_opened() / ticket_resolved()
+    mencatat hasil statement ticket. commit() dipanggil setelah transaksi database
+    ter-commit; transaksi yang gagal cukup dibuang.
+    """
+
+    def __init__(self, detector):
+        self.detector = detector
+        self._states = {}     # device_id -> salinan state termasuk check-in transaksi ini
+        self._tickets = {}    # device_id -> ticket aktif setelah transaksi (None = ditutup)
+        self.suppressed_opens = 0
+        self.suppressed_resolves = 0
+
+    def observe(self, device_id, status, now, force=False):
+        """Catat satu check-in dan kembalikan Decision untuk ticket device ini.
+
+        Check-in berikutnya untuk device yang sama dalam transaksi ini melanjutkan
+        state hasil check-in sebelumnya. force=True membuka ticket tanpa debounce
+        (mis. offline dari watchdog heartbeat, yang sudah menunggu timeout-nya sendiri).
+        """
+        state = self._states.get(device_id)
+        if state is None:
+            state = self._states[device_id] = self.detector._snapshot(device_id)
+        return self.detector._step(self, state, status, now, force)
+
+    def ticket_opened(self, device_id, ticket_id):
+        """Ticket aktif device (baru atau diperbarui) dari RETURNING ticket_id."""
+        self._tickets[device_id] = ticket_id
+
+    def ticket_resolved(self, device_id):
+        """Ticket aktif device ditutup (atau memang tidak ada) dalam transaksi ini."""
+        self._tickets[device_id] = None
+
+    def commit(self):
+        self.detector._commit(self)
+
+
+class FlapDetector:
+    def __init__(self, open_debounce=OPEN_DEBOUNCE, resolve_debounce=RESOLVE_DEBOUNCE,
+                 flap_window=FLAP_WINDOW, flap_high=FLAP_HIGH, flap_low=FLAP_LOW,
+                 flap_quiet=FLAP_QUIET):
+        self.open_debounce = open_debounce
+        self.resolve_debounce = resolve_debounce
+        self.flap_window = flap_window
+        self.flap_high = flap_high
+        self.flap_low = flap_low
+        self.flap_quiet = flap_quiet
+        self._lock = threading.Lock()
+        self._devices = {}
+        self.suppressed_opens = 0
+        self.suppressed_resolves = 0
+
+    def _state(self, device_id):
+        state = self._devices.get(device_id)
+        if state is None:
+            state = self._devices[device_id] = _DeviceState()
+        return state
+
+    # --- Keputusan per check-in ---
+    def begin(self):
+        """Transaksi keputusan baru; commit() setelah transaksi database ter-commit."""
+        return FlapTransaction(self)
+
+    def _snapshot(self, device_id):
+        with self._lock:
+            state = self._devices.get(device_id)
+            return state.copy() if state is not None else _DeviceState()
+
+    def _step(self, tx, state, status, now, force):
+        problem = status in PROBLEM_STATUSES
+        if state.problem is None:
+            state.problem, state.since = problem, now
+        elif state.problem != problem:
+            state.problem, state.since = problem, now
+            state.flips.append(now)
+            if problem and state.ticket_id is not None:
+                state.flap_count += 1
+
+        while state.flips and state.flips[0] <= now - self.flap_window:
+            state.flips.popleft()
+        if not state.flapping and len(state.flips) >= self.flap_high:
+            state.flapping = True
+        elif state.flapping and len(state.flips) <= self.flap_low:
+            state.flapping = False
+
+        action = None
+        if problem:
+            if state.ticket_id is not None:
+                action = "ticket"
+            elif force or state.flapping or now - state.since >= self.open_debounce:
+                action = "ticket"
+                if state.flapping:
+                    # Ticket dibuka karena flapping: pantulan dalam jendela ikut dihitung
+                    state.flap_count = max(state.flap_count, len(state.flips) // 2)
+            else:
+                tx.suppressed_opens += 1
+        elif state.ticket_id is not None or not state.ticket_known:
+            # Ticket aktif ada, atau belum diketahui: ditutup per device_id setelah stabil
+            quiet = self.flap_quiet if state.flapping else self.resolve_debounce
+            if now - state.since >= quiet:
+                action = "resolve"
+            else:
+                tx.suppressed_resolves += 1
+        return Decision(action, state.flap_count, state.flapping, state.ticket_id)
+
+    def _commit(self, tx):
+        with self._lock:
+            for device_id, staged in tx._states.items():
+                state = self._state(device_id)
+                state.problem, state.since = staged.problem, staged.since
+                state.flips, state.flapping = staged.flips, staged.flapping
+                if device_id in tx._tickets:
+                    ticket_id = tx._tickets[device_id]
+                    state.ticket_id, state.ticket_known = ticket_id, True
+                    state.flap_count = staged.flap_count if ticket_id is not None else 0
+                elif state.ticket_id is not None and state.ticket_id == staged.ticket_id:
+                    state.flap_count = max(state.flap_count, staged.flap_count)
+            self.suppressed_opens += tx.suppressed_opens
+            self.suppressed_resolves += tx.suppressed_resolves
+
+    def pending(self, device_id):
+        """True jika keputusan ticket device ini masih menunggu debounce; heartbeat
+        berikutnya harus lewat jalur lengkap (bukan jalur cepat cache)."""
+        with self._lock:
+            state = self._devices.get(device_id)
+            if state is None or state.problem is None:
+                return False
+            if state.problem:
+                return state.ticket_id is None
+            return state.ticket_id is not None or not state.ticket_known
+
+    # --- Sinkronisasi ticket aktif ---
+    def _ticket_opened(self, device_id, ticket_id):
+        state = self._state(device_id)
+        state.ticket_id, state.ticket_known = ticket_id, True
+
+    def _ticket_resolved(self, device_id, ticket_id):
+        state = self._devices.get(device_id)
+        if state is not None and state.ticket_id in (ticket_id, None):
+            state.ticket_id, state.ticket_known = None, True
+            state.flap_count = 0
+
+    def apply_event(self, event):
+        """Terapkan event dari events.EventListener (idempoten)."""
+        with self._lock:
+            if event['type'] == 'ticket_opened':
+                self._ticket_opened(event['device_id'], event['ticket_id'])
+            elif event['type'] == 'ticket_resolved':
+                self._ticket_resolved(event['device_id'], event['ticket_id'])
+
+    def reload(self, conn):
+        """Ambil ticket aktif dari database (saat start / listener reconnect)."""
+        cursor = conn.cursor()
+        cursor.execute("SELECT device_id, ticket_id, flap_count FROM tickets WHERE is_active = TRUE")
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.commit()
+        self.load_active(rows)
+
+    def load_active(self, rows):
+        """Ganti ticket aktif dengan baris (device_id, ticket_id, flap_count) dari tabel tickets."""
+        with self._lock:
+            for state in self._devices.values():
+                state.ticket_id, state.ticket_known = None, True
+                state.flap_count = 0
+            for device_id, ticket_id, flap_count in rows:
+                state = self._state(device_id)
+                state.ticket_id, state.ticket_known = ticket_id, True
+                state.flap_count = max(state.flap_count, flap_count or 0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tracked": len(self._devices),
+                "flapping": sum(1 for s in self._devices.values() if s.flapping),
+                "suppressed_opens": self.suppressed_opens,
+                "suppressed_resolves": self.suppressed_resolves,
+            }
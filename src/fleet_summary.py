@@ -0,0 +1,156 @@
+"""
+Ringkasan fleet di memori API: jumlah device per status, per kategori, per
+status x kategori, dan jumlah ticket aktif (total dan per issue type).
+
+Dimuat penuh sekali dari tabel devices & tickets, lalu diperbarui inkremental
+dari event LISTEN/NOTIFY (events.py) yang dikirim setiap check-in yang mengubah
+status atau membuka/menutup ticket. Karena sumbernya event yang ter-commit,
+semua penulis ikut terhitung (Flask, ASGI, antrian ingest, worker lain), dan
+setiap pembaruan hanya O(1). Saat listener (re)connect ringkasan dimuat ulang,
+karena event selama terputus tidak diketahui.
+
+Pembaruan bersifat idempoten (status terakhir per device dan himpunan ticket
+aktif disimpan). Event yang datang selama reload ditampung lalu diterapkan ulang
+setelah data dimuat, sehingga event di sekitar reload tidak hilang dan tidak
+menggandakan hitungan.
+"""
+import threading
+import time
+from collections import Counter
+
+from device_registry import DeviceRegistry
+
+STATUSES = ("online", "error", "offline")
+
+
+class FleetSummary:
+    def __init__(self, registry=None):
+        self.registry = registry or DeviceRegistry()
+        self._lock = threading.Lock()
+        self._devices = {}          # device_id -> (status, category)
+        self._tickets = {}          # ticket_id -> issue_type (ticket aktif)
+        self._by_status = Counter()
+        self._by_category = Counter()
+        self._by_status_category = Counter()
+        self._by_issue_type = Counter()
+        self.version = 0
+        self.updated_at = None
+        self.loaded = False
+        self._pending = None        # event yang datang selama reload
+
+    # --- Pemuatan penuh ---
+    def reload(self, conn):
+        with self._lock:
+            self._pending = []
+        try:
+            devices, tickets = self._fetch(conn)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            self._devices = {}
+            self._tickets = {}
+            for counter in (self._by_status, self._by_category,
+                            self._by_status_category, self._by_issue_type):
+                counter.clear()
+            for device_id, status in devices:
+                self._set_status(device_id, status)
+            for ticket_id, issue_type in tickets:
+                self._open_ticket(ticket_id, issue_type)
+            pending, self._pending = self._pending, None
+            for event in pending:
+                self._apply(event)
+            self.loaded = True
+            self._touch()
+
+    @staticmethod
+    def _fetch(conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT device_id, status FROM devices")
+        devices = cursor.fetchall()
+        cursor.execute("SELECT ticket_id, issue_type FROM tickets WHERE is_active = TRUE")
+        tickets = cursor.fetchall()
+        cursor.close()
+        conn.commit()
+        return devices, tickets
+
+    # --- Pembaruan inkremental (dipanggil dengan lock) ---
+    def _set_status(self, device_id, status):
+        old = self._devices.get(device_id)
+        if old is not None:
+            if old[0] == status:
+                return False
+            self._by_status[old[0]] -= 1
+            self._by_status_category[old] -= 1
+            category = old[1]
+        else:
+            category = self.registry.categorize(device_id)[0]
+            self._by_category[category] += 1
+        self._devices[device_id] = (status, category)
+        self._by_status[status] += 1
+        self._by_status_category[(status, category)] += 1
+        return True
+
+    def _open_ticket(self, ticket_id, issue_type):
+        if ticket_id in self._tickets:
+            return False
+        self._tickets[ticket_id] = issue_type
+        self._by_issue_type[issue_type] += 1
+        return True
+
+    def _resolve_ticket(self, ticket_id):
+        issue_type = self._tickets.pop(ticket_id, None)
+        if issue_type is None:
+            return False
+        self._by_issue_type[issue_type] -= 1
+        return True
+
+    def _touch(self):
+        self.version += 1
+        self.updated_at = int(time.time())
+
+    def _apply(self, event):
+        if event['type'] == 'status':
+            return self._set_status(event['device_id'], event['status'])
+        if event['type'] == 'ticket_opened':
+            issue_type = event.get('issue_type')
+            if issue_type is None:
+                status = self._devices.get(event['device_id'], ('offline',))[0]
+                issue_type = 'ERROR' if status == 'error' else 'OFFLINE'
+            return self._open_ticket(event['ticket_id'], issue_type)
+        if event['type'] == 'ticket_resolved':
+            return self._resolve_ticket(event['ticket_id'])
+        return False
+
+    def apply_event(self, event):
+        """Terapkan satu event dari events.EventListener. Mengembalikan True jika ringkasan berubah."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(event)
+                return False
+            changed = self._apply(event)
+            if changed:
+                self._touch()
+            return changed
+
+    # --- Baca ---
+    def snapshot(self):
+        """Ringkasan siap-JSON; biayanya sebanding jumlah kategori, bukan jumlah device."""
+        with self._lock:
+            by_status_category = {status: {} for status in STATUSES}
+            for (status, category), n in self._by_status_category.items():
+                if n:
+                    by_status_category.setdefault(status, {})[category] = n
+            return {
+                "version": self.version,
+                "updated_at": self.updated_at,
+                "loaded": self.loaded,
+                "total_devices": len(self._devices),
+                "by_status": {status: self._by_status.get(status, 0) for status in STATUSES},
+                "by_category": {c: n for c, n in sorted(self._by_category.items()) if n},
+                "by_status_category": by_status_category,
+                "active_tickets": len(self._tickets),
+                "active_tickets_by_type": {t: n for t, n in sorted(self._by_issue_type.items()) if n},
+            }
@@ -0,0 +1,225 @@
+"""
+Ekspor device_history (CSV / Parquet) untuk audit, dengan memori terbatas.
+
+Baris dibaca lewat named (server-side) cursor per `batch_size` baris, lalu
+ditulis bertahap: CSV per potongan teks, Parquet per row group. Tidak ada
+tahap yang menampung seluruh hasil di memori, jadi ekspor berminggu-minggu
+untuk ratusan device aman. Untuk CSV ke file lokal tersedia juga jalur
+COPY ... TO STDOUT (paling cepat, tanpa konversi di Python).
+
+Filter: device_id (satu atau lebih), status, dan rentang waktu [start, end).
+Rentang waktu memangkas partisi device_history yang dibaca.
+
+Dipakai oleh endpoint /api/v1/export/history di api.py, tombol unduh di
+dashboard, atau manual:
+    python history_export.py --from 2024-01-01 --to 2024-02-01 -o audit.csv
+    python history_export.py --device BED-MONITOR-101-ICU --status error offline \\
+        --format parquet -o errors.parquet
+"""
+import argparse
+import csv
+import io
+import sys
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import psycopg2
+
+LOCAL_TZ = ZoneInfo("Asia/Jakarta")
+FORMATS = ("csv", "parquet")
+BATCH_SIZE = 5000
+COLUMNS = ("device_id", "timestamp", "timestamp_local", "status", "message",
+           "last_seen", "heartbeat_count")
+
+
+def build_query(device_ids=None, statuses=None, start=None, end=None):
+    """SELECT ekspor beserta parameternya. Semua filter opsional."""
+    where, params = [], []
+    if device_ids:
+        where.append("device_id = ANY(%s)")
+        params.append(list(device_ids))
+    if statuses:
+        where.append("status = ANY(%s)")
+        params.append(list(statuses))
+    if start is not None:
+        where.append("timestamp >= %s")
+        params.append(int(start))
+    if end is not None:
+        where.append("timestamp < %s")
+        params.append(int(end))
+    query = f"""
+        SELECT device_id, timestamp,
+               to_char(to_timestamp(timestamp) AT TIME ZONE 'Asia/Jakarta',
+                       'YYYY-MM-DD HH24:MI:SS') AS timestamp_local,
+               status, message, last_seen, heartbeat_count
+        FROM device_history
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY timestamp, id
+    """
+    return query, params
+
+
+def iter_batches(conn, query, params, batch_size=BATCH_SIZE):
+    """Baris hasil query per batch lewat named cursor (di-fetch bertahap dari server)."""
+    cursor = conn.cursor(name="history_export")
+    cursor.itersize = batch_size
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def iter_csv(conn, query, params, batch_size=BATCH_SIZE):
+    """Potongan teks CSV (header lalu satu potongan per batch)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for rows in iter_batches(conn, query, params, batch_size):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _ChunkSink:
+    """File tulis-saja untuk ParquetWriter yang isinya bisa diambil per potongan."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema():
+    import pyarrow as pa  # dependensi opsional, hanya untuk format parquet
+    return pa.schema([
+        ("device_id", pa.string()),
+        ("timestamp", pa.int64()),
+        ("timestamp_local", pa.string()),
+        ("status", pa.string()),
+        ("message", pa.string()),
+        ("last_seen", pa.int64()),
+        ("heartbeat_count", pa.int32()),
+    ])
+
+
+def iter_parquet(conn, query, params, batch_size=BATCH_SIZE):
+    """Potongan byte file Parquet; setiap batch menjadi satu row group."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for rows in iter_batches(conn, query, params, batch_size):
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(conn, fmt="csv", batch_size=BATCH_SIZE, **filters):
+    """Generator potongan hasil ekspor (str untuk CSV, bytes untuk Parquet)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Format tidak dikenal: {fmt}")
+    query, params = build_query(**filters)
+    if fmt == "parquet":
+        return iter_parquet(conn, query, params, batch_size)
+    return iter_csv(conn, query, params, batch_size)
+
+
+def copy_csv(conn, fileobj, **filters):
+    """CSV lewat COPY ... TO STDOUT langsung ke file (jalur tercepat untuk CLI)."""
+    query, params = build_query(**filters)
+    cursor = conn.cursor()
+    try:
+        select = cursor.mogrify(query, params).decode()
+        cursor.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER)", fileobj)
+    finally:
+        cursor.close()
+
+
+def parse_time(value):
+    """Epoch detik atau tanggal/waktu ISO (waktu lokal WIB jika tanpa zona)."""
+    if value is None or value == "":
+        return None
+    if value.lstrip("-").isdigit():
+        return int(value)
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=LOCAL_TZ)
+    return int(dt.timestamp())
+
+
+def main():
+    from api import PG_CONN_KWARGS
+
+    parser = argparse.ArgumentParser(description="Ekspor device_history ke CSV/Parquet")
+    parser.add_argument("--device", nargs="+", help="satu atau lebih device_id")
+    parser.add_argument("--status", nargs="+", choices=["online", "error", "offline"])
+    parser.add_argument("--from", dest="start", help="epoch atau tanggal ISO (inklusif)")
+    parser.add_argument("--to", dest="end", help="epoch atau tanggal ISO (eksklusif)")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("-o", "--output", help="file tujuan (default: stdout, hanya CSV)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.format == "parquet" and not args.output:
+        parser.error("format parquet membutuhkan --output")
+    filters = dict(device_ids=args.device, statuses=args.status,
+                   start=parse_time(args.start), end=parse_time(args.end))
+
+    conn = psycopg2.connect(**PG_CONN_KWARGS)
+    try:
+        if args.format == "csv":
+            if args.output:
+                with open(args.output, "w", newline="") as f:
+                    copy_csv(conn, f, **filters)
+            else:
+                copy_csv(conn, sys.stdout, **filters)
+        else:
+            with open(args.output, "wb") as f:
+                for chunk in stream_export(conn, "parquet", args.batch_size, **filters):
+                    f.write(chunk)
+        conn.rollback()
+    finally:
+        conn.close()
+    if args.output:
+        print(f"Ekspor selesai: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Operasi tulis check-in secara batch (set-wise).
+
+Dipakai oleh endpoint /api/v1/checkin/batch: satu batch berisi banyak
+check-in diproses dengan beberapa statement multi-row, bukan 4-5 statement
+per perangkat. Setiap item adalah dict dengan key device_id, status,
+message, dan last_seen (epoch detik), serta opsional seq dan idempotency_key.
+"""
+import csv
+import io
+
+from psycopg2.extras import execute_values
+
+import events
+from dedup import SEQ_WINDOW, seq_verdict
+
+VALID_STATUSES = ('online', 'error', 'offline')
+PROBLEM_STATUSES = ('error', 'offline')
+
+
+def latest_per_device(items):
+    """Mengambil item terakhir per device (urutan batch = urutan kejadian)."""
+    latest = {}
+    for item in items:
+        latest[item['device_id']] = item
+    return list(latest.values())
+
+
+def filter_duplicates(cursor, items, seq_window=SEQ_WINDOW):
+    """Buang retry dan update basi dengan penjaga yang sama seperti jalur sinkron API.
+
+    - seq: dibandingkan dengan devices.last_seq (baris dikunci FOR UPDATE agar
+      writer lain tidak menyisip) dan dengan seq item sebelumnya dalam batch.
+    - idempotency_key: disimpan di checkin_idempotency; kunci yang sudah ada
+      (atau muncul dua kali dalam batch) adalah duplikat.
+    Item yang dibuang diberi key 'rejected' ("duplicate" / "stale"). Mengembalikan
+    item yang diterima dengan urutan tetap; batch tanpa seq/kunci tidak menambah query.
+    """
+    # Tanda dari percobaan sebelumnya (batch yang di-rollback lalu diulang) tidak berlaku lagi
+    for item in items:
+        item.pop('rejected', None)
+    if not any(i.get('seq') is not None or i.get('idempotency_key') is not None for i in items):
+        return items
+
+    sequenced = sorted({i['device_id'] for i in items if i.get('seq') is not None})
+    last = {}
+    if sequenced:
+        cursor.execute("""
+            SELECT device_id, last_seq, last_seen FROM devices
+            WHERE device_id = ANY(%s)
+            ORDER BY device_id
+            FOR UPDATE
+        """, (sequenced,))
+        last = {device_id: (last_seq, last_seen) for device_id, last_seq, last_seen in cursor.fetchall()}
+
+    in_order = []
+    for item in items:
+        seq = item.get('seq')
+        if seq is not None:
+            last_seq, last_seen = last.get(item['device_id'], (None, None))
+            verdict = seq_verdict(seq, last_seq, last_seen, item['last_seen'], seq_window)
+            if verdict is not None:
+                item['rejected'] = verdict
+                continue
+            last[item['device_id']] = (seq, item['last_seen'])
+        in_order.append(item)
+
+    # Kunci hanya disimpan untuk item yang lolos penjaga seq (seperti rollback di jalur sinkron)
+    keyed = {(i['device_id'], i['idempotency_key']): i['last_seen']
+             for i in in_order if i.get('idempotency_key') is not None}
+    new_keys = set()
+    if keyed:
+        new_keys = set(execute_values(cursor, """
+            INSERT INTO checkin_idempotency (device_id, idempotency_key, created_at)
+            VALUES %s
+            ON CONFLICT DO NOTHING
+            RETURNING device_id, idempotency_key
+        """, [key + (created_at,) for key, created_at in keyed.items()],
+            page_size=len(keyed), fetch=True))
+
+    accepted = []
+    for item in in_order:
+        if item.get('idempotency_key') is not None:
+            key = (item['device_id'], item['idempotency_key'])
+            if key not in new_keys:
+                item['rejected'] = "duplicate"
+                continue
+            new_keys.discard(key)
+        accepted.append(item)
+    return accepted
+
+
+def upsert_devices(cursor, items, now, seq_window=SEQ_WINDOW):
+    """Satu INSERT ... ON CONFLICT multi-row untuk status terkini tiap perangkat.
+
+    Mengembalikan {device_id: status sebelumnya} (None untuk device baru); CTE prev
+    membaca snapshot sebelum upsert sehingga transisi status bisa dideteksi.
+    Item dengan key 'seq' ikut memperbarui last_seq, yang hanya bisa naik selama
+    device tidak diam lebih dari seq_window detik (sama dengan upsert bersyarat di
+    api.checkin_transaction); item yang tersisa sudah disaring filter_duplicates.
+    row_updated_at = now (waktu tulis), high-water mark delta fetch dashboard.
+    """
+    rows = [(i['device_id'], i['last_seen'], i['status'], i['message'], i.get('seq'))
+            for i in latest_per_device(items)]
+    previous = execute_values(cursor, f"""
+        WITH v (device_id, last_seen, status, message, last_seq) AS (VALUES %s),
+        prev AS (
+            SELECT d.device_id, d.status FROM devices d JOIN v ON v.device_id = d.device_id
+        ),
+        upserted AS (
+            INSERT INTO devices (device_id, last_seen, status, message, last_seq, row_updated_at)
+            SELECT device_id, last_seen, status, message, last_seq, {int(now)} FROM v
+            ON CONFLICT (device_id) DO UPDATE SET
+                last_seen = EXCLUDED.last_seen,
+                status = EXCLUDED.status,
+                message = EXCLUDED.message,
+                row_updated_at = EXCLUDED.row_updated_at,
+                last_seq = CASE WHEN devices.last_seen < EXCLUDED.last_seen - {int(seq_window)}
+                                THEN COALESCE(EXCLUDED.last_seq, devices.last_seq)
+                                ELSE GREATEST(EXCLUDED.last_seq, devices.last_seq) END
+            WHERE EXCLUDED.last_seq IS NULL OR devices.last_seq IS NULL
+               OR EXCLUDED.last_seq > devices.last_seq
+               OR devices.last_seen < EXCLUDED.last_seen - {int(seq_window)}
+        )
+        SELECT device_id, status FROM prev
+    """, rows, template="(%s, %s::BIGINT, %s::TEXT, %s::TEXT, %s::BIGINT)",
+        page_size=max(len(rows), 1), fetch=True)
+    return dict(previous)
+
+
+def history_runs(items):
+    """Item -> baris history. Setiap item menjadi satu run dengan satu heartbeat."""
+    return [{"device_id": i['device_id'], "timestamp": i['last_seen'], "status": i['status'],
+             "message": i['message'], "last_seen": i['last_seen'], "heartbeat_count": 1}
+            for i in items]
+
+
+def insert_history(cursor, runs):
+    """Menulis baris history (run) dengan satu INSERT multi-row."""
+    rows = [(r['device_id'], r['timestamp'], r['status'], r['message'],
+             r['last_seen'], r['heartbeat_count']) for r in runs]
+    execute_values(cursor, """
+        INSERT INTO device_history (device_id, timestamp, status, message, last_seen, heartbeat_count)
+        VALUES %s
+    """, rows, page_size=max(len(rows), 1))
+
+
+def copy_history(cursor, runs):
+    """Seperti insert_history tetapi memakai COPY FROM STDIN (lebih murah untuk batch besar)."""
+    buf = io.StringIO()
+    # QUOTE_NONNUMERIC: message kosong ditulis "" sehingga tersimpan '' (bukan NULL),
+    # sama seperti hasil INSERT biasa
+    writer = csv.writer(buf, quoting=csv.QUOTE_NONNUMERIC)
+    for r in runs:
+        writer.writerow((r['device_id'], r['timestamp'], r['status'], r['message'],
+                         r['last_seen'], r['heartbeat_count']))
+    buf.seek(0)
+    cursor.copy_expert(
+        "COPY device_history (device_id, timestamp, status, message, last_seen, heartbeat_count) "
+        "FROM STDIN WITH (FORMAT csv)",
+        buf,
+    )
+
+
+def compact_history(cursor, items):
+    """Mode "changes": hanya transisi status/message yang menjadi baris baru.
+
+    Heartbeat dengan status dan message yang sama seperti run terakhir cukup
+    memperbarui last_seen dan heartbeat_count run tersebut. Run terakhir tiap
+    device di database diambil sekaligus untuk seluruh batch (LATERAL ... LIMIT 1). Mengembalikan
+    run baru yang masih harus ditulis (insert_history / copy_history).
+    """
+    device_ids = list({i['device_id'] for i in items})
+    # Satu probe index (device_id, timestamp) per device, seperti status_spans.SPANS_SQL;
+    # DISTINCT ON akan membaca seluruh history device di semua partisi
+    cursor.execute("""
+        SELECT h.id, h.timestamp, d.device_id, h.status, h.message
+        FROM unnest(%s::text[]) AS d(device_id)
+        CROSS JOIN LATERAL (
+            SELECT id, timestamp, status, message
+            FROM device_history h
+            WHERE h.device_id = d.device_id
+            ORDER BY h.timestamp DESC, h.id DESC
+            LIMIT 1
+        ) h
+    """, (device_ids,))
+    # device_id -> run yang sedang berjalan; run dari database punya key 'id'
+    open_runs = {device_id: {"id": run_id, "timestamp": ts, "status": status, "message": message,
+                             "last_seen": None, "heartbeat_count": 0}
+                 for run_id, ts, device_id, status, message in cursor.fetchall()}
+
+    new_runs = []
+    for i in items:
+        run = open_runs.get(i['device_id'])
+        if run and run['status'] == i['status'] and run['message'] == i['message']:
+            run['last_seen'] = i['last_seen']
+            run['heartbeat_count'] += 1
+            continue
+        run = {"device_id": i['device_id'], "timestamp": i['last_seen'], "status": i['status'],
+               "message": i['message'], "last_seen": i['last_seen'], "heartbeat_count": 1}
+        open_runs[i['device_id']] = run
+        new_runs.append(run)
+
+    extended = [(run['id'], run['timestamp'], run['last_seen'], run['heartbeat_count'])
+                for run in open_runs.values() if 'id' in run and run['heartbeat_count']]
+    if extended:
+        execute_values(cursor, """
+            UPDATE device_history AS h
+            SET last_seen = v.last_seen,
+                heartbeat_count = h.heartbeat_count + v.beats
+            FROM (VALUES %s) AS v(id, ts, last_seen, beats)
+            WHERE h.id = v.id AND h.timestamp = v.ts
+        """, extended, template="(%s::BIGINT, %s::BIGINT, %s::BIGINT, %s::INTEGER)",
+            page_size=len(extended))
+    return new_runs
+
+
+def reconcile_tickets(cursor, items, now, flaps=None):
+    """Buka/perbarui/tutup ticket untuk seluruh batch berdasarkan status terakhir per device.
+
+    Dengan flaps (flap_detector.FlapTransaction), setiap item dicatat berurutan
+    dan hanya keputusan terakhir per device yang dijalankan (debounce & flapping);
+    ticket yang dibuka/ditutup dicatat ke flaps, yang di-commit pemanggil setelah
+    transaksi database ter-commit.
+    Mengembalikan (created, resolved): created = {device_id: ticket_id} untuk
+    ticket baru, resolved = [(ticket_id, device_id)] untuk ticket yang ditutup.
+    """
+    latest = latest_per_device(items)
+    if flaps is None:
+        online_ids = [i['device_id'] for i in latest if i['status'] == 'online']
+        problems = [i for i in latest if i['status'] in PROBLEM_STATUSES]
+        flap_counts = {}
+    else:
+        decisions = {i['device_id']: flaps.observe(i['device_id'], i['status'], i['last_seen'])
+                     for i in items}
+        online_ids = [i['device_id'] for i in latest if decisions[i['device_id']].action == 'resolve']
+        problems = [i for i in latest if decisions[i['device_id']].action == 'ticket']
+        flap_counts = {device_id: d.flap_count for device_id, d in decisions.items()}
+
+    resolved = []
+    if online_ids:
+        cursor.execute('''
+            UPDATE tickets
+            SET is_active = FALSE,
+                resolved_at = %s,
+                updated_at = %s,
+                status = 'resolved'
+            WHERE is_active = TRUE AND device_id = ANY(%s)
+            RETURNING ticket_id, device_id
+        ''', (now, now, online_ids))
+        resolved = cursor.fetchall()
+        if flaps is not None:
+            for device_id in online_ids:
+                flaps.ticket_resolved(device_id)
+
+    created = {}
+    if problems:
+        # Satu INSERT ... ON CONFLICT pada partial unique index (device_id) WHERE is_active:
+        # device tanpa ticket aktif mendapat ticket baru, sisanya cukup diperbarui.
+        # xmax = 0 hanya berlaku untuk baris yang benar-benar baru di-insert.
+        # ticket_id = TKT-timestamp-nomor dari sequence ticket_seq: unik lintas batch,
+        # worker dan ticket lama (device berakhiran sama tidak lagi bentrok).
+        rows = []
+        for i in problems:
+            issue_type = 'ERROR' if i['status'] == 'error' else 'OFFLINE'
+            rows.append((now, i['device_id'], i['status'], issue_type, i['message'], now, now,
+                         flap_counts.get(i['device_id'], 0)))
+        returned = execute_values(cursor, '''
+            INSERT INTO tickets
+            (ticket_id, device_id, status, issue_type, message, created_at, updated_at, is_active,
+             flap_count)
+            VALUES %s
+            ON CONFLICT (device_id) WHERE is_active = TRUE DO UPDATE
+            SET updated_at = EXCLUDED.updated_at, message = EXCLUDED.message,
+                flap_count = GREATEST(tickets.flap_count, EXCLUDED.flap_count)
+            RETURNING device_id, ticket_id, (xmax = 0) AS inserted
+        ''', rows, template="('TKT-' || %s::BIGINT || '-' || nextval('ticket_seq'), "
+                     "%s, %s, %s, %s, %s, %s, TRUE, %s)",
+            page_size=len(rows), fetch=True)
+        created = {device_id: ticket_id for device_id, ticket_id, inserted in returned if inserted}
+        if flaps is not None:
+            for device_id, ticket_id, _ in returned:
+                flaps.ticket_opened(device_id, ticket_id)
+
+    return created, resolved
+
+
+def write_checkins(conn, items, now, use_copy=False, history_mode="all", flaps=None,
+                   seq_window=SEQ_WINDOW):
+    """Menulis satu batch check-in dalam satu transaksi (commit oleh pemanggil).
+
+    flaps (flap_detector.FlapTransaction) opsional; pemanggil memanggil
+    flaps.commit() hanya setelah conn.commit() berhasil. Item duplikat/basi
+    (seq, idempotency_key) tidak ditulis dan ditandai key 'rejected'.
+
+    Transisi status dan ticket yang dibuka/ditutup dikirim sebagai NOTIFY
+    (events.EVENTS_CHANNEL) di transaksi yang sama.
+    """
+    cursor = conn.cursor()
+    items = filter_duplicates(cursor, items, seq_window)
+    if not items:
+        cursor.close()
+        return {}, []
+    previous = upsert_devices(cursor, items, now, seq_window)
+    if history_mode == "changes":
+        runs = compact_history(cursor, items)
+    else:
+        runs = history_runs(items)
+    if runs:
+        if use_copy:
+            copy_history(cursor, runs)
+        else:
+            insert_history(cursor, runs)
+    created, resolved = reconcile_tickets(cursor, items, now, flaps)
+
+    latest = latest_per_device(items)
+    notify = [events.status_event(i['device_id'], i['status'], previous.get(i['device_id']))
+              for i in latest if previous.get(i['device_id']) != i['status']]
+    issue_types = {i['device_id']: i['status'].upper() for i in latest}
+    notify += [events.ticket_opened_event(device_id, ticket_id, issue_types.get(device_id))
+               for device_id, ticket_id in created.items()]
+    notify += [events.ticket_resolved_event(device_id, ticket_id) for ticket_id, device_id in resolved]
+    events.notify_events(cursor, notify)
+
+    cursor.close()
+    return created, resolved
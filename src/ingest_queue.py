@@ -0,0 +1,219 @@
+"""
+Antrian ingest write-behind dengan group commit.
+
+Check-in yang sudah divalidasi dimasukkan ke antrian in-process yang terbatas.
+Satu thread writer mengosongkan antrian per batch - saat batch mencapai
+flush_size atau saat flush_interval sejak item pertama terlewati - lalu
+menulisnya dalam satu transaksi (COPY ke device_history + upsert devices
+multi-row + rekonsiliasi ticket). Latensi API tidak lagi terikat fsync Postgres.
+
+Check-in di antrian sudah dijawab 202, jadi gangguan koneksi/pool tidak boleh
+membuangnya: batch dikembalikan ke kepala antrian dan dicoba lagi dengan backoff
+(antrian yang penuh menjawab 429 sebagai backpressure). Hanya error data yang
+memecah batch per item; item yang tetap gagal dibuang, dihitung di metrik
+"dropped" dan dilaporkan lewat on_dropped.
+"""
+import threading
+import time
+from collections import deque
+
+import psycopg2
+
+import ingest
+from db_pool import PoolTimeout
+from dedup import SEQ_WINDOW
+
+# Gangguan sementara: koneksi putus, database restart, pool habis
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeout)
+
+
+class QueueFull(Exception):
+    """Dilempar saat antrian penuh; API menjawab 429 agar klien mencoba lagi."""
+
+
+class IngestQueue:
+    def __init__(self, pool, now_fn, maxsize=10000, flush_size=500, flush_interval=0.2,
+                 history_mode="all", on_flushed=None, on_dropped=None, flap_detector=None,
+                 seq_window=SEQ_WINDOW, retry_initial=0.5, retry_max=30.0):
+        self.pool = pool
+        self.now_fn = now_fn
+        self.history_mode = history_mode
+        # Jendela seq untuk penjaga duplikat/basi (ingest.filter_duplicates)
+        self.seq_window = seq_window
+        # flap_detector.FlapDetector opsional untuk keputusan buka/tutup ticket
+        self.flap_detector = flap_detector
+        self.maxsize = maxsize
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        # Callback opsional dipanggil setelah batch ter-commit: on_flushed(items, created, resolved)
+        self.on_flushed = on_flushed
+        # Callback opsional untuk item yang dibuang karena error data: on_dropped(items)
+        self.on_dropped = on_dropped
+        # Backoff (detik) saat batch dikembalikan ke antrian karena gangguan sementara
+        self.retry_initial = retry_initial
+        self.retry_max = retry_max
+        self._retry_delay = 0.0
+        self._retry_at = 0.0
+
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+        # Metrik
+        self._enqueued = 0
+        self._rejected = 0
+        self._written = 0
+        self._dropped = 0
+        self._retries = 0
+        self._batches = 0
+        self._last_batch_size = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    # --- Sisi produsen (thread request) ---
+    def submit(self, item):
+        self.submit_many([item])
+
+    def submit_many(self, items):
+        """Memasukkan item secara all-or-nothing; QueueFull jika kapasitas tidak cukup."""
+        self._ensure_started()
+        with self._cond:
+            if self._stopping:
+                raise QueueFull("Antrian sedang dihentikan")
+            if len(self._items) + len(items) > self.maxsize:
+                self._rejected += len(items)
+                raise QueueFull(f"Antrian penuh ({len(self._items)}/{self.maxsize})")
+            self._items.extend(items)
+            self._enqueued += len(items)
+            if len(self._items) >= self.flush_size:
+                self._cond.notify()
+
+    # --- Thread writer ---
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+                self._thread.start()
+
+    def start(self):
+        self._ensure_started()
+
+    def _next_batch(self):
+        """Menunggu sampai batch penuh, jendela waktu habis, atau stop; lalu ambil batch."""
+        with self._cond:
+            while not self._items and not self._stopping:
+                self._cond.wait()
+            # Batch yang dikembalikan karena gangguan menunggu backoff dulu
+            while self._items and (remaining := self._retry_at - time.monotonic()) > 0:
+                self._cond.wait(remaining)
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._items) < self.flush_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(len(self._items), self.flush_size)
+            return [self._items.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+                continue
+            with self._cond:
+                if self._stopping and not self._items:
+                    return
+
+    def _write(self, items):
+        # Keputusan flapping baru disimpan setelah commit: batch yang gagal lalu
+        # diulang per item tidak mencatat check-in yang sama dua kali
+        flaps = self.flap_detector.begin() if self.flap_detector else None
+        with self.pool.connection() as conn:
+            created, resolved = ingest.write_checkins(conn, items, self.now_fn(), use_copy=True,
+                                                     history_mode=self.history_mode,
+                                                     flaps=flaps, seq_window=self.seq_window)
+            conn.commit()
+        if flaps is not None:
+            flaps.commit()
+        if self.on_flushed:
+            self.on_flushed(items, created, resolved)
+
+    def _requeue(self, items, error):
+        """Kembalikan item ke kepala antrian (urutan tetap) dan tunda flush berikutnya."""
+        with self._cond:
+            self._items.extendleft(reversed(items))
+            self._retries += 1
+            self._retry_delay = min(self.retry_max, max(self.retry_initial, self._retry_delay * 2))
+            self._retry_at = time.monotonic() + self._retry_delay
+        print(f"Database tidak tersedia, {len(items)} check-in dikembalikan ke antrian; "
+              f"dicoba lagi dalam {self._retry_delay:.1f} detik: {error}")
+
+    def _flush(self, batch):
+        started = time.monotonic()
+        written, dropped = 0, []
+        try:
+            self._write(batch)
+            written = len(batch)
+        except TRANSIENT_ERRORS as e:
+            self._requeue(batch, e)
+        except Exception as e:
+            # Error data: satu item buruk tidak boleh membuang seluruh batch, ulangi per item
+            print(f"Flush batch ({len(batch)} item) gagal, mencoba per item: {e}")
+            for n, item in enumerate(batch):
+                try:
+                    self._write([item])
+                    written += 1
+                except TRANSIENT_ERRORS as item_error:
+                    self._requeue(batch[n:], item_error)
+                    break
+                except Exception as item_error:
+                    dropped.append(item)
+                    print(f"Check-in {item.get('device_id')} dibuang: {item_error}")
+        if dropped and self.on_dropped:
+            self.on_dropped(dropped)
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._cond:
+            if written:
+                self._retry_delay = 0.0
+            self._written += written
+            self._dropped += len(dropped)
+            self._batches += 1
+            self._last_batch_size = len(batch)
+            self._last_flush_ms = elapsed_ms
+            self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+
+    # --- Shutdown & metrik ---
+    def stop(self, timeout=30):
+        """Menolak item baru lalu menunggu antrian habis ditulis (graceful drain)."""
+        with self._cond:
+            self._stopping = True
+            pending = len(self._items)
+            self._cond.notify_all()
+        if self._thread is not None:
+            if pending:
+                print(f"Menunggu {pending} check-in di antrian ditulis ke database...")
+            self._thread.join(timeout)
+
+    def metrics(self):
+        with self._cond:
+            return {
+                "depth": len(self._items),
+                "maxsize": self.maxsize,
+                "enqueued": self._enqueued,
+                "rejected": self._rejected,
+                "written": self._written,
+                "dropped": self._dropped,
+                "retries": self._retries,
+                "batches": self._batches,
+                "last_batch_size": self._last_batch_size,
+                "last_flush_ms": round(self._last_flush_ms, 2),
+                "max_flush_ms": round(self._max_flush_ms, 2),
+                "avg_flush_ms": round(self._total_flush_ms / self._batches, 2) if self._batches else 0.0,
+            }
@@ -1,12 +1,22 @@
+import html
+import os
+import time
 import streamlit as st
-import psycopg2
 import pandas as pd
-import time
+import numpy as np
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
 from zoneinfo import ZoneInfo
 import plotly.graph_objects as go
-import plotly.express as px
+import requests
 
+from db_pool import ConnectionPool
+from delta_snapshot import DeltaSnapshot
+from device_cache import INVALIDATE_CHANNEL
+from device_registry import DeviceRegistry
+from events import EventListener
+from single_flight import SingleFlight
+import uptime
 
 # Konfigurasi Database
 PG_HOST = "localhost"
@@ -15,11 +25,61 @@ PG_USER = "it_support_user"
 PG_PASSWORD = "v1r"
 PG_DATABASE = "hospital_iot_db"
 
+# Konfigurasi Connection Pool (satu pool per proses Streamlit, dipakai semua sesi)
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 5
+POOL_TIMEOUT = 10
+POOL_RECYCLE = 1800
+POOL_HEALTH_CHECK = 30
+
+# URL API: API_BASE_URL dipakai server dashboard (ringkasan fleet), API_PUBLIC_URL
+# dipakai browser operator (tautan ekspor history yang di-stream oleh API). Bisa
+# diatur lewat variabel lingkungan IOT_API_BASE_URL / IOT_API_PUBLIC_URL.
+API_BASE_URL = os.environ.get("IOT_API_BASE_URL", "http://127.0.0.1:5000")
+API_PUBLIC_URL = os.environ.get("IOT_API_PUBLIC_URL", API_BASE_URL)
+
+# Registry tipe perangkat (pola -> kategori & ikon); None = aturan bawaan
+# device_registry.DEVICE_TYPES, atau path file JSON berisi aturan sendiri
+DEVICE_REGISTRY_FILE = None
+
 # Konfigurasi Timezone
 LOCAL_TZ = ZoneInfo("Asia/Jakarta")
 
 # Konfigurasi Page
-delay = 10
+EVENT_POLL = 0.5    # detik antar pengecekan versi event (di memori, tanpa query)
+EVENT_RERUN_INTERVAL = 2   # detik minimum antar rerun yang dipicu event (badai event digabung)
+
+# Interval refresh per fragment (detik) saat listener terputus (mode polling);
+# hanya fragment itu yang di-rerun
+KPI_REFRESH = 2
+DEVICE_TILE_REFRESH = 5
+TICKET_REFRESH = 5
+CHART_REFRESH = 30
+# Saat listener tersambung halaman di-rerun oleh event; timer fragment dan umur
+# snapshot hanya cadangan lambat (mis. last_seen heartbeat yang tidak mengirim event)
+FALLBACK_REFRESH = 60
+
+# Jenis event yang membuat halaman di-rerun (halaman lain hanya memakai timer)
+PAGE_EVENTS = {
+    "Monitoring Overview": ("status", "ticket_opened", "ticket_resolved"),
+    "Active Tickets": ("ticket_opened", "ticket_resolved"),
+}
+
+# Ukuran halaman ticket
+HISTORY_PAGE_SIZE = 50
+TICKET_CARDS_PER_PAGE = 20
+DEVICE_CARDS_PER_PAGE = 24
+
+# Urutan status di grid device (bermasalah lebih dulu)
+STATUS_RANK = {'offline': 0, 'error': 1, 'online': 2}
+
+# Warna tetap per status untuk grafik (bukan berdasarkan urutan data)
+STATUS_COLORS = {'online': '#10b981', 'error': '#ef4444', 'offline': '#6b7280'}
+
+# Jumlah bucket grafik timeline (tetap untuk rentang 1 jam s/d 90 hari)
+TIMELINE_POINTS = 300
+TIMELINE_WINDOWS = {"1 hour": 1, "6 hours": 6, "24 hours": 24, "7 days": 24 * 7,
+                    "30 days": 24 * 30, "90 days": 24 * 90}
 st.set_page_config(
     page_title="Hospital IoT Monitoring System",
     page_icon="🏥",
@@ -112,76 +172,247 @@ def get_local_now():
     """Mengembalikan datetime sekarang dalam timezone lokal (Asia/Jakarta)"""
     return datetime.now(LOCAL_TZ)
 
+# Pool koneksi bersama: st.cache_resource membuat satu instance per proses yang
+# dipakai ulang oleh semua sesi browser dan semua rerun (tidak ada connect per query).
+# Koneksi yang mati/terlalu tua dibuang dan dibuat ulang oleh pool (health check).
+@st.cache_resource
+def get_db_pool():
+    return ConnectionPool(
+        minconn=POOL_MIN_CONN, maxconn=POOL_MAX_CONN, timeout=POOL_TIMEOUT,
+        recycle=POOL_RECYCLE, health_check_after=POOL_HEALTH_CHECK,
+        host=PG_HOST, port=PG_PORT, user=PG_USER,
+        password=PG_PASSWORD, database=PG_DATABASE,
+        options="-c timezone=Asia/Jakarta",
+    )
+
+@st.cache_resource
+def get_single_flight():
+    return SingleFlight()
+
+# Menjalankan query baca lewat pool. Saat cache_data kedaluwarsa, banyak sesi bisa
+# rerun bersamaan dengan query yang sama: single-flight memastikan hanya satu yang
+# benar-benar ke database, sisanya menunggu dan memakai hasilnya.
+def run_query(query, params=None):
+    def fetch():
+        with get_db_pool().connection() as conn:
+            return pd.read_sql(query, conn, params=params)
+
+    df = get_single_flight().do((query, repr(params)), fetch)
+    # Salinan per pemanggil karena DataFrame hasil dibagi antar sesi
+    return df.copy()
+
+# Snapshot devices & tickets per proses (dibagi semua sesi): dimuat penuh sekali,
+# lalu setiap refresh hanya mengambil baris yang berubah sejak high-water mark
+# (devices.row_updated_at, tickets.updated_at) dan menggabungkannya ke DataFrame cache.
+# Biaya refresh mengikuti jumlah perubahan, bukan ukuran fleet atau riwayat ticket.
+# Snapshot ticket hanya memuat ticket aktif; riwayat dibaca per halaman dari SQL.
+TICKET_COLUMNS = """
+    ticket_id, device_id, status, issue_type, message,
+    created_at, updated_at, resolved_at, assigned_to, notes, is_active, flap_count
+"""
+
+def fetch_devices(since):
+    if since is None:
+        return run_query("SELECT * FROM devices")
+    return run_query("SELECT * FROM devices WHERE row_updated_at > %s", params=(since,))
+
+def fetch_tickets(since):
+    if since is None:
+        return run_query(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE is_active = TRUE")
+    return run_query(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE updated_at > %s", params=(since,))
+
+# Registry dikompilasi sekali per proses
+@st.cache_resource
+def get_device_registry():
+    if DEVICE_REGISTRY_FILE:
+        return DeviceRegistry.from_json(DEVICE_REGISTRY_FILE)
+    return DeviceRegistry()
+
+# Kategori & ikon ditambahkan saat baris masuk snapshot, jadi hanya dihitung
+# untuk device yang berubah, bukan seluruh fleet setiap rerun
+def add_device_category(df):
+    return df.join(get_device_registry().categorize_series(df['device_id']))
+
+@st.cache_resource
+def get_device_snapshot():
+    return DeltaSnapshot(fetch_devices, key='device_id', hwm_column='row_updated_at',
+                         transform=add_device_category)
+
+@st.cache_resource
+def get_ticket_snapshot():
+    return DeltaSnapshot(fetch_tickets, key='ticket_id', hwm_column='updated_at',
+                         sort_by='created_at', ascending=False)
+
+# Listener NOTIFY bersama (satu koneksi LISTEN per proses, dipakai semua sesi).
+# API mengirim event saat status berubah dan saat ticket dibuka/ditutup; snapshot
+# terkait ditandai basi sehingga rerun berikutnya langsung mengambil deltanya.
+@st.cache_resource
+def get_event_listener():
+    devices, tickets = get_device_snapshot(), get_ticket_snapshot()
+
+    def on_event(event):
+        devices.mark_stale()
+        if event is None or event['type'] != 'status':
+            tickets.mark_stale()
+
+    conn_kwargs = dict(host=PG_HOST, port=PG_PORT, user=PG_USER,
+                       password=PG_PASSWORD, database=PG_DATABASE)
+    return EventListener(conn_kwargs, on_event=on_event).start()
+
+# Pesan toast untuk event yang layak diperhatikan operator. Hanya event ticket:
+# API sudah men-debounce dan menggabungkan device yang flapping ke satu ticket,
+# sedangkan event status mentah tetap dikirim untuk setiap pantulan.
+def event_toast(event):
+    if event['type'] == 'ticket_opened':
+        return f"🎫 New ticket {event['ticket_id']} for {event['device_id']}", "🚨"
+    if event['type'] == 'ticket_resolved':
+        return f"Ticket {event['ticket_id']} resolved ({event['device_id']})", "✅"
+    return None
+
+# Umur snapshot sebelum delta fetch: dengan listener, event yang menandai snapshot
+# basi (mark_stale); dashboard yang diam tidak meng-query setiap min_interval
+def snapshot_max_age():
+    return FALLBACK_REFRESH if get_event_listener().connected else None
+
 # Fungsi untuk mengambil data dari database
-@st.cache_data(ttl=5)
 def get_device_data():
     try:
-        conn = psycopg2.connect(
-            host=PG_HOST, port=PG_PORT, user=PG_USER,
-            password=PG_PASSWORD, database=PG_DATABASE
-        )
-        query = "SELECT * FROM devices ORDER BY device_id"
-        df = pd.read_sql(query, conn)
-        conn.close()
+        df = get_device_snapshot().get(max_age=snapshot_max_age())
         
         if not df.empty:
             # Convert timestamp ke timezone lokal
             df['last_seen_time'] = pd.to_datetime(df['last_seen'], unit='s', utc=True).dt.tz_convert(LOCAL_TZ)
-            df['time_ago'] = df['last_seen_time'].apply(
-                lambda x: f"{int((get_local_now() - x).total_seconds())}s ago"
-            )
+            now_ts = int(get_local_now().timestamp())
+            df['time_ago'] = (now_ts - df['last_seen']).astype('int64').astype(str) + "s ago"
         return df
     except Exception as e:
         st.error(f"Database connection error: {e}")
         return pd.DataFrame()
 
-# Fungsi untuk mengambil tickets dari database
-@st.cache_data(ttl=5)
-def get_tickets_from_db(active_only=True):
+# Fungsi untuk mengambil ticket aktif dari snapshot. Delta juga membawa ticket yang
+# baru resolved; baris itu disaring di sini dan hilang dari snapshot saat reload penuh.
+def get_tickets_from_db():
     try:
-        conn = psycopg2.connect(
-            host=PG_HOST, port=PG_PORT, user=PG_USER,
-            password=PG_PASSWORD, database=PG_DATABASE
-        )
-        if active_only:
-            query = """
-                SELECT ticket_id, device_id, status, issue_type, message, 
-                       created_at, updated_at, resolved_at, assigned_to, notes, is_active
-                FROM tickets
-                WHERE is_active = TRUE
-                ORDER BY created_at DESC
-            """
-        else:
-            query = """
-                SELECT ticket_id, device_id, status, issue_type, message, 
-                       created_at, updated_at, resolved_at, assigned_to, notes, is_active
-                FROM tickets
-                ORDER BY created_at DESC
-            """
-        df = pd.read_sql(query, conn)
-        conn.close()
+        df = get_ticket_snapshot().get(max_age=snapshot_max_age())
+        if not df.empty:
+            df = df[df['is_active'] == True].reset_index(drop=True)
         return df
     except Exception as e:
         st.error(f"Error fetching tickets: {e}")
         return pd.DataFrame()
 
+# Urutan halaman ticket history: (kolom, arah). ticket_id menjadi tie-breaker keyset.
+TICKET_SORTS = {
+    "Newest first": ("created_at", "DESC"),
+    "Oldest first": ("created_at", "ASC"),
+    "Recently updated": ("updated_at", "DESC"),
+}
+
+# Klausa WHERE untuk filter ticket history (status, issue type, pencarian teks)
+def ticket_filters(status="All", issue_type="All", search=""):
+    where, params = [], []
+    if status == "Active":
+        where.append("is_active = TRUE")
+    elif status == "Resolved":
+        where.append("is_active = FALSE")
+    if issue_type != "All":
+        where.append("issue_type = %s")
+        params.append(issue_type)
+    if search:
+        pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        where.append("(ticket_id ILIKE %s OR device_id ILIKE %s OR message ILIKE %s OR assigned_to ILIKE %s)")
+        params += [pattern] * 4
+    return where, params
+
+# Satu halaman ticket history dengan keyset pagination: halaman berikutnya dimulai
+# setelah (nilai kolom urut, ticket_id) baris terakhir halaman sebelumnya, sehingga
+# database membaca idx_tickets_created / idx_tickets_updated sejauh satu halaman
+# saja, berapa pun dalamnya halaman tersebut (tanpa OFFSET).
+# Mengembalikan (DataFrame, ada_halaman_berikutnya).
+@st.cache_data(ttl=5)
+def get_ticket_page(status="All", issue_type="All", search="", sort="Newest first",
+                    after=None, limit=50):
+    column, direction = TICKET_SORTS[sort]
+    where, params = ticket_filters(status, issue_type, search)
+    if after is not None:
+        op = "<" if direction == "DESC" else ">"
+        # Kondisi kolom tunggal di depan agar index satu kolom tetap dipakai sebagai batas scan
+        where.append(f"{column} {op}= %s AND ({column}, ticket_id) {op} (%s, %s)")
+        params += [after[0], after[0], after[1]]
+    query = f"""
+        SELECT {TICKET_COLUMNS}
+        FROM tickets
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY {column} {direction}, ticket_id {direction}
+        LIMIT %s
+    """
+    try:
+        df = run_query(query, params=tuple(params) + (limit + 1,))
+        return df.head(limit), len(df) > limit
+    except Exception as e:
+        st.error(f"Error fetching tickets: {e}")
+        return pd.DataFrame(), False
+
+# Jumlah ticket total / aktif / resolved (dihitung di database, tanpa memuat baris)
+@st.cache_data(ttl=30)
+def get_ticket_counts():
+    try:
+        return run_query("""
+            SELECT COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE is_active) AS active,
+                   COUNT(*) FILTER (WHERE NOT is_active) AS resolved
+            FROM tickets
+        """).iloc[0]
+    except Exception as e:
+        st.error(f"Error fetching ticket counts: {e}")
+        return None
+
+# Ringkasan fleet (jumlah per status / kategori / status x kategori, ticket aktif)
+# dari memori API: satu request kecil per KPI_REFRESH detik per proses Streamlit,
+# dibagi semua sesi, berapa pun jumlah device atau viewer.
+@st.cache_data(ttl=KPI_REFRESH, show_spinner=False)
+def fetch_fleet_summary():
+    try:
+        response = requests.get(f"{API_BASE_URL}/api/v1/summary", timeout=2)
+        response.raise_for_status()
+        summary = response.json()
+        return summary if summary.get('loaded') else None
+    except (requests.RequestException, ValueError):
+        return None
+
+# Ringkasan yang sama dihitung dari snapshot device (fallback saat API tidak terjangkau)
+def summarize_snapshot(df, tickets_df):
+    by_status = df['status'].value_counts()
+    by_status_category = pd.crosstab(df['status'], df['category']) if not df.empty else pd.DataFrame()
+    return {
+        "total_devices": len(df),
+        "by_status": {s: int(by_status.get(s, 0)) for s in ('online', 'error', 'offline')},
+        "by_category": {c: int(n) for c, n in df['category'].value_counts().sort_index().items()} if not df.empty else {},
+        "by_status_category": {
+            s: {c: int(n) for c, n in by_status_category.loc[s].items() if n} if s in by_status_category.index else {}
+            for s in ('online', 'error', 'offline')
+        },
+        "active_tickets": len(tickets_df),
+    }
+
+def get_fleet_summary():
+    summary = fetch_fleet_summary()
+    if summary is None:
+        summary = summarize_snapshot(get_device_data(), get_tickets_from_db())
+    return summary
+
 # Fungsi untuk mengambil history device
 @st.cache_data(ttl=5)
 def get_device_history(device_id, limit=100):
     try:
-        conn = psycopg2.connect(
-            host=PG_HOST, port=PG_PORT, user=PG_USER,
-            password=PG_PASSWORD, database=PG_DATABASE
-        )
         query = """
-            SELECT device_id, timestamp, status, message, created_at
+            SELECT device_id, timestamp, status, message, last_seen, heartbeat_count, created_at
             FROM device_history
             WHERE device_id = %s
             ORDER BY timestamp DESC
             LIMIT %s
         """
-        df = pd.read_sql(query, conn, params=(device_id, limit))
-        conn.close()
+        df = run_query(query, params=(device_id, limit))
         
         if not df.empty:
             # Convert timestamp ke timezone lokal
@@ -191,54 +422,104 @@ def get_device_history(device_id, limit=100):
         st.error(f"Error fetching history: {e}")
         return pd.DataFrame()
 
+# Fungsi untuk mengambil total rollup status device (detik per status, transisi, ticket)
+# untuk N jam terakhir; biaya query sama untuk 1 jam maupun 90 hari.
+@st.cache_data(ttl=30)
+def get_device_rollup(device_id, hours=24):
+    try:
+        now_ts = int(get_local_now().timestamp())
+        query = """
+            SELECT online_seconds, error_seconds, offline_seconds, transitions, tickets_opened
+            FROM device_rollup_totals(%s, %s, %s)
+        """
+        df = run_query(query, params=(now_ts - hours * 3600, now_ts, device_id))
+        return df
+    except Exception:
+        # Rollup belum tersedia (schema lama): pemanggil memakai history mentah
+        return pd.DataFrame()
+
+# Fungsi untuk mengambil span status (durasi per status) dalam jendela [start, end).
+# Jendela dibulatkan per menit oleh uptime.window_bounds, sehingga rerun berikutnya
+# dengan jendela yang sama langsung memakai hasil cache.
+@st.cache_data(ttl=300)
+def get_status_spans(start, end, device_id=None):
+    try:
+        df = run_query(uptime.SPANS_SQL,
+                       params={"start": start, "end": end, "device_id": device_id})
+        return df
+    except Exception as e:
+        st.error(f"Error fetching status spans: {e}")
+        return pd.DataFrame()
+
+# Fungsi untuk mengambil timeline status device yang sudah di-bucket di database.
+# Ukuran data tetap sekitar `points` baris berapa pun panjang jendelanya.
+@st.cache_data(ttl=30)
+def get_device_timeline(device_id, start, end, points=TIMELINE_POINTS):
+    try:
+        query = """
+            SELECT bucket_start, bucket_end, online_seconds, error_seconds, offline_seconds,
+                   transitions, dominant_status, worst_status
+            FROM device_status_timeline(%s, %s, %s, %s)
+        """
+        df = run_query(query, params=(device_id, start, end, points))
+        if not df.empty:
+            df['bucket_dt'] = pd.to_datetime(df['bucket_start'], unit='s', utc=True).dt.tz_convert(LOCAL_TZ)
+        return df
+    except Exception as e:
+        st.error(f"Error fetching timeline: {e}")
+        return pd.DataFrame()
+
+# Fungsi untuk mengambil total rollup semua device untuk jendela [start, end)
+@st.cache_data(ttl=60)
+def get_fleet_rollup(start, end):
+    try:
+        query = """
+            SELECT device_id, online_seconds AS online, error_seconds AS error,
+                   offline_seconds AS offline
+            FROM device_rollup_totals(%s, %s)
+        """
+        df = run_query(query, params=(start, end))
+        return df
+    except Exception:
+        return pd.DataFrame()
+
 # Fungsi untuk update ticket
 def update_ticket(ticket_id, field, value):
     try:
-        conn = psycopg2.connect(
-            host=PG_HOST, port=PG_PORT, user=PG_USER,
-            password=PG_PASSWORD, database=PG_DATABASE
-        )
-        cursor = conn.cursor()
+        with get_db_pool().connection() as conn:
+            cursor = conn.cursor()
         
-        # Gunakan timestamp lokal
-        now_timestamp = int(get_local_now().timestamp())
+            # Gunakan timestamp lokal
+            now_timestamp = int(get_local_now().timestamp())
         
-        if field == 'assigned_to':
-            cursor.execute("""
-                UPDATE tickets 
-                SET assigned_to = %s, updated_at = %s
-                WHERE ticket_id = %s
-            """, (value, now_timestamp, ticket_id))
-        elif field == 'notes':
+            if field == 'assigned_to':
+                cursor.execute("""
+                    UPDATE tickets 
+                    SET assigned_to = %s, updated_at = %s
+                    WHERE ticket_id = %s
+                """, (value, now_timestamp, ticket_id))
+            elif field == 'notes':
+                cursor.execute("""
+                    UPDATE tickets 
+                    SET notes = COALESCE(notes, '') || %s, updated_at = %s
+                    WHERE ticket_id = %s
+                """, (f"\n{get_local_now().strftime('%Y-%m-%d %H:%M:%S')}: {value}", now_timestamp, ticket_id))
+        
+            # Beri tahu API agar cache status device terkait dibuang (terkirim saat commit)
             cursor.execute("""
-                UPDATE tickets 
-                SET notes = COALESCE(notes, '') || %s, updated_at = %s
-                WHERE ticket_id = %s
-            """, (f"\n{get_local_now().strftime('%Y-%m-%d %H:%M:%S')}: {value}", now_timestamp, ticket_id))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+                SELECT pg_notify(%s, device_id)
+                FROM tickets WHERE ticket_id = %s
+            """, (INVALIDATE_CHANNEL, ticket_id))
+        
+            conn.commit()
+            cursor.close()
+        # Ambil perubahan ticket ini pada refresh berikutnya tanpa menunggu min_interval
+        get_ticket_snapshot().mark_stale()
         return True
     except Exception as e:
         st.error(f"Error updating ticket: {e}")
         return False
 
-# Fungsi untuk kategorisasi perangkat
-def categorize_device(device_id):
-    if "BED-MONITOR" in device_id:
-        return "Patient Monitoring", "🛏️"
-    elif "INFUSION-PUMP" in device_id:
-        return "Infusion Systems", "💉"
-    elif "TEMP-SENSOR" in device_id:
-        return "Environmental Sensors", "🌡️"
-    elif "VENTILATOR" in device_id:
-        return "Respiratory Equipment", "🫁"
-    elif "MRI" in device_id or "CT-SCANNER" in device_id:
-        return "Imaging Systems", "📷"
-    else:
-        return "Other Devices", "⚙️"
-
 # Inisialisasi session state
 if 'page' not in st.session_state:
     st.session_state.page = "Monitoring Overview"
@@ -260,6 +541,10 @@ with st.sidebar:
     st.info(f"**Date:** {get_local_now().strftime('%d %B %Y')}")
     st.info(f"**Timezone:** Asia/Jakarta (WIB)")
     st.info(f"**Current Page:** {st.session_state.page}")
+    if get_event_listener().connected:
+        st.info(f"**Live Updates:** 🟢 push (LISTEN) · fallback refresh every {FALLBACK_REFRESH}s")
+    else:
+        st.info(f"**Live Updates:** 🟡 polling · KPI every {KPI_REFRESH}s, charts every {CHART_REFRESH}s")
     st.markdown('---')
     # Navigation buttons
     if st.button("📊 Monitoring Overview", use_container_width=True):
@@ -281,620 +566,956 @@ with st.sidebar:
     st.markdown("---")
     st.subheader("⚙️ Controls")
     
-    auto_refresh = st.checkbox(f"Auto-refresh ({delay}s)", value=True)
+    auto_refresh = st.checkbox("Live updates", value=True)
     
     if st.button("🔄 Manual Refresh", use_container_width=True):
         st.cache_data.clear()
+        get_device_snapshot().mark_stale()
+        get_ticket_snapshot().mark_stale()
         st.rerun()
     
-    
+    pool_stats = get_db_pool().stats()
+    st.caption(f"DB pool: {pool_stats['in_use']}/{pool_stats['maxconn']} in use, "
+               f"{pool_stats['idle']} idle · shared queries: {get_single_flight().stats()['shared']}")
 
-# Ambil data dari database
-df = get_device_data()
-tickets_df = get_tickets_from_db(active_only=True)
+# Live updates dimatikan: fragment tidak di-refresh otomatis (hanya saat interaksi).
+# Listener tersambung: rerun dipicu event (live_update_watcher), timer hanya cadangan.
+def refresh_every(seconds):
+    if not auto_refresh:
+        return None
+    return max(seconds, FALLBACK_REFRESH) if get_event_listener().connected else seconds
 
 # ==================== TOAST TICKET FEATURE ====================
+# Fallback saat listener event terputus: toast dihitung dari selisih himpunan
+# ticket aktif dibanding pengecekan sebelumnya (bukan status device mentah,
+# agar device yang flapping tidak membanjiri toast).
+def toast_status_changes(tickets_df):
+    # Inisialisasi session state untuk tracking perubahan ticket aktif
+    if 'previous_tickets' not in st.session_state:
+        st.session_state.previous_tickets = {}
 
-# Inisialisasi session state untuk tracking perubahan status perangkat
-if 'previous_errors' not in st.session_state:
-    st.session_state.previous_errors = set()
+    current = {}
+    if not tickets_df.empty:
+        current = dict(zip(tickets_df['ticket_id'], tickets_df['device_id']))
+    previous = st.session_state.previous_tickets
 
-# Jika data tidak kosong, lakukan pengecekan perubahan status
-if not df.empty:
-    current_errors = set(df[(df['status'] == 'error') | (df['status'] == 'offline')]['device_id'])
-    new_errors = current_errors - st.session_state.previous_errors
-    resolved = st.session_state.previous_errors - current_errors
+    # Tampilkan toast untuk ticket baru
+    for ticket_id in current.keys() - previous.keys():
+        row = tickets_df[tickets_df['ticket_id'] == ticket_id].iloc[0]
+        st.toast(f"🚨 NEW {row['issue_type']} TICKET\nDevice: {row['device_id']}\nIssue: {row['message']}", icon="⚠️")
 
-    # Tampilkan toast untuk perangkat baru error/offline
-    for device_id in new_errors:
-        row = df[df['device_id'] == device_id].iloc[0]
-        issue_type = row['status'].upper()
-        message = row['message']
-        st.toast(f"🚨 NEW {issue_type} DETECTED\nDevice: {device_id}\nIssue: {message}", icon="⚠️")
-
-    # Tampilkan toast untuk perangkat yang sudah kembali normal
-    for device_id in resolved:
-        st.toast(f"✅ RESOLVED\nDevice {device_id} is back online.", icon="✅")
+    # Tampilkan toast untuk ticket yang sudah ditutup
+    for ticket_id in previous.keys() - current.keys():
+        st.toast(f"✅ RESOLVED\nTicket {ticket_id} ({previous[ticket_id]}) closed.", icon="✅")
 
     # Update state
-    st.session_state.previous_errors = current_errors
+    st.session_state.previous_tickets = current
 # ===============================================================
 
-if df.empty:
-    st.warning("⚠️ No device data available. Please ensure the simulator is running.")
-else:
-    # Hitung statistik
-    total_devices = len(df)
-    online_count = len(df[df['status'] == 'online'])
-    error_count = len(df[df['status'] == 'error'])
-    offline_count = len(df[df['status'] == 'offline'])
-    
-    # ========== PAGE: MONITORING OVERVIEW ==========
-    if st.session_state.page == "Monitoring Overview":
-        # KPI Metrics di bagian atas
-        col1, col2, col3, col4, col5 = st.columns(5)
+# Kartu satu device (HTML); dipakai grid halaman per halaman
+def device_card_html(row, ticket_id=None):
+    status_style = {
+        'online': ('<span class="status-online">● ONLINE</span>', '#10b981', None),
+        'error': ('<span class="status-error">● ERROR</span>', '#ef4444', '#fef2f2'),
+    }
+    status_badge, border_color, ticket_bg = status_style.get(
+        row['status'], ('<span class="status-offline">● OFFLINE</span>', '#6b7280', '#f3f4f6'))
+    ticket_section = ""
+    if ticket_bg and isinstance(ticket_id, str):
+        ticket_section = f'<div style="margin-top: auto;"><div style="background-color: {ticket_bg}; padding: 5px; border-radius: 4px; font-size: 0.8em;"><strong>🎫 Ticket:</strong> {ticket_id}</div></div>'
+    card = f"""
+    <div style="background-color: white; padding: 15px; border-radius: 8px; border-left: 4px solid {border_color}; box-shadow: 0 2px 4px rgba(0,0,0,0.1); height: 180px; display: flex; flex-direction: column;">
+        <div style="font-weight: bold; margin-bottom: 10px; font-size: 0.95em; color: #1e3c72;">{html.escape(row['device_id'])}</div>
+        <div style="margin-bottom: 8px;">{status_badge}</div>
+        <div style="color: #6b7280; font-size: 0.85em; margin-bottom: 5px;">
+            ⏱️ {row['time_ago']}
+        </div>
+        <div style="color: #6b7280; font-size: 0.85em; font-style: italic; margin-bottom: 8px;">
+            💬 {html.escape(str(row['message'])) if pd.notna(row['message']) else ''}
+        </div>
+        {ticket_section}
+    </div>
+    """
+    # Satu baris: baris kosong/berindentasi di antara kartu akan dibaca markdown sebagai blok kode
+    return " ".join(line.strip() for line in card.splitlines())
+
+# Heatmap: satu sel per device, warna = status. Satu elemen Plotly berapa pun
+# jumlah device (tidak ada elemen Streamlit per device).
+def device_heatmap(devices):
+    n = len(devices)
+    width = max(10, int(np.ceil(np.sqrt(n * 3))))
+    height = int(np.ceil(n / width))
+    pad = width * height - n
+    status_code = devices['status'].map({'offline': 0, 'error': 1, 'online': 2}).to_numpy(dtype=float)
+    z = np.append(status_code, [np.nan] * pad).reshape(height, width)
+    hover = np.append(
+        (devices['device_id'] + " · " + devices['status'].str.upper() + " · " + devices['time_ago']).to_numpy(),
+        [""] * pad
+    ).reshape(height, width)
+    
+    fig = go.Figure(go.Heatmap(
+        z=z,
+        text=hover,
+        hovertemplate="%{text}<extra></extra>",
+        colorscale=[[0, '#6b7280'], [0.33, '#6b7280'], [0.33, '#ef4444'], [0.66, '#ef4444'],
+                    [0.66, '#10b981'], [1, '#10b981']],
+        zmin=0, zmax=2,
+        showscale=False,
+        xgap=2, ygap=2
+    ))
+    fig.update_layout(
+        height=max(120, min(900, height * 22 + 40)),
+        margin=dict(t=10, b=10, l=10, r=10),
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False, autorange='reversed'),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+# Setiap bagian halaman adalah fragment dengan data dan interval refresh sendiri:
+# run_every hanya me-rerun fragment itu, bukan seluruh script. Data diambil dari
+# snapshot bersama di dalam fragment sehingga setiap rerun parsial tetap terbaru.
+# Dengan listener tersambung, event yang relevan me-rerun halaman (live_update_watcher)
+# dan run_every hanya cadangan lambat (FALLBACK_REFRESH).
+
+# ========== FRAGMENT: MONITORING OVERVIEW ==========
+@st.fragment(run_every=refresh_every(KPI_REFRESH))
+def overview_kpis():
+    summary = get_fleet_summary()
+    total_devices = summary['total_devices']
+    online_count, error_count, offline_count = (summary['by_status'][s] for s in ('online', 'error', 'offline'))
+    
+    # KPI Metrics di bagian atas
+    col1, col2, col3, col4, col5 = st.columns(5)
+    
+    with col1:
+        st.metric(
+            label="📱 Total Devices",
+            value=total_devices
+        )
+    
+    with col2:
+        st.metric(
+            label="✅ Online",
+            value=online_count
+        )
+    
+    with col3:
+        st.metric(
+            label="⚠️ Error",
+            value=error_count
+        )
+    
+    with col4:
+        st.metric(
+            label="🔌 Offline",
+            value=offline_count
+        )
+    
+    with col5:
+        st.metric(
+            label="🎫 Active Tickets",
+            value=summary['active_tickets']
+        )
+    
+    st.markdown("---")
+
+@st.fragment(run_every=refresh_every(CHART_REFRESH))
+def overview_charts():
+    summary = get_fleet_summary()
+    online_count, error_count, offline_count = (summary['by_status'][s] for s in ('online', 'error', 'offline'))
+    
+    # Alert untuk perangkat kritis
+    if error_count > 0 or offline_count > 0:
+        st.markdown(f"""
+        <div class="alert-critical">
+            <strong>🚨 CRITICAL ALERT:</strong> {error_count + offline_count} device(s) require immediate attention!
+        </div>
+        """, unsafe_allow_html=True)
+    
+    st.markdown("---")
+    
+    # Visualisasi Status Distribution by Category
+    st.subheader("📊 Device Status Distribution by Category")
+    
+    category_colors = {
+        'Patient Monitoring': '#2563eb',
+        'Infusion Systems': '#1e40af',
+        'Environmental Sensors': '#0891b2',
+        'Respiratory Equipment': '#0d9488',
+        'Imaging Systems': '#475569',
+        'Other Devices': '#64748b'
+    }
+    
+    col_chart1, col_chart2, col_chart3 = st.columns(3)
+    
+    # Chart 1: Online Devices by Category
+    with col_chart1:
+        st.markdown("##### ✅ Online Devices")
+        online_by_category = pd.Series(summary['by_status_category'].get('online', {}), dtype='int64').sort_values(ascending=False)
         
-        with col1:
-            st.metric(
-                label="📱 Total Devices",
-                value=total_devices
+        if not online_by_category.empty:
+            colors_list = [category_colors.get(cat, '#94a3b8') for cat in online_by_category.index]
+            
+            fig_online = go.Figure(data=[go.Pie(
+                labels=online_by_category.index,
+                values=online_by_category.values,
+                hole=0.5,
+                marker=dict(colors=colors_list),
+                textinfo='value',
+                textfont=dict(size=16, color='white', family='Arial Black'),
+                hovertemplate='<b>%{label}</b><br>Devices: %{value}<br>%{percent}<extra></extra>'
+            )])
+            
+            fig_online.update_layout(
+                showlegend=True,
+                height=400,
+                margin=dict(t=10, b=80, l=10, r=10),
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                legend=dict(
+                    orientation="v",
+                    yanchor="bottom",
+                    y=-0.5,
+                    xanchor="center",
+                    x=0.5,
+                    font=dict(size=10)
+                )
             )
-        
-        with col2:
-            st.metric(
-                label="✅ Online",
-                value=online_count
+            
+            fig_online.add_annotation(
+                text=f"<b>{online_count}</b>",
+                x=0.5, y=0.5,
+                font=dict(size=28, color='#10b981', family='Arial Black'),
+                showarrow=False
             )
+            
+            st.plotly_chart(fig_online, use_container_width=True)
+        else:
+            st.info("No online devices")
+    
+    # Chart 2: Error Devices by Category
+    with col_chart2:
+        st.markdown("##### ⚠️ Error Devices")
+        error_by_category = pd.Series(summary['by_status_category'].get('error', {}), dtype='int64').sort_values(ascending=False)
         
-        with col3:
-            st.metric(
-                label="⚠️ Error",
-                value=error_count
+        if not error_by_category.empty:
+            colors_list = [category_colors.get(cat, '#94a3b8') for cat in error_by_category.index]
+            
+            fig_error = go.Figure(data=[go.Pie(
+                labels=error_by_category.index,
+                values=error_by_category.values,
+                hole=0.5,
+                marker=dict(colors=colors_list),
+                textinfo='value',
+                textfont=dict(size=16, color='white', family='Arial Black'),
+                hovertemplate='<b>%{label}</b><br>Devices: %{value}<br>%{percent}<extra></extra>'
+            )])
+            
+            fig_error.update_layout(
+                showlegend=True,
+                height=400,
+                margin=dict(t=10, b=80, l=10, r=10),
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                legend=dict(
+                    orientation="v",
+                    yanchor="bottom",
+                    y=-0.5,
+                    xanchor="center",
+                    x=0.5,
+                    font=dict(size=10)
+                )
             )
-        
-        with col4:
-            st.metric(
-                label="🔌 Offline",
-                value=offline_count
+            
+            fig_error.add_annotation(
+                text=f"<b>{error_count}</b>",
+                x=0.5, y=0.5,
+                font=dict(size=28, color='#ef4444', family='Arial Black'),
+                showarrow=False
             )
+            
+            st.plotly_chart(fig_error, use_container_width=True)
+        else:
+            st.info("No error devices")
+    
+    # Chart 3: Offline Devices by Category
+    with col_chart3:
+        st.markdown("##### 🔌 Offline Devices")
+        offline_by_category = pd.Series(summary['by_status_category'].get('offline', {}), dtype='int64').sort_values(ascending=False)
         
-        with col5:
-            st.metric(
-                label="🎫 Active Tickets",
-                value=len(tickets_df)
+        if not offline_by_category.empty:
+            colors_list = [category_colors.get(cat, '#94a3b8') for cat in offline_by_category.index]
+            
+            fig_offline = go.Figure(data=[go.Pie(
+                labels=offline_by_category.index,
+                values=offline_by_category.values,
+                hole=0.5,
+                marker=dict(colors=colors_list),
+                textinfo='value',
+                textfont=dict(size=16, color='white', family='Arial Black'),
+                hovertemplate='<b>%{label}</b><br>Devices: %{value}<br>%{percent}<extra></extra>'
+            )])
+            
+            fig_offline.update_layout(
+                showlegend=True,
+                height=400,
+                margin=dict(t=10, b=80, l=10, r=10),
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                legend=dict(
+                    orientation="v",
+                    yanchor="bottom",
+                    y=-0.5,
+                    xanchor="center",
+                    x=0.5,
+                    font=dict(size=10)
+                )
+            )
+            
+            fig_offline.add_annotation(
+                text=f"<b>{offline_count}</b>",
+                x=0.5, y=0.5,
+                font=dict(size=28, color='#6b7280', family='Arial Black'),
+                showarrow=False
             )
+            
+            st.plotly_chart(fig_offline, use_container_width=True)
+        else:
+            st.info("No offline devices")
+    
+    st.markdown("---")
+    
+    # Availability 24 jam per kategori (berbasis durasi)
+    st.subheader("📈 Availability by Category (24h)")
+    
+    window_start, window_end = uptime.window_bounds(24)
+    fleet_df = get_fleet_rollup(window_start, window_end)
+    if not fleet_df.empty:
+        seconds_df = fleet_df.set_index('device_id')[list(uptime.STATUSES)]
+    else:
+        # Rollup belum tersedia: hitung langsung dari span history
+        seconds_df = uptime.status_seconds(get_status_spans(window_start, window_end),
+                                           window_start, window_end)
+    
+    if not seconds_df.empty:
+        categories = get_device_registry().categorize_series(seconds_df.index)['category'].to_numpy()
+        category_df = uptime.availability(seconds_df.groupby(categories).sum())
+        category_table = pd.DataFrame({
+            'Category': category_df.index,
+            'Uptime %': category_df['uptime_pct'].values,
+            'Online (h)': (category_df['online'] / 3600).round(1).values,
+            'Error (h)': (category_df['error'] / 3600).round(1).values,
+            'Offline (h)': (category_df['offline'] / 3600).round(1).values,
+        })
+        st.dataframe(category_table, use_container_width=True, hide_index=True)
+    else:
+        st.info("No availability data for the last 24 hours yet.")
+    
+    st.markdown("---")
+
+@st.fragment(run_every=refresh_every(DEVICE_TILE_REFRESH))
+def overview_device_tabs():
+    df = get_device_data()
+    tickets_df = get_tickets_from_db()
+    
+    # Grid perangkat: filter kategori/status/pencarian dan pagination dijalankan di
+    # server, browser hanya menerima satu halaman kartu (satu elemen HTML) atau
+    # satu heatmap, sehingga biaya render tidak bergantung pada ukuran fleet.
+    st.subheader("🏥 Device Status by Category")
+    
+    category_counts = df.groupby(['category', 'icon']).size().reset_index(name='n').sort_values('category')
+    category_labels = {"All": f"All ({len(df)})"}
+    category_labels.update({row.category: f"{row.icon} {row.category} ({row.n})"
+                            for row in category_counts.itertuples()})
+    selected_category = st.radio(
+        "Category",
+        list(category_labels),
+        format_func=category_labels.get,
+        horizontal=True,
+        label_visibility="collapsed",
+        key="grid_category"
+    )
+    
+    col_search, col_status, col_view = st.columns([2, 2, 1])
+    with col_search:
+        search = st.text_input("Search device", placeholder="Device ID or message", key="grid_search").strip()
+    with col_status:
+        status_filter = st.multiselect("Status", ["online", "error", "offline"],
+                                       default=["online", "error", "offline"], key="grid_status")
+    with col_view:
+        view_mode = st.radio("View", ["Cards", "Heatmap"], horizontal=True, key="grid_view")
+    
+    mask = df['status'].isin(status_filter)
+    if selected_category != "All":
+        mask &= df['category'] == selected_category
+    if search:
+        mask &= (df['device_id'].str.contains(search, case=False, regex=False)
+                 | df['message'].fillna('').str.contains(search, case=False, regex=False))
+    # Perangkat bermasalah ditampilkan lebih dulu
+    devices = df[mask]
+    devices = devices.assign(status_rank=devices['status'].map(STATUS_RANK)) \
+        .sort_values(['status_rank', 'device_id'], ignore_index=True)
+    
+    if devices.empty:
+        st.info("No devices match the current filters.")
+    elif view_mode == "Heatmap":
+        device_heatmap(devices)
+        st.caption(f"{len(devices)} devices · hover a cell for details")
+    else:
+        total_pages = (len(devices) - 1) // DEVICE_CARDS_PER_PAGE + 1
+        if st.session_state.get('grid_page', 1) > total_pages:
+            st.session_state.grid_page = total_pages
+        page = 1
+        if total_pages > 1:
+            page = st.number_input("Page", min_value=1, max_value=total_pages, step=1, key='grid_page')
+        page_df = devices.iloc[(page - 1) * DEVICE_CARDS_PER_PAGE:page * DEVICE_CARDS_PER_PAGE]
         
-        st.markdown("---")
+        # Ticket aktif per device, hanya untuk device di halaman ini
+        ticket_by_device = pd.Series(dtype=object)
+        if not tickets_df.empty:
+            ticket_by_device = tickets_df.drop_duplicates('device_id').set_index('device_id')['ticket_id']
+        page_tickets = page_df['device_id'].map(ticket_by_device)
         
-        # Alert untuk perangkat kritis
-        if error_count > 0 or offline_count > 0:
-            critical_devices = df[(df['status'] == 'error') | (df['status'] == 'offline')]
-            st.markdown(f"""
-            <div class="alert-critical">
-                <strong>🚨 CRITICAL ALERT:</strong> {len(critical_devices)} device(s) require immediate attention!
-            </div>
-            """, unsafe_allow_html=True)
+        cards = "".join(device_card_html(row, ticket_id)
+                        for row, ticket_id in zip(page_df.to_dict('records'), page_tickets))
+        st.markdown(
+            f'<div style="display: grid; grid-template-columns: repeat(3, 1fr); gap: 15px; margin-bottom: 15px;">{cards}</div>',
+            unsafe_allow_html=True
+        )
+        st.caption(f"Showing {(page - 1) * DEVICE_CARDS_PER_PAGE + 1}-"
+                   f"{(page - 1) * DEVICE_CARDS_PER_PAGE + len(page_df)} of {len(devices)} devices")
+    
+    st.markdown("---")
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        st.markdown(f"<p style='text-align: center; color: #6b7280;'>Dashboard last updated: {get_local_now().strftime('%Y-%m-%d %H:%M:%S')} WIB</p>", unsafe_allow_html=True)
+
+# ========== FRAGMENT: ACTIVE TICKETS ==========
+@st.fragment(run_every=refresh_every(TICKET_REFRESH))
+def active_tickets_summary():
+    tickets_df = get_tickets_from_db()
+    if tickets_df.empty:
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric(
+            label="📋 Total Active Tickets",
+            value=len(tickets_df)
+        )
+    
+    with col2:
+        error_tickets = len(tickets_df[tickets_df['issue_type'] == 'ERROR'])
+        st.metric(
+            label="⚠️ Error Tickets",
+            value=error_tickets
+        )
+    
+    with col3:
+        offline_tickets = len(tickets_df[tickets_df['issue_type'] == 'OFFLINE'])
+        st.metric(
+            label="🔌 Offline Tickets",
+            value=offline_tickets
+        )
+    
+    st.markdown("---")
+    
+    # Tampilkan tabel tickets dengan timezone lokal
+    display_df = tickets_df.copy()
+    display_df['created_at_dt'] = pd.to_datetime(display_df['created_at'], unit='s', utc=True).dt.tz_convert(LOCAL_TZ).dt.strftime('%Y-%m-%d %H:%M:%S')
+    display_df['updated_at_dt'] = pd.to_datetime(display_df['updated_at'], unit='s', utc=True).dt.tz_convert(LOCAL_TZ).dt.strftime('%Y-%m-%d %H:%M:%S')
+    
+    table_df = display_df[['ticket_id', 'device_id', 'issue_type', 'message', 'assigned_to', 'created_at_dt', 'updated_at_dt']].copy()
+    table_df.columns = ['Ticket ID', 'Device ID', 'Issue Type', 'Message', 'Assigned To', 'Created At', 'Updated At']
+    
+    st.dataframe(
+        table_df,
+        use_container_width=True,
+        hide_index=True
+    )
+
+# Satu kartu ticket = satu fragment: assign teknisi / tambah catatan hanya
+# me-render ulang kartu ini. Pesan sukses disimpan di session_state agar tetap
+# tampil setelah rerun fragment.
+@st.fragment
+def ticket_card(ticket_id):
+    tickets_df = get_tickets_from_db()
+    match = tickets_df[tickets_df['ticket_id'] == ticket_id]
+    if match.empty:
+        st.caption(f"🎫 {ticket_id} has been resolved.")
+        return
+    ticket = match.iloc[0]
+    flash = st.session_state.pop(f"flash_{ticket_id}", None)
+    
+    with st.expander(f"🎫 {ticket['ticket_id']} - {ticket['device_id']}", expanded=flash is not None):
+        if flash:
+            st.success(flash)
         
-        st.markdown("---")
+        col1, col2 = st.columns(2)
         
-        # Tambahkan kategori ke dataframe
-        df['category'], df['icon'] = zip(*df['device_id'].apply(categorize_device))
+        with col1:
+            st.markdown(f"**Device ID:** {ticket['device_id']}")
+            st.markdown(f"**Issue Type:** {ticket['issue_type']}")
+            st.markdown(f"**Status:** {ticket['status']}")
+            if ticket.get('flap_count', 0) > 0:
+                st.markdown(f"**Flapping:** 🔁 {int(ticket['flap_count'])} bounces merged into this ticket")
         
-        # Visualisasi Status Distribution by Category
-        st.subheader("📊 Device Status Distribution by Category")
+        with col2:
+            # Konversi timestamp ke timezone lokal tanpa offset
+            created_dt = datetime.fromtimestamp(ticket['created_at'], tz=LOCAL_TZ)
+            updated_dt = datetime.fromtimestamp(ticket['updated_at'], tz=LOCAL_TZ)
+            st.markdown(f"**Created:** {created_dt.strftime('%Y-%m-%d %H:%M:%S')}")
+            st.markdown(f"**Updated:** {updated_dt.strftime('%Y-%m-%d %H:%M:%S')}")
+            st.markdown(f"**Assigned To:** {ticket['assigned_to'] if ticket['assigned_to'] else 'Unassigned'}")
         
-        category_colors = {
-            'Patient Monitoring': '#2563eb',
-            'Infusion Systems': '#1e40af',
-            'Environmental Sensors': '#0891b2',
-            'Respiratory Equipment': '#0d9488',
-            'Imaging Systems': '#475569',
-            'Other Devices': '#64748b'
-        }
+        st.markdown(f"**Issue Description:** {ticket['message']}")
         
-        col_chart1, col_chart2, col_chart3 = st.columns(3)
+        if ticket['notes']:
+            st.markdown("**Notes:**")
+            st.text_area("", value=ticket['notes'], height=100, key=f"notes_view_{ticket['ticket_id']}", disabled=True)
         
-        # Chart 1: Online Devices by Category
-        with col_chart1:
-            st.markdown("##### ✅ Online Devices")
-            online_df = df[df['status'] == 'online']
-            online_by_category = online_df['category'].value_counts()
-            
-            if not online_by_category.empty:
-                colors_list = [category_colors.get(cat, '#94a3b8') for cat in online_by_category.index]
-                
-                fig_online = go.Figure(data=[go.Pie(
-                    labels=online_by_category.index,
-                    values=online_by_category.values,
-                    hole=0.5,
-                    marker=dict(colors=colors_list),
-                    textinfo='value',
-                    textfont=dict(size=16, color='white', family='Arial Black'),
-                    hovertemplate='<b>%{label}</b><br>Devices: %{value}<br>%{percent}<extra></extra>'
-                )])
-                
-                fig_online.update_layout(
-                    showlegend=True,
-                    height=400,
-                    margin=dict(t=10, b=80, l=10, r=10),
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    legend=dict(
-                        orientation="v",
-                        yanchor="bottom",
-                        y=-0.5,
-                        xanchor="center",
-                        x=0.5,
-                        font=dict(size=10)
-                    )
-                )
-                
-                fig_online.add_annotation(
-                    text=f"<b>{online_count}</b>",
-                    x=0.5, y=0.5,
-                    font=dict(size=28, color='#10b981', family='Arial Black'),
-                    showarrow=False
-                )
-                
-                st.plotly_chart(fig_online, use_container_width=True)
-            else:
-                st.info("No online devices")
+        st.markdown("---")
         
-        # Chart 2: Error Devices by Category
-        with col_chart2:
-            st.markdown("##### ⚠️ Error Devices")
-            error_df = df[df['status'] == 'error']
-            error_by_category = error_df['category'].value_counts()
-            
-            if not error_by_category.empty:
-                colors_list = [category_colors.get(cat, '#94a3b8') for cat in error_by_category.index]
-                
-                fig_error = go.Figure(data=[go.Pie(
-                    labels=error_by_category.index,
-                    values=error_by_category.values,
-                    hole=0.5,
-                    marker=dict(colors=colors_list),
-                    textinfo='value',
-                    textfont=dict(size=16, color='white', family='Arial Black'),
-                    hovertemplate='<b>%{label}</b><br>Devices: %{value}<br>%{percent}<extra></extra>'
-                )])
-                
-                fig_error.update_layout(
-                    showlegend=True,
-                    height=400,
-                    margin=dict(t=10, b=80, l=10, r=10),
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    legend=dict(
-                        orientation="v",
-                        yanchor="bottom",
-                        y=-0.5,
-                        xanchor="center",
-                        x=0.5,
-                        font=dict(size=10)
-                    )
-                )
-                
-                fig_error.add_annotation(
-                    text=f"<b>{error_count}</b>",
-                    x=0.5, y=0.5,
-                    font=dict(size=28, color='#ef4444', family='Arial Black'),
-                    showarrow=False
-                )
-                
-                st.plotly_chart(fig_error, use_container_width=True)
-            else:
-                st.info("No error devices")
+        col_btn1, col_btn2 = st.columns(2)
+        with col_btn1:
+            with st.form(key=f"assign_{ticket['ticket_id']}"):
+                technician_name = st.text_input("Technician Name", key=f"tech_{ticket['ticket_id']}")
+                if st.form_submit_button("🔧 Assign Technician"):
+                    if technician_name:
+                        if update_ticket(ticket['ticket_id'], 'assigned_to', technician_name):
+                            st.session_state[f"flash_{ticket_id}"] = f"Assigned to {technician_name}"
+                            st.rerun(scope="fragment")
+                    else:
+                        st.warning("Please enter a name")
         
-        # Chart 3: Offline Devices by Category
-        with col_chart3:
-            st.markdown("##### 🔌 Offline Devices")
-            offline_df = df[df['status'] == 'offline']
-            offline_by_category = offline_df['category'].value_counts()
-            
-            if not offline_by_category.empty:
-                colors_list = [category_colors.get(cat, '#94a3b8') for cat in offline_by_category.index]
-                
-                fig_offline = go.Figure(data=[go.Pie(
-                    labels=offline_by_category.index,
-                    values=offline_by_category.values,
-                    hole=0.5,
-                    marker=dict(colors=colors_list),
-                    textinfo='value',
-                    textfont=dict(size=16, color='white', family='Arial Black'),
-                    hovertemplate='<b>%{label}</b><br>Devices: %{value}<br>%{percent}<extra></extra>'
-                )])
-                
-                fig_offline.update_layout(
-                    showlegend=True,
-                    height=400,
-                    margin=dict(t=10, b=80, l=10, r=10),
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    legend=dict(
-                        orientation="v",
-                        yanchor="bottom",
-                        y=-0.5,
-                        xanchor="center",
-                        x=0.5,
-                        font=dict(size=10)
-                    )
-                )
-                
-                fig_offline.add_annotation(
-                    text=f"<b>{offline_count}</b>",
-                    x=0.5, y=0.5,
-                    font=dict(size=28, color='#6b7280', family='Arial Black'),
-                    showarrow=False
-                )
-                
-                st.plotly_chart(fig_offline, use_container_width=True)
-            else:
-                st.info("No offline devices")
+        with col_btn2:
+            with st.form(key=f"note_{ticket['ticket_id']}"):
+                note_text = st.text_input("Add Note", key=f"note_input_{ticket['ticket_id']}")
+                if st.form_submit_button("📝 Add Note"):
+                    if note_text:
+                        if update_ticket(ticket['ticket_id'], 'notes', note_text):
+                            st.session_state[f"flash_{ticket_id}"] = "Note added"
+                            st.rerun(scope="fragment")
+                    else:
+                        st.warning("Please enter a note")
+
+# ========== FRAGMENT: TICKET HISTORY ==========
+# Filter, urutan, pencarian dan pagination dijalankan di SQL (get_ticket_page);
+# session_state hanya menyimpan tumpukan cursor keyset untuk tombol Previous.
+@st.fragment(run_every=refresh_every(CHART_REFRESH))
+def ticket_history_view():
+    counts = get_ticket_counts()
+    
+    if counts is not None and counts['total'] > 0:
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            st.metric("📊 Total Tickets", int(counts['total']))
+        
+        with col2:
+            st.metric("🔴 Active", int(counts['active']))
+        
+        with col3:
+            st.metric("✅ Resolved", int(counts['resolved']))
         
         st.markdown("---")
         
-        # Daftar perangkat berdasarkan kategori dalam TABS
-        st.subheader("🏥 Device Status by Category")
+        # Filter
+        col_filter1, col_filter2, col_filter3, col_filter4 = st.columns([1, 1, 1, 2])
+        with col_filter1:
+            filter_status = st.selectbox(
+                "Filter by Status",
+                ["All", "Active", "Resolved"]
+            )
         
-        categories = sorted(df['category'].unique())
-        device_tabs = st.tabs([f"{df[df['category']==cat].iloc[0]['icon']} {cat}" for cat in categories])
+        with col_filter2:
+            filter_type = st.selectbox(
+                "Filter by Issue Type",
+                ["All", "ERROR", "OFFLINE"]
+            )
         
-        for idx, category in enumerate(categories):
-            with device_tabs[idx]:
-                category_devices = df[df['category'] == category]
-                
-                num_devices = len(category_devices)
-                cols_per_row = 3
-                
-                for i in range(0, num_devices, cols_per_row):
-                    cols = st.columns(cols_per_row)
-                    
-                    for j in range(cols_per_row):
-                        if i + j < num_devices:
-                            row = category_devices.iloc[i + j]
-                            
-                            with cols[j]:
-                                if row['status'] == 'online':
-                                    status_badge = '<span class="status-online">● ONLINE</span>'
-                                    border_color = '#10b981'
-                                    ticket_section = ""
-                                elif row['status'] == 'error':
-                                    status_badge = '<span class="status-error">● ERROR</span>'
-                                    border_color = '#ef4444'
-                                    device_tickets = tickets_df[tickets_df['device_id'] == row['device_id']]
-                                    if not device_tickets.empty:
-                                        ticket_id = device_tickets.iloc[0]['ticket_id']
-                                        ticket_section = f'<div style="margin-top: auto;"><div style="background-color: #fef2f2; padding: 5px; border-radius: 4px; font-size: 0.8em;"><strong>🎫 Ticket:</strong> {ticket_id}</div></div>'
-                                    else:
-                                        ticket_section = ""
-                                else:
-                                    status_badge = '<span class="status-offline">● OFFLINE</span>'
-                                    border_color = '#6b7280'
-                                    device_tickets = tickets_df[tickets_df['device_id'] == row['device_id']]
-                                    if not device_tickets.empty:
-                                        ticket_id = device_tickets.iloc[0]['ticket_id']
-                                        ticket_section = f'<div style="margin-top: auto;"><div style="background-color: #f3f4f6; padding: 5px; border-radius: 4px; font-size: 0.8em;"><strong>🎫 Ticket:</strong> {ticket_id}</div></div>'
-                                    else:
-                                        ticket_section = ""
-                                
-                                st.markdown(f"""
-                                <div style="background-color: white; padding: 15px; border-radius: 8px; margin-bottom: 15px; border-left: 4px solid {border_color}; box-shadow: 0 2px 4px rgba(0,0,0,0.1); height: 180px; display: flex; flex-direction: column;">
-                                    <div style="font-weight: bold; margin-bottom: 10px; font-size: 0.95em; color: #1e3c72;">{row['device_id']}</div>
-                                    <div style="margin-bottom: 8px;">{status_badge}</div>
-                                    <div style="color: #6b7280; font-size: 0.85em; margin-bottom: 5px;">
-                                        ⏱️ {row['time_ago']}
-                                    </div>
-                                    <div style="color: #6b7280; font-size: 0.85em; font-style: italic; margin-bottom: 8px;">
-                                        💬 {row['message']}
-                                    </div>
-                                    {ticket_section}
-                                </div>
-                                """, unsafe_allow_html=True)
+        with col_filter3:
+            sort = st.selectbox("Sort", list(TICKET_SORTS))
         
-        st.markdown("---")
-        col1, col2, col3 = st.columns([1, 2, 1])
-        with col2:
-            st.markdown(f"<p style='text-align: center; color: #6b7280;'>Dashboard last updated: {get_local_now().strftime('%Y-%m-%d %H:%M:%S')} WIB</p>", unsafe_allow_html=True)
-    
-    # ========== PAGE: ACTIVE TICKETS ==========
-    elif st.session_state.page == "Active Tickets":
-        st.title("🎫 Active Support Tickets")
+        with col_filter4:
+            search = st.text_input("Search", placeholder="Ticket ID, device, message or technician").strip()
         
-        if not tickets_df.empty:
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                st.metric(
-                    label="📋 Total Active Tickets",
-                    value=len(tickets_df)
-                )
-            
-            with col2:
-                error_tickets = len(tickets_df[tickets_df['issue_type'] == 'ERROR'])
-                st.metric(
-                    label="⚠️ Error Tickets",
-                    value=error_tickets
-                )
-            
-            with col3:
-                offline_tickets = len(tickets_df[tickets_df['issue_type'] == 'OFFLINE'])
-                st.metric(
-                    label="🔌 Offline Tickets",
-                    value=offline_tickets
-                )
-            
-            st.markdown("---")
-            
-            # Tampilkan tabel tickets dengan timezone lokal
-            display_df = tickets_df.copy()
+        # Cursor keyset direset setiap kali filter berubah
+        filters = (filter_status, filter_type, sort, search)
+        if st.session_state.get('history_filters') != filters:
+            st.session_state.history_filters = filters
+            st.session_state.history_cursors = [None]
+        cursors = st.session_state.history_cursors
+        
+        page_df, has_next = get_ticket_page(filter_status, filter_type, search, sort,
+                                            after=cursors[-1], limit=HISTORY_PAGE_SIZE)
+        
+        if page_df.empty:
+            st.info("No tickets match the selected filters.")
+        else:
+            # Prepare display dataframe dengan timezone lokal
+            display_df = page_df.copy()
             display_df['created_at_dt'] = pd.to_datetime(display_df['created_at'], unit='s', utc=True).dt.tz_convert(LOCAL_TZ).dt.strftime('%Y-%m-%d %H:%M:%S')
-            display_df['updated_at_dt'] = pd.to_datetime(display_df['updated_at'], unit='s', utc=True).dt.tz_convert(LOCAL_TZ).dt.strftime('%Y-%m-%d %H:%M:%S')
+            display_df['status_display'] = np.where(display_df['is_active'], 'Active', 'Resolved')
             
-            table_df = display_df[['ticket_id', 'device_id', 'issue_type', 'message', 'assigned_to', 'created_at_dt', 'updated_at_dt']].copy()
-            table_df.columns = ['Ticket ID', 'Device ID', 'Issue Type', 'Message', 'Assigned To', 'Created At', 'Updated At']
+            table_df = display_df[['ticket_id', 'device_id', 'issue_type', 'status_display', 'message', 'assigned_to', 'created_at_dt']].copy()
+            table_df.columns = ['Ticket ID', 'Device ID', 'Issue Type', 'Status', 'Message', 'Assigned To', 'Created At']
             
             st.dataframe(
                 table_df,
                 use_container_width=True,
                 hide_index=True
             )
-            
-            st.markdown("---")
-            st.subheader("🔍 Ticket Details")
-            
-            for _, ticket in tickets_df.iterrows():
-                with st.expander(f"🎫 {ticket['ticket_id']} - {ticket['device_id']}"):
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.markdown(f"**Device ID:** {ticket['device_id']}")
-                        st.markdown(f"**Issue Type:** {ticket['issue_type']}")
-                        st.markdown(f"**Status:** {ticket['status']}")
-                    
-                    with col2:
-                        # Konversi timestamp ke timezone lokal tanpa offset
-                        created_dt = datetime.fromtimestamp(ticket['created_at'], tz=LOCAL_TZ)
-                        updated_dt = datetime.fromtimestamp(ticket['updated_at'], tz=LOCAL_TZ)
-                        st.markdown(f"**Created:** {created_dt.strftime('%Y-%m-%d %H:%M:%S')}")
-                        st.markdown(f"**Updated:** {updated_dt.strftime('%Y-%m-%d %H:%M:%S')}")
-                        st.markdown(f"**Assigned To:** {ticket['assigned_to'] if ticket['assigned_to'] else 'Unassigned'}")
-                    
-                    st.markdown(f"**Issue Description:** {ticket['message']}")
-                    
-                    if ticket['notes']:
-                        st.markdown("**Notes:**")
-                        st.text_area("", value=ticket['notes'], height=100, key=f"notes_view_{ticket['ticket_id']}", disabled=True)
-                    
-                    st.markdown("---")
-                    
-                    col_btn1, col_btn2 = st.columns(2)
-                    with col_btn1:
-                        with st.form(key=f"assign_{ticket['ticket_id']}"):
-                            technician_name = st.text_input("Technician Name", key=f"tech_{ticket['ticket_id']}")
-                            if st.form_submit_button("🔧 Assign Technician"):
-                                if technician_name:
-                                    if update_ticket(ticket['ticket_id'], 'assigned_to', technician_name):
-                                        st.success(f"Assigned to {technician_name}")
-                                        st.cache_data.clear()
-                                        time.sleep(1)
-                                        st.rerun()
-                                else:
-                                    st.warning("Please enter a name")
-                    
-                    with col_btn2:
-                        with st.form(key=f"note_{ticket['ticket_id']}"):
-                            note_text = st.text_input("Add Note", key=f"note_input_{ticket['ticket_id']}")
-                            if st.form_submit_button("📝 Add Note"):
-                                if note_text:
-                                    if update_ticket(ticket['ticket_id'], 'notes', note_text):
-                                        st.success("Note added")
-                                        st.cache_data.clear()
-                                        time.sleep(1)
-                                        st.rerun()
-                                else:
-                                    st.warning("Please enter a note")
-        else:
-            st.success("✅ No active tickets. All devices are operating normally.")
-            st.balloons()
-    
-    # ========== PAGE: TICKET HISTORY ==========
-    elif st.session_state.page == "Ticket History":
-        st.title("📜 Ticket History")
         
-        all_tickets_df = get_tickets_from_db(active_only=False)
+        # Navigasi halaman
+        col_prev, col_page, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            if st.button("◀ Previous", disabled=len(cursors) == 1, use_container_width=True):
+                cursors.pop()
+                st.rerun(scope="fragment")
+        with col_page:
+            st.markdown(f"<p style='text-align: center;'>Page {len(cursors)}</p>", unsafe_allow_html=True)
+        with col_next:
+            if st.button("Next ▶", disabled=not has_next, use_container_width=True):
+                sort_column = TICKET_SORTS[sort][0]
+                last = page_df.iloc[-1]
+                cursors.append((int(last[sort_column]), last['ticket_id']))
+                st.rerun(scope="fragment")
+    else:
+        st.info("No tickets have been created yet.")
+
+# ========== FRAGMENT: DEVICE HISTORY ==========
+# Pilihan device dan shift hanya me-rerun fragment ini, bukan seluruh halaman.
+@st.fragment(run_every=refresh_every(CHART_REFRESH))
+def device_history_view():
+    df = get_device_data()
+    
+    # Device selector
+    device_list = sorted(df['device_id'].unique())
+    selected_device = st.selectbox("Select Device", device_list)
+    
+    if selected_device:
+        # Get device history
+        history_df = get_device_history(selected_device, limit=200)
         
-        if not all_tickets_df.empty:
-            col1, col2, col3 = st.columns(3)
+        if not history_df.empty:
+            # Current status
+            current_status = df[df['device_id'] == selected_device].iloc[0]
+            
+            # Uptime & perubahan status 24 jam dari rollup; jika rollup belum ada, hitung
+            # dari durasi baris history yang dimuat (bukan jumlah baris, yang di mode
+            # "changes" adalah jumlah run, bukan sampel)
+            rollup_df = get_device_rollup(selected_device, hours=24)
+            if not rollup_df.empty:
+                row = rollup_df.iloc[0]
+                total_seconds = row['online_seconds'] + row['error_seconds'] + row['offline_seconds']
+                online_seconds = row['online_seconds']
+                status_changes = int(row['transitions'])
+            else:
+                day_start, day_end = uptime.window_bounds(24)
+                seconds_df = uptime.status_seconds(
+                    uptime.spans_from_history(history_df, day_start, day_end),
+                    day_start, day_end
+                )
+                total_seconds = seconds_df.values.sum()
+                online_seconds = seconds_df['online'].sum()
+                ordered = history_df.sort_values('timestamp')
+                status_changes = int(((ordered['status'] != ordered['status'].shift())
+                                      & (ordered['timestamp'] >= day_start)).iloc[1:].sum())
+            uptime_pct = (online_seconds / total_seconds * 100) if total_seconds > 0 else 0
+            
+            col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                st.metric("📊 Total Tickets", len(all_tickets_df))
+                st.metric("Current Status", current_status['status'].upper())
             
             with col2:
-                active_count = len(all_tickets_df[all_tickets_df['is_active'] == True])
-                st.metric("🔴 Active", active_count)
+                st.metric("Last Seen", current_status['time_ago'])
             
             with col3:
-                resolved_count = len(all_tickets_df[all_tickets_df['is_active'] == False])
-                st.metric("✅ Resolved", resolved_count)
+                st.metric("Status Changes (24h)", status_changes)
             
-            st.markdown("---")
+            with col4:
+                st.metric("Uptime % (24h)", f"{uptime_pct:.1f}%")
             
-            # Filter
-            col_filter1, col_filter2 = st.columns(2)
-            with col_filter1:
-                filter_status = st.selectbox(
-                    "Filter by Status",
-                    ["All", "Active", "Resolved"]
-                )
+            st.markdown("---")
             
-            with col_filter2:
-                filter_type = st.selectbox(
-                    "Filter by Issue Type",
-                    ["All", "ERROR", "OFFLINE"]
-                )
+            # Availability per shift jaga (berbasis durasi, jendela sembarang)
+            st.subheader("⏱️ Availability by Shift")
             
-            # Apply filters
-            filtered_df = all_tickets_df.copy()
-            if filter_status == "Active":
-                filtered_df = filtered_df[filtered_df['is_active'] == True]
-            elif filter_status == "Resolved":
-                filtered_df = filtered_df[filtered_df['is_active'] == False]
+            shift_window = st.radio(
+                "Window",
+                ["24 hours", "7 days", "30 days"],
+                horizontal=True,
+                key="shift_window"
+            )
+            window_hours = {"24 hours": 24, "7 days": 24 * 7, "30 days": 24 * 30}[shift_window]
+            window_start, window_end = uptime.window_bounds(window_hours)
+            spans_df = get_status_spans(window_start, window_end, selected_device)
             
-            if filter_type != "All":
-                filtered_df = filtered_df[filtered_df['issue_type'] == filter_type]
+            if not spans_df.empty:
+                shift_df = uptime.availability(
+                    uptime.status_seconds_by_shift(spans_df, window_start, window_end)
+                ).loc[selected_device]
+                shift_cols = st.columns(len(shift_df))
+                for shift_col, (shift_name, shift_row) in zip(shift_cols, shift_df.iterrows()):
+                    with shift_col:
+                        st.metric(
+                            f"{shift_name} shift",
+                            f"{shift_row['uptime_pct']:.1f}%",
+                            help=f"Online {shift_row['online'] / 3600:.1f}h of {shift_row['total'] / 3600:.1f}h"
+                        )
+            else:
+                st.info("No status data in this window.")
             
-            # Prepare display dataframe dengan timezone lokal
-            display_df = filtered_df.copy()
-            display_df['created_at_dt'] = pd.to_datetime(display_df['created_at'], unit='s', utc=True).dt.tz_convert(LOCAL_TZ).dt.strftime('%Y-%m-%d %H:%M:%S')
-            display_df['status_display'] = display_df['is_active'].apply(lambda x: 'Active' if x else 'Resolved')
+            st.markdown("---")
             
-            table_df = display_df[['ticket_id', 'device_id', 'issue_type', 'status_display', 'message', 'assigned_to', 'created_at_dt']].copy()
-            table_df.columns = ['Ticket ID', 'Device ID', 'Issue Type', 'Status', 'Message', 'Assigned To', 'Created At']
+            # Timeline: bucket dihitung di database (device_status_timeline)
+            st.subheader("📊 Status Timeline")
             
-            st.dataframe(
-                table_df,
-                use_container_width=True,
-                hide_index=True
+            timeline_window = st.radio(
+                "Range",
+                list(TIMELINE_WINDOWS),
+                index=2,
+                horizontal=True,
+                key="timeline_window"
             )
+            timeline_start, timeline_end = uptime.window_bounds(TIMELINE_WINDOWS[timeline_window])
+            timeline_df = get_device_timeline(selected_device, timeline_start, timeline_end)
             
-            # Statistik tambahan
-            st.markdown("---")
-    
-    
-    # ========== PAGE: DEVICE HISTORY ==========
-    elif st.session_state.page == "Device History":
-        st.title("📈 Device History")
-        
-        # Device selector
-        device_list = sorted(df['device_id'].unique())
-        selected_device = st.selectbox("Select Device", device_list)
-        
-        if selected_device:
-            # Get device history
-            history_df = get_device_history(selected_device, limit=200)
-            
-            if not history_df.empty:
-                # Current status
-                current_status = df[df['device_id'] == selected_device].iloc[0]
+            if not timeline_df.empty:
+                # Bar bertumpuk: porsi waktu tiap status per bucket; hover menampilkan
+                # status terburuk dan jumlah transisi dalam bucket
+                bucket_total = (timeline_df['online_seconds'] + timeline_df['error_seconds']
+                                + timeline_df['offline_seconds'])
+                fig_timeline = go.Figure()
+                for status, color in STATUS_COLORS.items():
+                    fig_timeline.add_trace(go.Bar(
+                        x=timeline_df['bucket_dt'],
+                        y=(timeline_df[f'{status}_seconds'] / bucket_total * 100).round(1),
+                        name=status.capitalize(),
+                        marker_color=color,
+                        customdata=timeline_df[['worst_status', 'transitions']],
+                        hovertemplate="%{x}<br>" + status.capitalize() + ": %{y}%"
+                                      "<br>Worst: %{customdata[0]}<br>Transitions: %{customdata[1]}<extra></extra>"
+                    ))
                 
-                col1, col2, col3, col4 = st.columns(4)
-                
-                with col1:
-                    st.metric("Current Status", current_status['status'].upper())
-                
-                with col2:
-                    st.metric("Last Seen", current_status['time_ago'])
+                fig_timeline.update_layout(
+                    title=f'Status Timeline for {selected_device}',
+                    barmode='stack',
+                    bargap=0,
+                    xaxis_title='Time (WIB)',
+                    yaxis_title='% of bucket',
+                    yaxis=dict(range=[0, 100]),
+                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+                )
                 
-                with col3:
-                    st.metric("Total Records", len(history_df))
+                st.plotly_chart(fig_timeline, use_container_width=True)
+                st.caption(f"{len(timeline_df)} buckets · {int(timeline_df['transitions'].sum())} status transitions")
+            else:
+                st.info("No status data in this range.")
+            
+            st.markdown("---")
+            
+            # Status distribution
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                # Porsi waktu per status pada jendela "Availability by Shift" (time-weighted,
+                # sama dengan uptime di atas), bukan jumlah baris history
+                st.subheader(f"📊 Status Distribution ({shift_window})")
+                if spans_df.empty:
+                    status_hours = pd.Series(dtype=float)
+                else:
+                    status_hours = (uptime.status_seconds(spans_df, window_start, window_end)
+                                    .reindex([selected_device], fill_value=0).iloc[0] / 3600)
+                    status_hours = status_hours[status_hours > 0]
                 
-                with col4:
-                    # Calculate uptime percentage
-                    online_records = len(history_df[history_df['status'] == 'online'])
-                    uptime_pct = (online_records / len(history_df) * 100) if len(history_df) > 0 else 0
-                    st.metric("Uptime %", f"{uptime_pct:.1f}%")
+                fig_dist = go.Figure(data=[go.Pie(
+                    labels=[status.capitalize() for status in status_hours.index],
+                    values=status_hours.round(2).values,
+                    hole=0.5,
+                    marker=dict(colors=[STATUS_COLORS[status] for status in status_hours.index]),
+                    sort=False,
+                    textinfo='percent',
+                    hovertemplate="%{label}: %{value} h<extra></extra>",
+                    textfont=dict(size=16, color='white', family='Arial Black')
+                )])
                 
-                st.markdown("---")
+                fig_dist.update_layout(
+                    showlegend=True,
+                    height=370,
+                    margin=dict(t=10, b=80, l=10, r=10),
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    legend=dict(
+                        orientation="h",
+                        yanchor="bottom",
+                        y=-0.2,
+                        xanchor="center",
+                        x=0.5,
+                        font=dict(size=15)
+                    )
+                )
                 
-                # Timeline chart dengan timezone lokal
-                st.subheader("📊 Status Timeline")
+                st.plotly_chart(fig_dist, use_container_width=True)
+            
+            with col2:
+            
+                # Detailed history table dengan timezone lokal
+                st.subheader("📜 Detailed History")
                 
-                # Data sudah dalam timezone lokal dari get_device_history
-                history_df['status_numeric'] = history_df['status'].map({
-                    'online': 2,
-                    'error': 1,
-                    'offline': 0
-                })
+                # Format timestamp tanpa timezone offset
+                table_df = history_df.copy()
+                table_df['timestamp_formatted'] = table_df['timestamp_dt'].dt.strftime('%Y-%m-%d %H:%M:%S')
+                table_df = table_df[['timestamp_formatted', 'status', 'message']]
+                table_df.columns = ['Timestamp', 'Status', 'Message']
                 
-                fig_timeline = px.line(
-                    history_df,
-                    x='timestamp_dt',
-                    y='status_numeric',
-                    title=f'Status Timeline for {selected_device}',
-                    labels={'timestamp_dt': 'Time (WIB)', 'status_numeric': 'Status'},
-                    markers=True
+                st.dataframe(
+                    table_df,
+                    use_container_width=True,
+                    hide_index=True,
+                    height=400
                 )
                 
-                fig_timeline.update_yaxes(
-                    tickmode='array',
-                    tickvals=[0, 1, 2],
-                    ticktext=['Offline', 'Error', 'Online']
+                # Export option
+                csv = table_df.to_csv(index=False)
+                st.download_button(
+                    label="📥 Download History as CSV",
+                    data=csv,
+                    file_name=f"{selected_device}_history_{get_local_now().strftime('%Y%m%d_%H%M%S')}.csv",
+                    mime="text/csv"
                 )
-                
-                fig_timeline.update_traces(
-                    line=dict(color='#2563eb', width=2),
-                    marker=dict(size=6)
+        else:
+            st.info("No history available for this device yet.")
+        
+        # Ekspor audit: file dibuat dan di-stream oleh API (history_export.py),
+        # dashboard hanya menyusun tautannya
+        with st.expander("📦 Audit Export (full history)"):
+            col_exp1, col_exp2, col_exp3 = st.columns(3)
+            with col_exp1:
+                export_devices = st.multiselect("Devices", device_list, default=[selected_device])
+                export_statuses = st.multiselect("Status", ["online", "error", "offline"])
+            with col_exp2:
+                export_range = st.date_input(
+                    "Date range (WIB)",
+                    value=(get_local_now().date() - timedelta(days=7), get_local_now().date())
                 )
-                
-                st.plotly_chart(fig_timeline, use_container_width=True)
-                
-                st.markdown("---")
-                
-                # Status distribution
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.subheader("📊 Status Distribution")
-                    status_counts = history_df['status'].value_counts()
-                    
-                    fig_dist = go.Figure(data=[go.Pie(
-                        labels=status_counts.index,
-                        values=status_counts.values,
-                        hole=0.5,
-                        marker=dict(colors=['#10b981', '#ef4444', '#6b7280']),
-                        textinfo='value',
-                        textfont=dict(size=16, color='white', family='Arial Black')
-                    )])
-                    
-                    fig_dist.update_layout(
-                        showlegend=True,
-                        height=370,
-                        margin=dict(t=10, b=80, l=10, r=10),
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        legend=dict(
-                            orientation="h",
-                            yanchor="bottom",
-                            y=-0.2,
-                            xanchor="center",
-                            x=0.5,
-                            font=dict(size=15)
-                        )
-                    )
-                    
-                    st.plotly_chart(fig_dist, use_container_width=True)
-                
-                with col2:
-                
-                    # Detailed history table dengan timezone lokal
-                    st.subheader("📜 Detailed History")
-                    
-                    # Format timestamp tanpa timezone offset
-                    table_df = history_df.copy()
-                    table_df['timestamp_formatted'] = table_df['timestamp_dt'].dt.strftime('%Y-%m-%d %H:%M:%S')
-                    table_df = table_df[['timestamp_formatted', 'status', 'message']]
-                    table_df.columns = ['Timestamp', 'Status', 'Message']
-                    
-                    st.dataframe(
-                        table_df,
-                        use_container_width=True,
-                        hide_index=True,
-                        height=400
-                    )
-                    
-                    # Export option
-                    csv = table_df.to_csv(index=False)
-                    st.download_button(
-                        label="📥 Download History as CSV",
-                        data=csv,
-                        file_name=f"{selected_device}_history_{get_local_now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv"
-                    )
+            with col_exp3:
+                export_format = st.radio("Format", ["csv", "parquet"], horizontal=True)
+            
+            if isinstance(export_range, (list, tuple)) and len(export_range) == 2:
+                export_params = [("format", export_format),
+                                 ("from", export_range[0].isoformat()),
+                                 ("to", (export_range[1] + timedelta(days=1)).isoformat())]
+                export_params += [("device_id", d) for d in export_devices]
+                export_params += [("status", status) for status in export_statuses]
+                st.link_button(
+                    "📥 Download export",
+                    f"{API_PUBLIC_URL}/api/v1/export/history?{urlencode(export_params)}",
+                    use_container_width=True
+                )
+                if not export_devices:
+                    st.caption("No device selected: the export covers all devices.")
             else:
-                st.info("No history available for this device yet.")
+                st.caption("Select a start and end date.")
+
+# Versi event yang sudah dilihat sesi ini (untuk toast live update), dan status
+# listener yang dipakai run_every fragment pada run ini
+event_listener = get_event_listener()
+if 'event_version' not in st.session_state:
+    st.session_state.event_version = event_listener.version
+st.session_state.listener_connected = event_listener.connected
+
+# Rerun penuh terjadi saat navigasi/kontrol sidebar, atau saat event yang relevan
+# untuk halaman ini masuk (PAGE_EVENTS); sisanya di-refresh per fragment.
+df = get_device_data()
+
+if df.empty:
+    st.warning("⚠️ No device data available. Please ensure the simulator is running.")
+
+# ========== PAGE: MONITORING OVERVIEW ==========
+elif st.session_state.page == "Monitoring Overview":
+    overview_kpis()
+    overview_charts()
+    overview_device_tabs()
+
+# ========== PAGE: ACTIVE TICKETS ==========
+elif st.session_state.page == "Active Tickets":
+    st.title("🎫 Active Support Tickets")
+    
+    active_tickets_summary()
+    tickets_df = get_tickets_from_db()
+    
+    if not tickets_df.empty:
+        st.markdown("---")
+        st.subheader("🔍 Ticket Details")
+        
+        # Kartu dirender per halaman: saat outage massal hanya TICKET_CARDS_PER_PAGE
+        # expander + form yang dibuat setiap rerun, bukan ratusan.
+        total_pages = (len(tickets_df) - 1) // TICKET_CARDS_PER_PAGE + 1
+        if total_pages > 1:
+            # Jumlah halaman bisa menyusut saat ticket resolved
+            if st.session_state.get('ticket_card_page', 1) > total_pages:
+                st.session_state.ticket_card_page = total_pages
+            page = st.number_input("Page", min_value=1, max_value=total_pages, step=1, key='ticket_card_page')
+            st.caption(f"Showing {(page - 1) * TICKET_CARDS_PER_PAGE + 1}-"
+                       f"{min(page * TICKET_CARDS_PER_PAGE, len(tickets_df))} of {len(tickets_df)} active tickets")
+        else:
+            page = 1
+        
+        page_ids = tickets_df['ticket_id'].iloc[(page - 1) * TICKET_CARDS_PER_PAGE:page * TICKET_CARDS_PER_PAGE]
+        for ticket_id in page_ids:
+            ticket_card(ticket_id)
+    else:
+        st.success("✅ No active tickets. All devices are operating normally.")
+        st.balloons()
+
+# ========== PAGE: TICKET HISTORY ==========
+elif st.session_state.page == "Ticket History":
+    st.title("📜 Ticket History")
+    ticket_history_view()
+
+# ========== PAGE: DEVICE HISTORY ==========
+elif st.session_state.page == "Device History":
+    st.title("📈 Device History")
+    device_history_view()
+
+# Live update: fragment kecil memeriksa versi listener setiap EVENT_POLL detik tanpa
+# query database dan menampilkan toast untuk event baru. Event yang relevan untuk
+# halaman ini (PAGE_EVENTS) me-rerun halaman; snapshot sudah ditandai basi oleh
+# listener sehingga rerun itu mengambil delta sekali untuk semua sesi. Rerun
+# digabung paling sering sekali per EVENT_RERUN_INTERVAL. Jika listener terputus,
+# toast dihitung dari perubahan ticket aktif dan fragment kembali ke timer cepat.
+@st.fragment(run_every=EVENT_POLL)
+def live_update_watcher():
+    listener = get_event_listener()
+    if listener.connected != st.session_state.listener_connected:
+        # run_every fragment dihitung ulang (push <-> polling)
+        st.rerun()
+    if not listener.connected:
+        toast_status_changes(get_tickets_from_db())
+        return
+    seen = st.session_state.event_version
+    if listener.version != seen:
+        new_events = [e for e in listener.events_since(seen) if e]
+        st.session_state.event_version = listener.version
+        toasts = [event_toast(e) for e in new_events]
+        for toast_text, toast_icon in [t for t in toasts if t][-5:]:
+            st.toast(toast_text, icon=toast_icon)
+        page_events = PAGE_EVENTS.get(st.session_state.page, ())
+        # Versi naik tanpa event (reconnect) atau event terbuang dari buffer: anggap relevan
+        missed = len(new_events) < listener.version - seen
+        if page_events and (missed or any(e['type'] in page_events for e in new_events)):
+            st.session_state.rerun_pending = True
+    if (st.session_state.get('rerun_pending')
+            and time.monotonic() - st.session_state.get('event_rerun_at', 0) >= EVENT_RERUN_INTERVAL):
+        st.session_state.rerun_pending = False
+        st.session_state.event_rerun_at = time.monotonic()
+        st.rerun()
 
-# Auto-refresh
 if auto_refresh:
-    time.sleep(delay)
-    st.rerun()
\ No newline at end of file
+    live_update_watcher()
@@ -0,0 +1,109 @@
+"""
+Load test endpoint /api/v1/checkin: membandingkan server Flask (api.py)
+dengan server ASGI (api_async.py).
+
+Setiap target diuji bergantian dengan N koneksi keep-alive paralel (closed
+loop) selama durasi tertentu, lalu dilaporkan throughput serta latensi
+p50/p90/p99.
+
+Contoh:
+    python loadtest.py --concurrency 200 --duration 20 \\
+        flask=http://127.0.0.1:5000 asgi=http://127.0.0.1:5001
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+
+import aiohttp
+
+CHECKIN_PATH = "/api/v1/checkin"
+STATUSES = [("online", "System OK")] * 18 + [("error", "Sensor Error 502"), ("offline", "Connection Lost")]
+
+
+def percentile(sorted_values, pct):
+    """Percentile dengan nearest-rank pada list yang sudah terurut."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+async def run_target(name, base_url, concurrency, duration, devices):
+    url = base_url.rstrip("/") + CHECKIN_PATH
+    latencies = []
+    errors = 0
+    stop_at = time.monotonic() + duration
+
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=10)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+
+        async def worker(worker_id):
+            nonlocal errors
+            while time.monotonic() < stop_at:
+                status, message = random.choice(STATUSES)
+                payload = {
+                    "device_id": f"LOADTEST-{random.randrange(devices):06d}",
+                    "status": status,
+                    "message": message,
+                }
+                started = time.perf_counter()
+                try:
+                    async with session.post(url, json=payload) as resp:
+                        await resp.read()
+                        if resp.status >= 400:
+                            errors += 1
+                            continue
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "name": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50) * 1000,
+        "p90": percentile(latencies, 90) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+    }
+
+
+def print_report(results):
+    print(f"\n{'target':<10} {'ok':>9} {'err':>7} {'req/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+    for r in results:
+        print(f"{r['name']:<10} {r['requests']:>9} {r['errors']:>7} {r['rps']:>10.1f} "
+              f"{r['p50']:>9.2f} {r['p90']:>9.2f} {r['p99']:>9.2f}")
+
+
+async def main_async(args):
+    results = []
+    for spec in args.targets:
+        name, _, base_url = spec.partition("=")
+        if not base_url:
+            name, base_url = spec, spec
+        print(f"Menguji {name} ({base_url}) - {args.concurrency} koneksi, {args.duration:.0f}s...")
+        results.append(await run_target(name, base_url, args.concurrency,
+                                        args.duration, args.devices))
+    print_report(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test Flask vs ASGI untuk /api/v1/checkin")
+    parser.add_argument("targets", nargs="+", help="nama=URL dasar, mis. flask=http://127.0.0.1:5000")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=15.0, help="detik per target")
+    parser.add_argument("--devices", type=int, default=1000, help="jumlah device_id acak")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
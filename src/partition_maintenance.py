@@ -0,0 +1,276 @@
+"""
+Pemeliharaan partisi tabel device_history.
+
+device_history di-partisi RANGE pada kolom timestamp (epoch detik), per hari
+atau per bulan menurut zona waktu lokal. Job ini:
+  1. membuat partisi untuk periode mendatang (pre-create) agar insert tidak
+     pernah jatuh ke partisi default,
+  2. memindahkan baris yang terlanjur masuk partisi default ke partisi yang benar,
+  3. men-DETACH atau DROP partisi yang seluruhnya lebih tua dari masa retensi,
+     menggantikan DELETE ... WHERE created_at < NOW() - INTERVAL '90 days'.
+     Run terakhir device yang hanya ada di partisi tersebut (run yang masih
+     berjalan, terutama pada HISTORY_MODE "changes") dibawa dulu ke batas
+     retensi agar status device tidak hilang dari history.
+
+Dipanggil otomatis oleh api.py (saat startup dan periodik), atau manual/cron:
+    python partition_maintenance.py
+    python partition_maintenance.py --retention-days 90 --detach-only
+    python partition_maintenance.py --migrate     # ubah tabel lama (non-partisi)
+"""
+import argparse
+import re
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import psycopg2
+
+from device_cache import INVALIDATE_CHANNEL
+
+PARENT = "device_history"
+DEFAULT_PARTITION = "device_history_default"
+LOCAL_TZ = ZoneInfo("Asia/Jakarta")
+
+# DDL tabel induk; dipakai juga oleh init_db() di api.py
+CREATE_PARENT_SQL = """
+CREATE TABLE IF NOT EXISTS device_history (
+    id BIGSERIAL,
+    device_id TEXT NOT NULL,
+    timestamp BIGINT NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT,
+    last_seen BIGINT,
+    heartbeat_count INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT (now() AT TIME ZONE 'Asia/Jakarta'),
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp)
+"""
+
+CREATE_INDEXES_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_history_device_time ON device_history(device_id, timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_history_timestamp ON device_history(timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_history_status ON device_history(status)",
+]
+
+_BOUND_RE = re.compile(r"FROM \('?(-?\d+)'?\) TO \('?(-?\d+)'?\)")
+
+
+# --- Perhitungan batas periode ---
+def period_start(dt, granularity):
+    dt = dt.astimezone(LOCAL_TZ)
+    if granularity == "monthly":
+        return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def next_period(start, granularity):
+    if granularity == "monthly":
+        year, month = (start.year + 1, 1) if start.month == 12 else (start.year, start.month + 1)
+        return start.replace(year=year, month=month)
+    # Tambah satu hari kalender lalu normalisasi (aman terhadap perubahan offset)
+    return period_start(start + timedelta(hours=36), "daily")
+
+def partition_name(start, granularity):
+    suffix = start.strftime("%Y%m") if granularity == "monthly" else start.strftime("%Y%m%d")
+    return f"{PARENT}_p{suffix}"
+
+
+# --- Introspeksi ---
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (PARENT,))
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+def list_partitions(cursor):
+    """Mengembalikan [(nama, batas_bawah, batas_atas)] untuk partisi range (tanpa default)."""
+    cursor.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (PARENT,))
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = _BOUND_RE.search(bound or "")
+        if match:
+            partitions.append((name, int(match.group(1)), int(match.group(2))))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+# --- Operasi partisi ---
+def create_partition(cursor, name, lower, upper):
+    """Membuat satu partisi; baris yang terlanjur di partisi default dipindahkan dulu."""
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {name} (LIKE {PARENT} INCLUDING DEFAULTS)")
+    cursor.execute(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION}
+            WHERE timestamp >= %s AND timestamp < %s
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """, (lower, upper))
+    cursor.execute(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                   (lower, upper))
+
+def ensure_partitions(cursor, ahead=7, granularity="daily", since=None):
+    """Memastikan ada partisi dari periode `since` (default: sekarang) sampai `ahead` periode ke depan."""
+    existing = list_partitions(cursor)
+    covered = [(lo, hi) for _, lo, hi in existing]
+
+    start = period_start(since or datetime.now(LOCAL_TZ), granularity)
+    end = period_start(datetime.now(LOCAL_TZ), granularity)
+    for _ in range(ahead):
+        end = next_period(end, granularity)
+
+    created = []
+    while start <= end:
+        upper = next_period(start, granularity)
+        lo, hi = int(start.timestamp()), int(upper.timestamp())
+        if not any(lo < c_hi and hi > c_lo for c_lo, c_hi in covered):
+            name = partition_name(start, granularity)
+            create_partition(cursor, name, lo, hi)
+            covered.append((lo, hi))
+            created.append(name)
+        start = upper
+    return created
+
+def carry_open_runs(cursor, boundary):
+    """Membawa run terakhir device yang seluruhnya di bawah `boundary` ke timestamp `boundary`.
+
+    Baris yang sama (id, status, message) disalin ke partisi pertama yang disimpan
+    dengan awal run dipotong ke batas retensi; baris aslinya ikut hilang bersama
+    partisinya. Key run (id, timestamp) berubah, jadi entri cache device di API
+    dibuang lewat NOTIFY agar heartbeat berikutnya tidak memperbarui key lama.
+    """
+    cursor.execute(f"""
+        INSERT INTO {PARENT} (id, device_id, timestamp, status, message, last_seen,
+                              heartbeat_count, created_at)
+        SELECT id, device_id, %(boundary)s, status, message, GREATEST(last_seen, %(boundary)s),
+               heartbeat_count, created_at
+        FROM (
+            SELECT DISTINCT ON (device_id) *
+            FROM {PARENT}
+            WHERE timestamp < %(boundary)s
+            ORDER BY device_id, timestamp DESC, id DESC
+        ) latest
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {PARENT} h
+            WHERE h.device_id = latest.device_id AND h.timestamp >= %(boundary)s
+        )
+        RETURNING device_id
+    """, {"boundary": boundary})
+    carried = [row[0] for row in cursor.fetchall()]
+    if carried:
+        cursor.execute("SELECT pg_notify(%s, d) FROM unnest(%s::TEXT[]) AS d",
+                       (INVALIDATE_CHANNEL, carried))
+    return carried
+
+def apply_retention(cursor, retention_days, drop=True):
+    """Melepas (dan menghapus) partisi yang seluruh isinya lebih tua dari masa retensi."""
+    cutoff = int((datetime.now(LOCAL_TZ) - timedelta(days=retention_days)).timestamp())
+    expiring = [(name, upper) for name, _, upper in list_partitions(cursor) if upper <= cutoff]
+    if not expiring:
+        return []
+    carried = carry_open_runs(cursor, max(upper for _, upper in expiring))
+    if carried:
+        print(f"Run terakhir {len(carried)} device dibawa ke batas retensi sebelum partisi dilepas.")
+    expired = []
+    for name, _ in expiring:
+        cursor.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {name}")
+        if drop:
+            cursor.execute(f"DROP TABLE {name}")
+        expired.append(name)
+    return expired
+
+def run_maintenance(conn, ahead=7, retention_days=90, granularity="daily", drop=True):
+    """Satu putaran pemeliharaan dalam satu transaksi. Tidak melakukan apa-apa untuk tabel non-partisi."""
+    cursor = conn.cursor()
+    if not is_partitioned(cursor):
+        cursor.close()
+        return [], []
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT")
+    created = ensure_partitions(cursor, ahead=ahead, granularity=granularity)
+    expired = apply_retention(cursor, retention_days, drop=drop) if retention_days else []
+    conn.commit()
+    cursor.close()
+    return created, expired
+
+
+# --- Migrasi dari tabel lama ---
+def migrate_to_partitioned(conn, granularity="daily", ahead=7, keep_legacy=False):
+    """Mengubah device_history biasa menjadi tabel partisi (satu transaksi).
+
+    Tabel lama di-rename, partisi dibuat untuk seluruh rentang datanya, data
+    disalin, lalu sequence id dilanjutkan dari id terbesar.
+    """
+    cursor = conn.cursor()
+    if is_partitioned(cursor):
+        print("device_history sudah berupa tabel partisi.")
+        return False
+    cursor.execute("SELECT to_regclass(%s)", (PARENT,))
+    if cursor.fetchone()[0] is None:
+        print("device_history belum ada; jalankan init_db() di api.py.")
+        return False
+
+    legacy = f"{PARENT}_legacy"
+    cursor.execute(f"ALTER TABLE {PARENT} RENAME TO {legacy}")
+    cursor.execute("ALTER SEQUENCE IF EXISTS device_history_id_seq RENAME TO device_history_legacy_id_seq")
+    cursor.execute("ALTER INDEX IF EXISTS device_history_pkey RENAME TO device_history_legacy_pkey")
+    for index in ("idx_history_device_id", "idx_history_timestamp",
+                  "idx_history_status", "idx_history_device_time"):
+        cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+    cursor.execute(CREATE_PARENT_SQL)
+    for sql in CREATE_INDEXES_SQL:
+        cursor.execute(sql)
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT")
+
+    cursor.execute(f"SELECT MIN(timestamp) FROM {legacy}")
+    oldest = cursor.fetchone()[0]
+    since = datetime.fromtimestamp(oldest, LOCAL_TZ) if oldest is not None else None
+    ensure_partitions(cursor, ahead=ahead, granularity=granularity, since=since)
+
+    cursor.execute(f"""
+        INSERT INTO {PARENT} (id, device_id, timestamp, status, message, last_seen, heartbeat_count, created_at)
+        SELECT id, device_id, timestamp, status, message,
+               COALESCE(last_seen, timestamp), COALESCE(heartbeat_count, 1), created_at
+        FROM {legacy}
+    """)
+    copied = cursor.rowcount
+    cursor.execute(f"SELECT setval('device_history_id_seq', COALESCE((SELECT MAX(id) FROM {PARENT}), 0) + 1, false)")
+    if not keep_legacy:
+        cursor.execute(f"DROP TABLE {legacy}")
+    conn.commit()
+    cursor.close()
+    print(f"Migrasi selesai: {copied} baris dipindahkan ke device_history (partisi {granularity}).")
+    return True
+
+
+def main():
+    from api import PG_HOST, PG_PORT, PG_USER, PG_PASSWORD, PG_DATABASE
+
+    parser = argparse.ArgumentParser(description="Pemeliharaan partisi device_history")
+    parser.add_argument("--granularity", choices=["daily", "monthly"], default="daily")
+    parser.add_argument("--ahead", type=int, default=7, help="jumlah periode ke depan yang disiapkan")
+    parser.add_argument("--retention-days", type=int, default=90, help="0 = tanpa retensi")
+    parser.add_argument("--detach-only", action="store_true",
+                        help="partisi kedaluwarsa hanya di-detach (tidak di-drop)")
+    parser.add_argument("--migrate", action="store_true",
+                        help="ubah tabel device_history lama menjadi tabel partisi")
+    parser.add_argument("--keep-legacy", action="store_true",
+                        help="simpan tabel lama sebagai device_history_legacy setelah migrasi")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(host=PG_HOST, port=PG_PORT, user=PG_USER,
+                            password=PG_PASSWORD, database=PG_DATABASE)
+    try:
+        if args.migrate:
+            migrate_to_partitioned(conn, args.granularity, args.ahead, args.keep_legacy)
+        created, expired = run_maintenance(conn, args.ahead, args.retention_days,
+                                           args.granularity, drop=not args.detach_only)
+        print(f"Partisi dibuat: {created or '-'}")
+        print(f"Partisi kedaluwarsa ({'detach' if args.detach_only else 'drop'}): {expired or '-'}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
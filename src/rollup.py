@@ -0,0 +1,513 @@
+"""
+Rollup status perangkat per menit, jam, dan hari.
+
+Tabel device_rollup_minute / _hour / _day menyimpan, per device per bucket:
+detik di setiap status (online/error/offline), jumlah transisi status, dan
+jumlah ticket yang dibuka. Setiap granularity dihitung langsung dari
+device_history secara inkremental: hanya bucket di antara watermark terakhir
+dan sekarang yang diproses, dengan status tiap device di awal jendela disimpan
+di rollup_device_cursor. Rollup jam dan hari rapat (satu baris per device per
+bucket); rollup menit hanya menyimpan menit yang punya baris history atau ticket.
+Laporan 30/90 hari cukup membaca beberapa baris harian ditambah jam penuh di
+tepinya; potongan di luar rollup (kurang dari satu jam, setelah watermark, atau
+lebih tua dari retensi jam) dihitung dari device_status_spans() (lihat
+device_rollup_totals). device_status_timeline memakai rollup jam yang sama
+untuk grafik timeline dengan jumlah titik tetap, berapa pun panjang rentangnya.
+
+Dijalankan periodik oleh api.py, atau manual/cron:
+    python rollup.py
+"""
+import argparse
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import psycopg2
+
+from status_spans import SPANS_FUNCTION_DDL
+
+LOCAL_TZ = ZoneInfo("Asia/Jakarta")
+GRANULARITIES = ("minute", "hour", "day")
+
+ROLLUP_DDL = """
+CREATE TABLE IF NOT EXISTS device_rollup_minute (
+    device_id TEXT NOT NULL,
+    bucket_start BIGINT NOT NULL,
+    online_seconds INTEGER NOT NULL DEFAULT 0,
+    error_seconds INTEGER NOT NULL DEFAULT 0,
+    offline_seconds INTEGER NOT NULL DEFAULT 0,
+    transitions INTEGER NOT NULL DEFAULT 0,
+    tickets_opened INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (device_id, bucket_start)
+);
+CREATE TABLE IF NOT EXISTS device_rollup_hour (LIKE device_rollup_minute INCLUDING ALL);
+CREATE TABLE IF NOT EXISTS device_rollup_day (LIKE device_rollup_minute INCLUDING ALL);
+
+CREATE INDEX IF NOT EXISTS idx_rollup_minute_bucket ON device_rollup_minute(bucket_start);
+CREATE INDEX IF NOT EXISTS idx_rollup_hour_bucket ON device_rollup_hour(bucket_start);
+CREATE INDEX IF NOT EXISTS idx_rollup_day_bucket ON device_rollup_day(bucket_start);
+
+-- Batas atas (eksklusif) data yang sudah di-rollup per granularity, dan bucket
+-- tertua yang masih disimpan (naik saat rollup lama dibuang oleh refresh_rollups)
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    granularity TEXT PRIMARY KEY,
+    watermark BIGINT NOT NULL,
+    retained_from BIGINT
+);
+ALTER TABLE rollup_watermarks ADD COLUMN IF NOT EXISTS retained_from BIGINT;
+
+-- Status setiap device tepat pada watermark (titik awal refresh berikutnya)
+CREATE TABLE IF NOT EXISTS rollup_device_cursor (
+    granularity TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (granularity, device_id)
+);
+
+CREATE OR REPLACE FUNCTION rollup_bucket_size(p_granularity TEXT)
+RETURNS INTEGER AS $$
+    SELECT CASE p_granularity WHEN 'minute' THEN 60 WHEN 'hour' THEN 3600 WHEN 'day' THEN 86400 END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Awal bucket untuk epoch p_ts; hari dimulai tengah malam WIB (UTC+7 = 25200 detik)
+CREATE OR REPLACE FUNCTION rollup_bucket(p_ts BIGINT, p_size INTEGER)
+RETURNS BIGINT AS $$
+    SELECT p_ts - ((p_ts + 25200) % p_size);
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Menghitung ulang bucket [watermark, p_to) untuk satu granularity dari device_history.
+-- Setiap baris history berlaku sampai baris berikutnya milik device yang sama.
+-- Granularity menit hanya menulis bucket device yang punya baris history atau ticket
+-- di menit itu; device yang diam tidak menambah devices x 1440 baris per hari.
+CREATE OR REPLACE FUNCTION refresh_device_rollup(
+    p_granularity TEXT,
+    p_to BIGINT,
+    p_backfill_from BIGINT DEFAULT NULL
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_size INTEGER := rollup_bucket_size(p_granularity);
+    v_from BIGINT;
+    v_to BIGINT;
+    v_rows INTEGER;
+BEGIN
+    IF v_size IS NULL THEN
+        RAISE EXCEPTION 'Granularity tidak dikenal: %', p_granularity;
+    END IF;
+    v_to := rollup_bucket(p_to, v_size);
+
+    SELECT watermark INTO v_from FROM rollup_watermarks
+    WHERE granularity = p_granularity FOR UPDATE;
+
+    IF v_from IS NULL THEN
+        -- Pertama kali: mulai dari data tertua (atau p_backfill_from jika lebih baru)
+        SELECT rollup_bucket(GREATEST(MIN(timestamp), COALESCE(p_backfill_from, MIN(timestamp))), v_size)
+        INTO v_from FROM device_history;
+        IF v_from IS NULL THEN
+            RETURN 0;
+        END IF;
+        INSERT INTO rollup_device_cursor (granularity, device_id, status)
+        SELECT DISTINCT ON (device_id) p_granularity, device_id, status
+        FROM device_history
+        WHERE timestamp < v_from
+        ORDER BY device_id, timestamp DESC, id DESC
+        ON CONFLICT (granularity, device_id) DO UPDATE SET status = EXCLUDED.status;
+        INSERT INTO rollup_watermarks (granularity, watermark, retained_from)
+        VALUES (p_granularity, v_from, v_from);
+    END IF;
+
+    IF v_to <= v_from THEN
+        RETURN 0;
+    END IF;
+
+    EXECUTE format($f$
+        WITH src AS (
+            SELECT device_id, $1::BIGINT AS ts, 0::BIGINT AS id, status, FALSE AS is_row
+            FROM rollup_device_cursor
+            WHERE granularity = $3
+            UNION ALL
+            SELECT device_id, timestamp, id, status, TRUE
+            FROM device_history
+            WHERE timestamp >= $1 AND timestamp < $2
+        ),
+        segs AS (
+            SELECT device_id, status, is_row, ts AS s_start,
+                   LEAD(ts, 1, $2::BIGINT) OVER w AS s_end,
+                   COALESCE(is_row AND status <> LAG(status) OVER w, FALSE) AS is_transition,
+                   ROW_NUMBER() OVER (PARTITION BY device_id ORDER BY ts DESC, is_row DESC, id DESC) AS rn_last
+            FROM src
+            WINDOW w AS (PARTITION BY device_id ORDER BY ts, is_row, id)
+        ),
+        pieces AS (
+            SELECT s.device_id, s.status, b AS bucket_start,
+                   LEAST(s.s_end, b + $4) - GREATEST(s.s_start, b) AS seconds,
+                   (s.is_transition AND b = rollup_bucket(s.s_start, $4))::INTEGER AS transitions,
+                   s.is_row AND b = rollup_bucket(s.s_start, $4) AS active
+            FROM segs s
+            CROSS JOIN LATERAL generate_series(
+                rollup_bucket(s.s_start, $4), GREATEST(s.s_end - 1, s.s_start), $4::BIGINT
+            ) AS b
+        ),
+        status_agg AS (
+            SELECT device_id, bucket_start,
+                   COALESCE(SUM(seconds) FILTER (WHERE status = 'online'), 0)::INTEGER AS online_seconds,
+                   COALESCE(SUM(seconds) FILTER (WHERE status = 'error'), 0)::INTEGER AS error_seconds,
+                   COALESCE(SUM(seconds) FILTER (WHERE status = 'offline'), 0)::INTEGER AS offline_seconds,
+                   SUM(transitions)::INTEGER AS transitions
+            FROM pieces
+            GROUP BY device_id, bucket_start
+            HAVING $3 <> 'minute' OR bool_or(active)
+        ),
+        ticket_agg AS (
+            SELECT device_id, rollup_bucket(created_at, $4) AS bucket_start, COUNT(*)::INTEGER AS opened
+            FROM tickets
+            WHERE created_at >= $1 AND created_at < $2
+            GROUP BY 1, 2
+        ),
+        upserted AS (
+            INSERT INTO %I (device_id, bucket_start, online_seconds, error_seconds,
+                            offline_seconds, transitions, tickets_opened)
+            SELECT COALESCE(s.device_id, t.device_id), COALESCE(s.bucket_start, t.bucket_start),
+                   COALESCE(s.online_seconds, 0), COALESCE(s.error_seconds, 0),
+                   COALESCE(s.offline_seconds, 0), COALESCE(s.transitions, 0), COALESCE(t.opened, 0)
+            FROM status_agg s
+            FULL JOIN ticket_agg t ON t.device_id = s.device_id AND t.bucket_start = s.bucket_start
+            ON CONFLICT (device_id, bucket_start) DO UPDATE SET
+                online_seconds = EXCLUDED.online_seconds,
+                error_seconds = EXCLUDED.error_seconds,
+                offline_seconds = EXCLUDED.offline_seconds,
+                transitions = EXCLUDED.transitions,
+                tickets_opened = EXCLUDED.tickets_opened
+            RETURNING 1
+        ),
+        cursor_update AS (
+            INSERT INTO rollup_device_cursor (granularity, device_id, status)
+            SELECT $3, device_id, status FROM segs WHERE rn_last = 1
+            ON CONFLICT (granularity, device_id) DO UPDATE SET status = EXCLUDED.status
+        )
+        SELECT COUNT(*) FROM upserted
+    $f$, 'device_rollup_' || p_granularity)
+    INTO v_rows
+    USING v_from, v_to, p_granularity, v_size;
+
+    UPDATE rollup_watermarks SET watermark = v_to WHERE granularity = p_granularity;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Total per device untuk rentang [p_from, p_to): hari penuh dibaca dari tabel harian
+-- dan jam penuh dari tabel jam, selama bucket itu masih disimpan ([retained_from,
+-- watermark)). Sisanya - potongan kurang dari satu jam di tepi, data setelah watermark,
+-- dan tepi yang lebih tua dari retensi rollup jam - dihitung dari device_status_spans(),
+-- sehingga tidak ada detik yang hilang. Biaya laporan 90 hari hampir sama dengan
+-- laporan 1 jam; potongan mentah terpanjang kurang dari satu hari (tepi lama di luar
+-- retensi jam).
+CREATE OR REPLACE FUNCTION device_rollup_totals(
+    p_from BIGINT,
+    p_to BIGINT,
+    p_device_id TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    device_id TEXT,
+    online_seconds BIGINT,
+    error_seconds BIGINT,
+    offline_seconds BIGINT,
+    transitions BIGINT,
+    tickets_opened BIGINT
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_days INT8RANGE[] := '{}';
+    v_hours INT8RANGE[] := '{}';
+    v_raw INT8RANGE[] := ARRAY[int8range(p_from, p_to)];
+    v_next INT8RANGE[];
+    v_range INT8RANGE;
+    v_gran RECORD;
+    v_lo BIGINT;
+    v_hi BIGINT;
+BEGIN
+    IF p_to <= p_from THEN
+        RETURN;
+    END IF;
+
+    -- Hari penuh dulu, lalu jam penuh pada sisa rentang; yang tersisa dibaca mentah
+    FOR v_gran IN
+        SELECT g.granularity, rollup_bucket_size(g.granularity) AS size,
+               COALESCE(w.retained_from, 0) AS retained_from, COALESCE(w.watermark, 0) AS watermark
+        FROM (VALUES (1, 'day'), (2, 'hour')) AS g(ord, granularity)
+        LEFT JOIN rollup_watermarks w ON w.granularity = g.granularity
+        ORDER BY g.ord
+    LOOP
+        v_next := '{}';
+        FOREACH v_range IN ARRAY v_raw LOOP
+            CONTINUE WHEN isempty(v_range);
+            v_lo := rollup_bucket(GREATEST(lower(v_range), v_gran.retained_from) + v_gran.size - 1,
+                                  v_gran.size);
+            v_hi := rollup_bucket(LEAST(upper(v_range), v_gran.watermark), v_gran.size);
+            IF v_hi > v_lo THEN
+                IF v_gran.granularity = 'day' THEN
+                    v_days := v_days || int8range(v_lo, v_hi);
+                ELSE
+                    v_hours := v_hours || int8range(v_lo, v_hi);
+                END IF;
+                v_next := v_next || int8range(lower(v_range), v_lo) || int8range(v_hi, upper(v_range));
+            ELSE
+                v_next := v_next || v_range;
+            END IF;
+        END LOOP;
+        v_raw := v_next;
+    END LOOP;
+
+    RETURN QUERY
+    WITH raw_spans AS (
+        -- Dimulai satu detik sebelum potongan agar baris tepat di tepi bawah tetap
+        -- punya pembanding untuk menghitung transisi
+        SELECT sp.device_id, sp.status,
+               sp.span_end - GREATEST(sp.span_start, lower(rng.r)) AS seconds,
+               COALESCE(sp.span_start >= lower(rng.r)
+                        AND sp.status <> LAG(sp.status) OVER (PARTITION BY rng.r, sp.device_id
+                                                              ORDER BY sp.span_start),
+                        FALSE) AS is_transition
+        FROM unnest(v_raw) AS rng(r)
+        CROSS JOIN LATERAL device_status_spans(lower(rng.r) - 1, upper(rng.r), p_device_id) sp
+        WHERE NOT isempty(rng.r)
+    ),
+    parts AS (
+        SELECT r.device_id, r.online_seconds, r.error_seconds, r.offline_seconds,
+               r.transitions, r.tickets_opened
+        FROM unnest(v_days) AS d(rng)
+        JOIN device_rollup_day r
+          ON r.bucket_start >= lower(d.rng) AND r.bucket_start < upper(d.rng)
+        WHERE p_device_id IS NULL OR r.device_id = p_device_id
+        UNION ALL
+        SELECT r.device_id, r.online_seconds, r.error_seconds, r.offline_seconds,
+               r.transitions, r.tickets_opened
+        FROM unnest(v_hours) AS h(rng)
+        JOIN device_rollup_hour r
+          ON r.bucket_start >= lower(h.rng) AND r.bucket_start < upper(h.rng)
+        WHERE p_device_id IS NULL OR r.device_id = p_device_id
+        UNION ALL
+        SELECT s.device_id,
+               CASE WHEN s.status = 'online' THEN s.seconds ELSE 0 END,
+               CASE WHEN s.status = 'error' THEN s.seconds ELSE 0 END,
+               CASE WHEN s.status = 'offline' THEN s.seconds ELSE 0 END,
+               s.is_transition::INTEGER, 0
+        FROM raw_spans s
+        UNION ALL
+        SELECT t.device_id, 0, 0, 0, 0, 1
+        FROM unnest(v_raw) AS rng(r)
+        JOIN tickets t ON t.created_at >= lower(rng.r) AND t.created_at < upper(rng.r)
+        WHERE NOT isempty(rng.r)
+          AND (p_device_id IS NULL OR t.device_id = p_device_id)
+    )
+    SELECT p.device_id,
+           SUM(p.online_seconds)::BIGINT, SUM(p.error_seconds)::BIGINT,
+           SUM(p.offline_seconds)::BIGINT, SUM(p.transitions)::BIGINT,
+           SUM(p.tickets_opened)::BIGINT
+    FROM parts p
+    GROUP BY p.device_id;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Timeline status satu device untuk [p_from, p_to) dalam sekitar p_points bucket.
+-- Ukuran bucket dipilih dari daftar langkah "rapi" sehingga jumlah titik tetap
+-- kira-kira sama untuk rentang 1 jam maupun 90 hari. Per bucket: detik per status,
+-- transisi, status dominan (durasi terlama) dan status terburuk yang sempat terjadi.
+-- Bucket >= 1 jam yang sudah di-rollup dibaca dari device_rollup_hour; tepi rentang
+-- dan data setelah watermark dihitung dari device_history.
+CREATE OR REPLACE FUNCTION device_status_timeline(
+    p_device_id TEXT,
+    p_from BIGINT,
+    p_to BIGINT,
+    p_points INTEGER DEFAULT 300
+)
+RETURNS TABLE (
+    bucket_start BIGINT,
+    bucket_end BIGINT,
+    online_seconds BIGINT,
+    error_seconds BIGINT,
+    offline_seconds BIGINT,
+    transitions BIGINT,
+    dominant_status TEXT,
+    worst_status TEXT
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_step BIGINT;
+    v_lo BIGINT;
+    v_hi BIGINT;
+    v_rolled INT8RANGE;
+    v_raw INT8RANGE[];
+BEGIN
+    IF p_to <= p_from THEN
+        RETURN;
+    END IF;
+
+    SELECT s INTO v_step
+    FROM unnest(ARRAY[10, 15, 30, 60, 120, 300, 600, 900, 1800,
+                      3600, 7200, 10800, 21600, 43200, 86400]::BIGINT[]) AS s
+    WHERE s * GREATEST(p_points, 1) >= p_to - p_from
+    ORDER BY s
+    LIMIT 1;
+    IF v_step IS NULL THEN
+        v_step := CEIL((p_to - p_from)::NUMERIC / GREATEST(p_points, 1) / 86400)::BIGINT * 86400;
+    END IF;
+
+    -- Bucket utuh yang seluruhnya tercakup rollup jam: [data rollup tertua, watermark)
+    v_raw := ARRAY[int8range(p_from, p_to)];
+    IF v_step >= 3600 THEN
+        SELECT rollup_bucket(MIN(r.bucket_start) + v_step - 1, v_step::INTEGER) INTO v_lo
+        FROM device_rollup_hour r WHERE r.device_id = p_device_id;
+        SELECT rollup_bucket(LEAST(w.watermark, p_to), v_step::INTEGER) INTO v_hi
+        FROM rollup_watermarks w WHERE w.granularity = 'hour';
+        -- GREATEST mengabaikan NULL: cek dulu bahwa rollup device ini memang ada
+        IF v_lo IS NOT NULL THEN
+            v_lo := GREATEST(v_lo, rollup_bucket(p_from + v_step - 1, v_step::INTEGER));
+        END IF;
+        IF v_hi > v_lo THEN
+            v_rolled := int8range(v_lo, v_hi);
+            v_raw := ARRAY[int8range(p_from, v_lo), int8range(v_hi, p_to)];
+        END IF;
+    END IF;
+
+    RETURN QUERY
+    WITH raw_spans AS (
+        SELECT sp.status, sp.span_start, sp.span_end, sp.is_transition
+        FROM unnest(v_raw) AS rng(r)
+        CROSS JOIN LATERAL (
+            SELECT runs.status,
+                   GREATEST(runs.timestamp, lower(rng.r)) AS span_start,
+                   LEAD(runs.timestamp, 1, upper(rng.r)) OVER w AS span_end,
+                   COALESCE(runs.timestamp >= lower(rng.r) AND runs.status <> LAG(runs.status) OVER w,
+                            FALSE) AS is_transition
+            FROM (
+                (SELECT h.timestamp, h.id, h.status
+                 FROM device_history h
+                 WHERE h.device_id = p_device_id AND h.timestamp < lower(rng.r)
+                 ORDER BY h.timestamp DESC, h.id DESC
+                 LIMIT 1)
+                UNION ALL
+                SELECT h.timestamp, h.id, h.status
+                FROM device_history h
+                WHERE h.device_id = p_device_id
+                  AND h.timestamp >= lower(rng.r) AND h.timestamp < upper(rng.r)
+            ) runs
+            WINDOW w AS (ORDER BY runs.timestamp, runs.id)
+        ) sp
+        WHERE NOT isempty(rng.r) AND sp.span_end > sp.span_start
+    ),
+    parts AS (
+        SELECT b AS bucket,
+               CASE WHEN s.status = 'online' THEN LEAST(s.span_end, b + v_step) - GREATEST(s.span_start, b) ELSE 0 END AS online_s,
+               CASE WHEN s.status = 'error' THEN LEAST(s.span_end, b + v_step) - GREATEST(s.span_start, b) ELSE 0 END AS error_s,
+               CASE WHEN s.status = 'offline' THEN LEAST(s.span_end, b + v_step) - GREATEST(s.span_start, b) ELSE 0 END AS offline_s,
+               (s.is_transition AND b = rollup_bucket(s.span_start, v_step::INTEGER))::INTEGER AS trans
+        FROM raw_spans s
+        CROSS JOIN LATERAL generate_series(
+            rollup_bucket(s.span_start, v_step::INTEGER), s.span_end - 1, v_step
+        ) AS b
+        UNION ALL
+        SELECT rollup_bucket(r.bucket_start, v_step::INTEGER), r.online_seconds, r.error_seconds,
+               r.offline_seconds, r.transitions
+        FROM device_rollup_hour r
+        WHERE v_rolled IS NOT NULL AND r.device_id = p_device_id
+          AND r.bucket_start >= lower(v_rolled) AND r.bucket_start < upper(v_rolled)
+    ),
+    buckets AS (
+        SELECT bucket, SUM(online_s)::BIGINT AS online_s, SUM(error_s)::BIGINT AS error_s,
+               SUM(offline_s)::BIGINT AS offline_s, SUM(trans)::BIGINT AS trans
+        FROM parts
+        GROUP BY bucket
+    )
+    SELECT GREATEST(b.bucket, p_from), LEAST(b.bucket + v_step, p_to),
+           b.online_s, b.error_s, b.offline_s, b.trans,
+           CASE WHEN b.offline_s >= b.online_s AND b.offline_s >= b.error_s THEN 'offline'
+                WHEN b.error_s >= b.online_s THEN 'error'
+                ELSE 'online' END,
+           CASE WHEN b.offline_s > 0 THEN 'offline'
+                WHEN b.error_s > 0 THEN 'error'
+                ELSE 'online' END
+    FROM buckets b
+    WHERE b.online_s + b.error_s + b.offline_s > 0
+    ORDER BY b.bucket;
+END;
+$$ LANGUAGE plpgsql STABLE;
+"""
+
+
+def ensure_rollup_schema(conn):
+    """Membuat tabel dan function rollup (idempoten). Commit oleh pemanggil.
+
+    device_status_spans() ikut dibuat: device_rollup_totals membaca tepi laporan darinya.
+    """
+    cursor = conn.cursor()
+    cursor.execute(SPANS_FUNCTION_DDL)
+    cursor.execute(ROLLUP_DDL)
+    cursor.close()
+
+
+def refresh_rollups(conn, delay=60, minute_retention_hours=48, hour_retention_days=90):
+    """Satu putaran refresh semua granularity lalu buang rollup menit/jam yang kedaluwarsa.
+
+    retained_from di rollup_watermarks ikut dinaikkan ke bucket tertua yang masih
+    utuh, sehingga device_rollup_totals menghitung rentang yang lebih tua dari
+    device_status_spans() alih-alih menjumlahkan bucket yang sudah dibuang.
+
+    `delay` detik terakhir tidak di-rollup agar check-in yang masih dalam
+    perjalanan (antrian write-behind, transaksi berjalan) tidak terlewat.
+    Mengembalikan {granularity: jumlah baris bucket yang ditulis}.
+    """
+    now = datetime.now(LOCAL_TZ)
+    until = int(now.timestamp()) - delay
+    backfill_from = {
+        "minute": int((now - timedelta(hours=minute_retention_hours)).timestamp()),
+        "hour": int((now - timedelta(days=hour_retention_days)).timestamp()),
+        "day": None,
+    }
+
+    written = {}
+    cursor = conn.cursor()
+    for granularity in GRANULARITIES:
+        cursor.execute("SELECT refresh_device_rollup(%s, %s, %s)",
+                       (granularity, until, backfill_from[granularity]))
+        written[granularity] = cursor.fetchone()[0]
+        conn.commit()
+
+    for granularity in ("minute", "hour"):
+        cursor.execute(f"DELETE FROM device_rollup_{granularity} WHERE bucket_start < %s",
+                       (backfill_from[granularity],))
+        cursor.execute("""
+            UPDATE rollup_watermarks
+            SET retained_from = GREATEST(COALESCE(retained_from, 0),
+                                         rollup_bucket(%s + rollup_bucket_size(granularity) - 1,
+                                                       rollup_bucket_size(granularity)))
+            WHERE granularity = %s
+        """, (backfill_from[granularity], granularity))
+    conn.commit()
+    cursor.close()
+    return written
+
+
+def main():
+    from api import PG_HOST, PG_PORT, PG_USER, PG_PASSWORD, PG_DATABASE
+
+    parser = argparse.ArgumentParser(description="Refresh rollup status perangkat")
+    parser.add_argument("--delay", type=int, default=60, help="detik terakhir yang belum di-rollup")
+    parser.add_argument("--minute-retention-hours", type=int, default=48)
+    parser.add_argument("--hour-retention-days", type=int, default=90)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(host=PG_HOST, port=PG_PORT, user=PG_USER,
+                            password=PG_PASSWORD, database=PG_DATABASE)
+    try:
+        ensure_rollup_schema(conn)
+        conn.commit()
+        written = refresh_rollups(conn, args.delay, args.minute_retention_hours,
+                                  args.hour_retention_days)
+        for granularity, rows in written.items():
+            print(f"{granularity:<7} {rows} bucket ditulis")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
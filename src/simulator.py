@@ -1,12 +1,51 @@
-import requests
+"""
+Simulator perangkat untuk endpoint /api/v1/checkin.
+
+Dua mode:
+- classic (default): 12 device tetap, satu siklus setiap SIKLUS_TUNGGU detik
+  dengan jeda acak antar device; cocok untuk demo dashboard.
+- load: generator beban untuk capacity planning API dan database. Fleet dibuat
+  dari FLEET_TEMPLATES (ribuan sampai ratusan ribu device) dan check-in dikirim
+  asinkron lewat koneksi keep-alive (aiohttp) secara open loop: jadwal kirim
+  ditentukan di depan dan tidak menunggu respons, sehingga API yang melambat
+  terlihat sebagai latensi yang naik, bukan throughput yang diam-diam turun.
+  Latensi diukur dari waktu terjadwal (termasuk antre di sisi klien).
+
+Profil mode load:
+- constant: setiap device check-in sekali per --interval detik (atau --rate
+  request/detik total), urutan device diacak.
+- storm: beban constant ditambah badai outage: setiap --storm-every detik semua
+  device satu ward melapor offline dalam --storm-window detik, lalu pulih
+  bersamaan setelah --outage detik, sehingga ticket dibuka dan ditutup massal.
+
+Contoh:
+    python simulator.py
+    python simulator.py --mode load --devices 20000 --interval 10 --duration 60
+    python simulator.py --mode load --profile storm --devices 50000 --rate 2000 \\
+        --storm-every 30 --outage 10
+    python simulator.py --mode load --format msgpack --compact --compress gzip
+
+Mode load bisa mengirim payload ringkas (codec.py): --format json/msgpack/cbor,
+--compact (key pendek, kode status & kamus pesan) dan --compress gzip/deflate;
+rata-rata byte per request ikut dilaporkan untuk membandingkan bandwidth.
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
 import random
 import time
+from collections import Counter
+
+import requests
+
+import codec
 
 # Pastikan URL ini menunjuk ke tempat 'api.py' Anda berjalan.
 API_URL = "http://127.0.0.1:5000/api/v1/checkin"
 
 # Interval waktu antar siklus pemantauan (detik)
-SIKLUS_TUNGGU = 10  
+SIKLUS_TUNGGU = 10
 
 DEVICES = [
     "BED-MONITOR-101-ICU", "BED-MONITOR-102-ICU", "BED-MONITOR-103-ICU",
@@ -16,77 +55,329 @@ DEVICES = [
     "MRI-MACHINE-MAIN", "CT-SCANNER-01"
 ]
 
-# Menyimpan status terakhir tiap perangkat
-device_states = {}
-
-print("Inisialisasi status awal perangkat...")
-for device in DEVICES:
-    device_states[device] = {
-        "status": "online",
-        "message": "System OK"
-    }
-print(f"Inisialisasi selesai. {len(DEVICES)} perangkat dalam status 'online'.")
-print(f"Memulai simulasi pemantauan real-time ke {API_URL}")
-print("Tekan CTRL+C untuk berhenti.\n")
-
-# ===== SIMULATOR LOOP =====
-while True:
-    print(f"\n--- Siklus baru ({time.strftime('%H:%M:%S')}) ---")
-
-    # Ambil subset perangkat acak untuk disimulasikan (tidak semuanya sekaligus)
-    subset = random.sample(DEVICES, k=random.randint(4, len(DEVICES)))  
-
-    for device_id in subset:
-        current_state = device_states[device_id]
-        rand_val = random.random()
-
-        # Logika realistis: tidak terlalu stabil tapi tetap masuk akal
-        if current_state["status"] == "online":
-            if rand_val < 0.1:  # 10% kemungkinan error ringan
-                current_state["status"] = "error"
-                current_state["message"] = random.choice([
-                    "Battery Low (15%)", "Sensor Error 502", "Temperature Drift"
-                ])
-                print(f"💥 ERROR: {device_id} mengalami masalah")
-            elif 0.1 <= rand_val < 0.15:  # 5% kemungkinan offline
-                current_state["status"] = "offline"
-                current_state["message"] = "Connection Lost"
-                print(f"🔌 OFFLINE: {device_id} kehilangan koneksi")
-
-        elif current_state["status"] == "error":
-            if rand_val < 0.3:  # 30% kemungkinan pulih
-                current_state["status"] = "online"
-                current_state["message"] = "System OK"
-                print(f"✅ RECOVERED: {device_id} kembali normal")
-            elif rand_val > 0.95:  # 5% kemungkinan jadi offline total
-                current_state["status"] = "offline"
-                current_state["message"] = "Critical Failure"
-                print(f"🚨 CRITICAL: {device_id} gagal total")
-
-        elif current_state["status"] == "offline":
-            if rand_val < 0.4:  # 40% kemungkinan pulih
-                current_state["status"] = "online"
-                current_state["message"] = "System OK"
-                print(f"🔁 RECONNECTED: {device_id} kembali online")
-
-        # Simpan perubahan
-        device_states[device_id] = current_state
-
-        # Kirim status ke API
-        payload = {
-            "device_id": device_id,
-            "status": current_state["status"],
-            "message": current_state["message"]
+# --- KONFIGURASI MODE LOAD ---
+# (jenis device, ward, bobot); komposisi fleet mengikuti bobot
+FLEET_TEMPLATES = (
+    ("BED-MONITOR", ("ICU", "ER", "WARD-A", "WARD-B"), 40),
+    ("INFUSION-PUMP", ("ICU", "ER", "WARD-A", "WARD-B"), 30),
+    ("TEMP-SENSOR", ("RUANG-OBAT", "SERVER-ROOM", "LAB"), 12),
+    ("VENTILATOR", ("ICU", "ER"), 8),
+    ("NURSE-CALL", ("WARD-A", "WARD-B"), 8),
+    ("MRI-MACHINE", ("RADIOLOGY",), 1),
+    ("CT-SCANNER", ("RADIOLOGY",), 1),
+)
+PROFILES = ("constant", "storm")
+MAX_INFLIGHT = 10000     # request belum selesai; lebih dari ini jadwal dilewati (dropped)
+REPORT_EVERY = 5         # detik antar baris progres
+# ----------------------------
+
+# Nomor urut check-in (field "seq"): dimulai dari waktu sekarang dalam milidetik
+# sehingga tetap naik walau simulator di-restart. Retry memakai seq yang sama,
+# jadi API membuang duplikatnya.
+SEQ = itertools.count(int(time.time() * 1000))
+
+EVENT_LOGS = {
+    "error": "💥 ERROR: {} mengalami masalah",
+    "offline": "🔌 OFFLINE: {} kehilangan koneksi",
+    "recovered": "✅ RECOVERED: {} kembali normal",
+    "critical": "🚨 CRITICAL: {} gagal total",
+    "reconnected": "🔁 RECONNECTED: {} kembali online",
+}
+
+
+def step_state(state, rand_val):
+    """Transisi status satu device (diubah di tempat); mengembalikan nama kejadian atau None."""
+    # Logika realistis: tidak terlalu stabil tapi tetap masuk akal
+    if state["status"] == "online":
+        if rand_val < 0.1:  # 10% kemungkinan error ringan
+            state["status"] = "error"
+            state["message"] = random.choice([
+                "Battery Low (15%)", "Sensor Error 502", "Temperature Drift"
+            ])
+            return "error"
+        elif 0.1 <= rand_val < 0.15:  # 5% kemungkinan offline
+            state["status"] = "offline"
+            state["message"] = "Connection Lost"
+            return "offline"
+
+    elif state["status"] == "error":
+        if rand_val < 0.3:  # 30% kemungkinan pulih
+            state["status"] = "online"
+            state["message"] = "System OK"
+            return "recovered"
+        elif rand_val > 0.95:  # 5% kemungkinan jadi offline total
+            state["status"] = "offline"
+            state["message"] = "Critical Failure"
+            return "critical"
+
+    elif state["status"] == "offline":
+        if rand_val < 0.4:  # 40% kemungkinan pulih
+            state["status"] = "online"
+            state["message"] = "System OK"
+            return "reconnected"
+    return None
+
+
+# --- (A) Mode classic ---
+def run_classic(api_url):
+    # Menyimpan status terakhir tiap perangkat
+    device_states = {}
+
+    print("Inisialisasi status awal perangkat...")
+    for device in DEVICES:
+        device_states[device] = {
+            "status": "online",
+            "message": "System OK"
         }
-        try:
-            requests.post(API_URL, json=payload, timeout=3)
-        except requests.exceptions.ConnectionError:
-            print("❌ Tidak bisa menghubungi API. Pastikan 'api.py' aktif.")
-        except Exception as e:
-            print(f"⚠️ Error mengirim data: {e}")
-
-        # Tambahkan sedikit jeda acak antar perangkat untuk efek 'live'
-        time.sleep(random.uniform(0.1, 0.3))
-
-    print(f"--- Siklus selesai. Menunggu {SIKLUS_TUNGGU} detik... ---")
-    time.sleep(SIKLUS_TUNGGU)
+    print(f"Inisialisasi selesai. {len(DEVICES)} perangkat dalam status 'online'.")
+    print(f"Memulai simulasi pemantauan real-time ke {api_url}")
+    print("Tekan CTRL+C untuk berhenti.\n")
+
+    # ===== SIMULATOR LOOP =====
+    while True:
+        print(f"\n--- Siklus baru ({time.strftime('%H:%M:%S')}) ---")
+
+        # Ambil subset perangkat acak untuk disimulasikan (tidak semuanya sekaligus)
+        subset = random.sample(DEVICES, k=random.randint(4, len(DEVICES)))
+
+        for device_id in subset:
+            current_state = device_states[device_id]
+            event = step_state(current_state, random.random())
+            if event:
+                print(EVENT_LOGS[event].format(device_id))
+
+            # Kirim status ke API (satu kali retry jika timeout, dengan seq yang sama)
+            payload = {
+                "device_id": device_id,
+                "status": current_state["status"],
+                "message": current_state["message"],
+                "seq": next(SEQ)
+            }
+            try:
+                try:
+                    requests.post(api_url, json=payload, timeout=3)
+                except requests.exceptions.Timeout:
+                    requests.post(api_url, json=payload, timeout=3)
+            except requests.exceptions.ConnectionError:
+                print("❌ Tidak bisa menghubungi API. Pastikan 'api.py' aktif.")
+            except Exception as e:
+                print(f"⚠️ Error mengirim data: {e}")
+
+            # Tambahkan sedikit jeda acak antar perangkat untuk efek 'live'
+            time.sleep(random.uniform(0.1, 0.3))
+
+        print(f"--- Siklus selesai. Menunggu {SIKLUS_TUNGGU} detik... ---")
+        time.sleep(SIKLUS_TUNGGU)
+
+
+# --- (B) Fleet sintetis ---
+class Fleet:
+    """Device hasil FLEET_TEMPLATES beserta status terakhirnya."""
+
+    def __init__(self, size, prefix="SIM", templates=FLEET_TEMPLATES, rng=random):
+        kinds = rng.choices(templates, weights=[t[2] for t in templates], k=size)
+        self.device_ids = []
+        self.wards = []
+        for i, (kind, wards, _) in enumerate(kinds):
+            ward = rng.choice(wards)
+            self.device_ids.append(f"{prefix}-{kind}-{i:06d}-{ward}")
+            self.wards.append(ward)
+        self.states = [{"status": "online", "message": "System OK"} for _ in range(size)]
+
+    def __len__(self):
+        return len(self.device_ids)
+
+    def by_ward(self):
+        groups = {}
+        for i, ward in enumerate(self.wards):
+            groups.setdefault(ward, []).append(i)
+        return groups
+
+    def checkin(self, index, forced=None):
+        """Payload check-in berikutnya; `forced` = (status, message) untuk skenario storm."""
+        state = self.states[index]
+        if forced is None:
+            step_state(state, random.random())
+        else:
+            state["status"], state["message"] = forced
+        return {"device_id": self.device_ids[index],
+                "status": state["status"], "message": state["message"], "seq": next(SEQ)}
+
+
+# --- (C) Jadwal open loop: iterator (offset detik, index device, forced) terurut waktu ---
+def constant_schedule(fleet, rate, duration):
+    """Round-robin atas urutan acak fleet, `rate` check-in per detik."""
+    order = list(range(len(fleet)))
+    random.shuffle(order)
+    i = 0
+    while i / rate < duration:
+        yield i / rate, order[i % len(order)], None
+        i += 1
+
+
+def storm_schedule(fleet, duration, every, window, outage, ward=None):
+    """Badai outage per ward: offline massal lalu pulih massal setelah `outage` detik."""
+    groups = fleet.by_ward()
+    if ward and ward not in groups:
+        raise ValueError(f"Ward tidak ada di fleet: {ward}")
+    start = every
+    while start < duration:
+        members = groups[ward] if ward else random.choice(list(groups.values()))
+        events = []
+        for index in members:
+            events.append((start + random.uniform(0, window), index, ("offline", "Connection Lost")))
+            events.append((start + outage + random.uniform(0, window), index, ("online", "System OK")))
+        events.sort(key=lambda e: e[0])
+        yield from (e for e in events if e[0] < duration)
+        start += every
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = []      # dari waktu terjadwal (detik)
+        self.service = []        # dari waktu kirim sebenarnya (detik)
+        self.codes = Counter()
+        self.sent = 0
+        self.errors = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+
+
+async def send_checkin(session, url, body, headers, scheduled, stats):
+    sent_at = time.perf_counter()
+    stats.bytes_sent += len(body)
+    try:
+        async with session.post(url, data=body, headers=headers) as resp:
+            await resp.read()
+            stats.codes[resp.status] += 1
+            if resp.status >= 400:
+                stats.errors += 1
+                return
+    except Exception:
+        stats.codes["exception"] += 1
+        stats.errors += 1
+        return
+    done = time.perf_counter()
+    stats.latencies.append(done - scheduled)
+    stats.service.append(done - sent_at)
+
+
+async def report_progress(stats, started, inflight):
+    last_ok = 0
+    while True:
+        await asyncio.sleep(REPORT_EVERY)
+        ok = len(stats.latencies)
+        print(f"  t={time.perf_counter() - started:6.1f}s  terkirim={stats.sent}  "
+              f"ok/s={(ok - last_ok) / REPORT_EVERY:8.1f}  error={stats.errors}  "
+              f"in-flight={len(inflight)}  dropped={stats.dropped}")
+        last_ok = ok
+
+
+async def drive(session, url, fleet, schedule, stats, max_inflight, encode):
+    """Kirim check-in tepat pada jadwal tanpa menunggu respons sebelumnya."""
+    inflight = set()
+    started = time.perf_counter()
+    reporter = asyncio.create_task(report_progress(stats, started, inflight))
+    try:
+        for offset, index, forced in schedule:
+            scheduled = started + offset
+            delay = scheduled - time.perf_counter()
+            # sleep(0) tetap memberi giliran ke request lain saat jadwal tertinggal
+            await asyncio.sleep(max(delay, 0))
+            if len(inflight) >= max_inflight:
+                stats.dropped += 1
+                continue
+            task = asyncio.create_task(
+                send_checkin(session, url, *encode(fleet.checkin(index, forced)), scheduled, stats))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+            stats.sent += 1
+        if inflight:
+            await asyncio.wait(inflight)
+    finally:
+        reporter.cancel()
+    return time.perf_counter() - started
+
+
+async def run_load(args):
+    import aiohttp  # hanya dibutuhkan mode load
+    from loadtest import percentile
+
+    fleet = Fleet(args.devices, prefix=args.prefix)
+    rate = args.rate or len(fleet) / args.interval
+    schedule = constant_schedule(fleet, rate, args.duration)
+    if args.profile == "storm":
+        storm = storm_schedule(fleet, args.duration, args.storm_every,
+                               args.storm_window, args.outage, args.storm_ward)
+        schedule = heapq.merge(schedule, storm, key=lambda e: e[0])
+
+    print(f"Fleet: {len(fleet)} device, profil {args.profile}, target {rate:.0f} req/s "
+          f"selama {args.duration:.0f}s ke {args.url} ({args.concurrency} koneksi)")
+    stats = LoadStats()
+    connector = aiohttp.TCPConnector(limit=args.concurrency, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    def encode(payload):
+        if args.compact:
+            payload = codec.encode_checkin(payload["device_id"], payload["status"],
+                                           payload["message"], payload["seq"])
+        return codec.encode_body(payload, args.format, args.compress)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        elapsed = await drive(session, args.url, fleet, schedule, stats, args.max_inflight, encode)
+
+    latencies = sorted(stats.latencies)
+    service = sorted(stats.service)
+    print(f"\nSelesai dalam {elapsed:.1f}s")
+    print(f"Terkirim {stats.sent}, sukses {len(latencies)}, error {stats.errors}, "
+          f"dropped {stats.dropped}")
+    print(f"Throughput tercapai: {len(latencies) / elapsed if elapsed else 0.0:.1f} req/s "
+          f"(target {rate:.1f})")
+    print(f"Kode respons: {dict(stats.codes)}")
+    print(f"Payload: {args.format}{' ringkas' if args.compact else ''}"
+          f"{' + ' + args.compress if args.compress else ''}, "
+          f"rata-rata {stats.bytes_sent / max(stats.sent, 1):.1f} byte/request")
+    print(f"\n{'latensi (ms)':<22} {'p50':>9} {'p90':>9} {'p99':>9} {'p99.9':>9} {'max':>9}")
+    for label, values in (("dari jadwal", latencies), ("waktu layanan", service)):
+        row = [percentile(values, p) * 1000 for p in (50, 90, 99, 99.9)]
+        row.append((values[-1] if values else 0.0) * 1000)
+        print(f"{label:<22} " + " ".join(f"{v:>9.2f}" for v in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulator / load generator check-in device")
+    parser.add_argument("--mode", choices=("classic", "load"), default="classic")
+    parser.add_argument("--url", default=API_URL, help="URL endpoint check-in")
+    load = parser.add_argument_group("mode load")
+    load.add_argument("--profile", choices=PROFILES, default="constant")
+    load.add_argument("--devices", type=int, default=10000, help="ukuran fleet")
+    load.add_argument("--prefix", default="SIM", help="prefix device_id fleet sintetis")
+    load.add_argument("--interval", type=float, default=10.0,
+                      help="detik antar check-in per device (rate = devices / interval)")
+    load.add_argument("--rate", type=float, help="req/s total, menggantikan --interval")
+    load.add_argument("--duration", type=float, default=60.0, help="detik")
+    load.add_argument("--concurrency", type=int, default=200, help="koneksi keep-alive maksimum")
+    load.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT)
+    load.add_argument("--timeout", type=float, default=10.0, help="timeout per request (detik)")
+    load.add_argument("--format", choices=("json", "msgpack", "cbor"), default="json")
+    load.add_argument("--compact", action="store_true",
+                      help="key pendek, kode status & kamus pesan (codec.py)")
+    load.add_argument("--compress", choices=("gzip", "deflate"), help="Content-Encoding body")
+    load.add_argument("--storm-every", type=float, default=30.0, help="detik antar badai outage")
+    load.add_argument("--storm-window", type=float, default=2.0,
+                      help="rentang detik laporan offline/pulih satu badai")
+    load.add_argument("--outage", type=float, default=10.0, help="lama outage (detik)")
+    load.add_argument("--storm-ward", help="ward yang selalu terkena badai (default: acak)")
+    args = parser.parse_args()
+
+    if args.mode == "classic":
+        run_classic(args.url)
+    else:
+        if args.rate is not None and args.rate <= 0:
+            parser.error("--rate harus > 0")
+        if args.profile == "storm" and args.outage + args.storm_window >= args.storm_every:
+            parser.error("--outage + --storm-window harus < --storm-every (badai tidak boleh tumpang tindih)")
+        asyncio.run(run_load(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Watchdog heartbeat: device yang berhenti check-in (mati listrik, jaringan putus)
+ditandai offline oleh server.
+
+Setiap device yang dipantau punya deadline = last_seen + timeout kategorinya
+(HEARTBEAT_TIMEOUTS, kategori dari device_registry). Deadline disimpan di heap
+dengan paling banyak satu entri per device; check-in hanya memperbarui
+last_seen di dict (O(1), tanpa operasi heap). Saat entri jatuh tempo dan device
+ternyata sudah check-in lagi, entri dijadwalkan ulang ke deadline barunya.
+Satu tick hanya menyentuh entri yang jatuh tempo, bukan seluruh tabel devices.
+
+Kandidat diverifikasi ke tabel devices (device juga bisa check-in lewat worker
+lain, api_async.py, atau antrian ingest), lalu baris device dikunci dan
+diperiksa ulang sebelum ditandai offline, sehingga check-in yang masuk
+bersamaan atau watchdog di proses lain tidak menghasilkan flip ganda.
+Penandaan offline sendiri dilakukan callback milik API (jalur check-in yang
+sama: devices, device_history, ticket OFFLINE, NOTIFY).
+"""
+import heapq
+import threading
+import time
+
+from device_registry import DeviceRegistry
+
+# Timeout heartbeat per kategori (detik)
+HEARTBEAT_TIMEOUTS = {
+    "Patient Monitoring": 120,
+    "Infusion Systems": 120,
+    "Respiratory Equipment": 60,
+    "Environmental Sensors": 300,
+    "Imaging Systems": 600,
+}
+DEFAULT_TIMEOUT = 300
+RETRY_DELAY = 30     # detik sebelum device yang gagal ditandai dicoba lagi
+
+
+class StalenessWatchdog:
+    def __init__(self, timeouts=HEARTBEAT_TIMEOUTS, default_timeout=DEFAULT_TIMEOUT,
+                 registry=None, retry_delay=RETRY_DELAY):
+        self.timeouts = dict(timeouts)
+        self.default_timeout = default_timeout
+        self.registry = registry or DeviceRegistry()
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._last_seen = {}     # device_id -> last_seen terakhir (hanya device yang dipantau)
+        self._timeout = {}       # device_id -> timeout (cache hasil kategorisasi)
+        self._heap = []          # (deadline, device_id)
+        self._queued = set()     # device yang punya entri di heap
+        self.marked_offline = 0
+        self.last_tick_ms = 0.0
+        self.last_expired = 0
+
+    def timeout_for(self, device_id):
+        timeout = self._timeout.get(device_id)
+        if timeout is None:
+            category = self.registry.categorize(device_id)[0]
+            timeout = self._timeout[device_id] = self.timeouts.get(category, self.default_timeout)
+        return timeout
+
+    # --- Pembaruan (dipanggil dari jalur check-in dan event) ---
+    def _schedule(self, device_id, deadline):
+        if device_id not in self._queued:
+            self._queued.add(device_id)
+            heapq.heappush(self._heap, (deadline, device_id))
+
+    def _touch(self, device_id, last_seen, status):
+        if status == "offline":
+            # Device yang sudah offline tidak perlu diawasi; entri heap dibuang saat jatuh tempo
+            self._last_seen.pop(device_id, None)
+            return
+        last_seen = max(last_seen, self._last_seen.get(device_id, last_seen))
+        self._last_seen[device_id] = last_seen
+        self._schedule(device_id, last_seen + self.timeout_for(device_id))
+
+    def touch(self, device_id, last_seen, status=None):
+        with self._lock:
+            self._touch(device_id, last_seen, status)
+
+    def touch_many(self, items):
+        """items: iterable (device_id, last_seen, status)."""
+        with self._lock:
+            for device_id, last_seen, status in items:
+                self._touch(device_id, last_seen, status)
+
+    def load(self, conn):
+        """Gabungkan isi tabel devices (saat start / listener reconnect / berkala)."""
+        cursor = conn.cursor()
+        cursor.execute("SELECT device_id, last_seen, status FROM devices")
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.commit()
+        self.touch_many(rows)
+        return len(rows)
+
+    # --- Tick ---
+    def due(self, now):
+        """Device yang deadline-nya sudah lewat menurut last_seen yang diketahui."""
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, device_id = heapq.heappop(self._heap)
+                self._queued.discard(device_id)
+                last_seen = self._last_seen.get(device_id)
+                if last_seen is None:
+                    continue
+                deadline = last_seen + self.timeout_for(device_id)
+                if deadline > now:
+                    self._schedule(device_id, deadline)
+                else:
+                    expired.append(device_id)
+        return expired
+
+    def _resolve_fresh(self, device_id, row, now):
+        """True jika device tidak perlu ditandai offline (dan jadwalnya sudah diurus)."""
+        with self._lock:
+            if row is None or row[1] == "offline":
+                self._last_seen.pop(device_id, None)
+                return True
+            last_seen = max(row[0], self._last_seen.get(device_id, row[0]))
+            if last_seen + self.timeout_for(device_id) > now:
+                self._touch(device_id, last_seen, row[1])
+                return True
+            return False
+
+    def check(self, conn, mark_offline, now=None):
+        """Satu tick. mark_offline(conn, device_id, last_seen, now) menulis dan commit
+        flip offline; mengembalikan daftar device yang ditandai offline."""
+        started = time.perf_counter()
+        now = int(time.time()) if now is None else now
+        candidates = self.due(now)
+        marked = []
+        if candidates:
+            cursor = conn.cursor()
+            cursor.execute("SELECT device_id, last_seen, status FROM devices WHERE device_id = ANY(%s)",
+                           (candidates,))
+            rows = {row[0]: row[1:] for row in cursor.fetchall()}
+            conn.commit()
+
+            for device_id in candidates:
+                if self._resolve_fresh(device_id, rows.get(device_id), now):
+                    continue
+                try:
+                    # Kunci baris lalu periksa ulang: check-in bisa masuk di antara kedua query
+                    cursor.execute("SELECT last_seen, status FROM devices WHERE device_id = %s FOR UPDATE",
+                                   (device_id,))
+                    row = cursor.fetchone()
+                    if self._resolve_fresh(device_id, row, now):
+                        conn.rollback()
+                        continue
+                    mark_offline(conn, device_id, row[0], now)
+                except Exception as e:
+                    conn.rollback()
+                    print(f"Watchdog gagal menandai {device_id} offline: {e}")
+                    with self._lock:
+                        self._schedule(device_id, now + self.retry_delay)
+                    continue
+                with self._lock:
+                    self._last_seen.pop(device_id, None)
+                    self.marked_offline += 1
+                marked.append(device_id)
+            cursor.close()
+
+        self.last_expired = len(candidates)
+        self.last_tick_ms = (time.perf_counter() - started) * 1000
+        return marked
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tracked": len(self._last_seen),
+                "heap": len(self._heap),
+                "marked_offline": self.marked_offline,
+                "last_expired": self.last_expired,
+                "last_tick_ms": round(self.last_tick_ms, 2),
+            }
@@ -0,0 +1,74 @@
+"""
+Span status per device (time-weighted) dalam SQL.
+
+Setiap baris device_history berlaku sejak timestamp-nya sampai baris berikutnya
+milik device yang sama; baris terakhir sebelum jendela memberi status awal.
+SPANS_SQL adalah query-nya (parameter psycopg2), dipakai dashboard lewat
+uptime.SPANS_SQL. Function SQL device_status_spans() dibangkitkan dari query
+yang sama (SPANS_FUNCTION_DDL): dibuat oleh rollup.ensure_rollup_schema dan
+disalin verbatim ke database_schema.sql (dicek tests/test_schema.py).
+
+Modul ini sengaja tanpa dependensi (tanpa NumPy/pandas) agar bisa dipakai API.
+"""
+
+# Span status per device dalam [%(start)s, %(end)s): baris terakhir sebelum jendela
+# ikut diambil (status saat jendela dimulai), lalu LEAD memberi akhir setiap span.
+SPANS_SQL = """
+    WITH runs AS (
+        SELECT prev.device_id, prev.id, prev.timestamp, prev.status
+        FROM devices d
+        CROSS JOIN LATERAL (
+            SELECT h.device_id, h.id, h.timestamp, h.status
+            FROM device_history h
+            WHERE h.device_id = d.device_id AND h.timestamp < %(start)s
+            ORDER BY h.timestamp DESC, h.id DESC
+            LIMIT 1
+        ) prev
+        WHERE %(device_id)s::TEXT IS NULL OR d.device_id = %(device_id)s
+        UNION ALL
+        SELECT h.device_id, h.id, h.timestamp, h.status
+        FROM device_history h
+        WHERE h.timestamp >= %(start)s AND h.timestamp < %(end)s
+          AND (%(device_id)s::TEXT IS NULL OR h.device_id = %(device_id)s)
+    ),
+    spans AS (
+        SELECT device_id, status,
+               GREATEST(timestamp, %(start)s) AS span_start,
+               LEAD(timestamp, 1, %(end)s) OVER (PARTITION BY device_id ORDER BY timestamp, id) AS span_end
+        FROM runs
+    )
+    SELECT device_id, status, span_start, span_end
+    FROM spans
+    WHERE span_end > span_start
+"""
+
+# Parameter query -> parameter function device_status_spans(p_from, p_to, p_device_id)
+SPANS_FUNCTION_PARAMS = {
+    "%(start)s": "p_from",
+    "%(end)s": "p_to",
+    "%(device_id)s::TEXT": "p_device_id",
+    "%(device_id)s": "p_device_id",
+}
+
+
+def spans_function_ddl(query=SPANS_SQL):
+    """DDL function SQL device_status_spans() dengan badan = SPANS_SQL."""
+    body = query
+    for placeholder, param in SPANS_FUNCTION_PARAMS.items():
+        body = body.replace(placeholder, param)
+    return (
+        "CREATE OR REPLACE FUNCTION device_status_spans(\n"
+        "    p_from BIGINT,\n"
+        "    p_to BIGINT,\n"
+        "    p_device_id TEXT DEFAULT NULL\n"
+        ")\n"
+        "RETURNS TABLE (\n"
+        "    device_id TEXT,\n"
+        "    status TEXT,\n"
+        "    span_start BIGINT,\n"
+        "    span_end BIGINT\n"
+        f") AS $${body}$$ LANGUAGE sql STABLE;"
+    )
+
+
+SPANS_FUNCTION_DDL = spans_function_ddl()
@@ -0,0 +1,157 @@
+"""
+Perhitungan uptime/availability berbasis durasi (time-weighted).
+
+Setiap baris device_history berlaku sejak timestamp-nya sampai baris berikutnya
+milik device yang sama (atau sampai akhir jendela). Uptime = detik online /
+total detik dalam jendela, bukan jumlah baris online / jumlah baris, sehingga
+tetap benar untuk interval check-in yang tidak teratur dan history mode "changes".
+
+Semua fungsi di sini vektorisasi NumPy/pandas tanpa loop per baris:
+- spans_from_history      : baris history -> span [mulai, selesai) terpotong ke jendela
+- status_seconds          : detik per status per device / kategori untuk satu jendela
+- status_seconds_by_shift : sama, dipecah per shift jaga rumah sakit
+- availability            : tambahkan kolom total & uptime_pct
+
+SPANS_SQL (dari status_spans.py) menghasilkan span yang sama langsung di
+PostgreSQL (window function LEAD) sehingga dashboard tidak perlu menarik baris
+di luar jendela.
+"""
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from status_spans import SPANS_SQL
+
+LOCAL_TZ = ZoneInfo("Asia/Jakarta")
+STATUSES = ("online", "error", "offline")
+
+# Shift jaga: (nama, jam mulai, jam selesai) waktu lokal; selesai < mulai berarti lewat tengah malam
+SHIFTS = (
+    ("Pagi", 7, 14),
+    ("Siang", 14, 21),
+    ("Malam", 21, 7),
+)
+
+
+def window_bounds(hours, now=None, step=60):
+    """Jendela [start, end) N jam terakhir, dibulatkan ke `step` detik.
+
+    Pembulatan membuat jendela yang sama dipakai ulang antar rerun, sehingga
+    hasil bisa di-cache per jendela.
+    """
+    now_ts = int((now or datetime.now(LOCAL_TZ)).timestamp())
+    end = now_ts - now_ts % step
+    return end - int(hours * 3600), end
+
+
+def spans_from_history(history_df, start, end):
+    """Mengubah baris history (device_id, timestamp, status) menjadi span terpotong ke [start, end).
+
+    Baris terakhir sebelum `start` per device sebaiknya ikut disertakan agar status
+    di awal jendela diketahui; baris setelah `end` diabaikan.
+    """
+    if history_df.empty:
+        return pd.DataFrame({"device_id": [], "status": [], "span_start": [], "span_end": []})
+
+    ordered = history_df.sort_values(["device_id", "timestamp"], kind="stable")
+    device = ordered["device_id"].to_numpy()
+    ts = ordered["timestamp"].to_numpy(dtype=np.int64)
+
+    next_ts = np.empty_like(ts)
+    next_ts[:-1] = ts[1:]
+    last_of_device = np.ones(len(ts), dtype=bool)
+    last_of_device[:-1] = device[1:] != device[:-1]
+    next_ts[last_of_device] = end
+
+    span_start = np.maximum(ts, start)
+    span_end = np.minimum(next_ts, end)
+    keep = span_end > span_start
+    return pd.DataFrame({
+        "device_id": device[keep],
+        "status": ordered["status"].to_numpy()[keep],
+        "span_start": span_start[keep],
+        "span_end": span_end[keep],
+    })
+
+
+def _group_keys(spans, by):
+    """`by` boleh nama kolom, atau fungsi device_id -> label (mis. kategori)."""
+    if callable(by):
+        labels = {device_id: by(device_id) for device_id in spans["device_id"].unique()}
+        return spans["device_id"].map(labels).rename("group")
+    return spans[by]
+
+
+def status_seconds(spans, start, end, by="device_id"):
+    """Detik per status untuk jendela [start, end), dikelompokkan per `by`.
+
+    Mengembalikan DataFrame (index = kelompok) dengan kolom online/error/offline.
+    """
+    overlap = (np.minimum(spans["span_end"].to_numpy(), end)
+               - np.maximum(spans["span_start"].to_numpy(), start)).clip(min=0)
+    table = (pd.DataFrame({"key": _group_keys(spans, by).to_numpy(),
+                           "status": spans["status"].to_numpy(),
+                           "seconds": overlap})
+             .groupby(["key", "status"])["seconds"].sum()
+             .unstack(fill_value=0))
+    return table.reindex(columns=list(STATUSES), fill_value=0).rename_axis(index=None, columns=None)
+
+
+def shift_windows(start, end, shifts=SHIFTS, tz=LOCAL_TZ):
+    """Daftar jendela shift yang beririsan dengan [start, end): (shift, tanggal, mulai, selesai)."""
+    rows = []
+    day = datetime.fromtimestamp(start, tz).date() - timedelta(days=1)
+    last_day = datetime.fromtimestamp(end, tz).date()
+    while day <= last_day:
+        midnight = datetime(day.year, day.month, day.day, tzinfo=tz)
+        for name, begin_hour, end_hour in shifts:
+            lo = midnight + timedelta(hours=begin_hour)
+            hi = midnight + timedelta(days=1 if end_hour <= begin_hour else 0, hours=end_hour)
+            lo_ts, hi_ts = max(int(lo.timestamp()), start), min(int(hi.timestamp()), end)
+            if hi_ts > lo_ts:
+                rows.append((name, day, lo_ts, hi_ts))
+        day += timedelta(days=1)
+    return pd.DataFrame(rows, columns=["shift", "shift_date", "window_start", "window_end"])
+
+
+def status_seconds_by_shift(spans, start, end, by="device_id", shifts=SHIFTS):
+    """Detik per status per shift untuk jendela [start, end).
+
+    Irisan setiap span dengan setiap jendela shift dihitung sekaligus sebagai
+    matriks (span x jendela), lalu dijumlahkan per shift dengan perkalian matriks.
+    Mengembalikan DataFrame berindeks (kelompok, shift) dengan kolom per status.
+    """
+    windows = shift_windows(start, end, shifts)
+    shift_names = [name for name, _, _ in shifts]
+    if spans.empty or windows.empty:
+        index = pd.MultiIndex.from_tuples([], names=["key", "shift"])
+        return pd.DataFrame(columns=list(STATUSES), index=index, dtype=np.int64)
+
+    span_start = spans["span_start"].to_numpy()[:, None]
+    span_end = spans["span_end"].to_numpy()[:, None]
+    overlap = (np.minimum(span_end, windows["window_end"].to_numpy()[None, :])
+               - np.maximum(span_start, windows["window_start"].to_numpy()[None, :])).clip(min=0)
+
+    one_hot = (windows["shift"].to_numpy()[:, None] == np.array(shift_names)[None, :]).astype(np.int64)
+    per_shift = pd.DataFrame(overlap @ one_hot, columns=shift_names)
+    per_shift["key"] = _group_keys(spans, by).to_numpy()
+    per_shift["status"] = spans["status"].to_numpy()
+
+    table = (per_shift.melt(id_vars=["key", "status"], var_name="shift", value_name="seconds")
+             .groupby(["key", "shift", "status"])["seconds"].sum()
+             .unstack(fill_value=0))
+    table = table.reindex(columns=list(STATUSES), fill_value=0).rename_axis(columns=None)
+    return table.reindex(pd.MultiIndex.from_product([table.index.levels[0], shift_names],
+                                                    names=["key", "shift"]), fill_value=0)
+
+
+def availability(table):
+    """Menambahkan kolom total (detik) dan uptime_pct ke hasil status_seconds*."""
+    result = table.copy()
+    result["total"] = result[list(STATUSES)].sum(axis=1)
+    online = result["online"].to_numpy(dtype=float)
+    total = result["total"].to_numpy(dtype=float)
+    result["uptime_pct"] = np.divide(online * 100, total, out=np.zeros_like(total), where=total > 0).round(2)
+    return result
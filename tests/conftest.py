@@ -0,0 +1,74 @@
+"""
+Fixture bersama untuk test.
+
+Modul di src/ saling import secara datar (mis. `import ingest`), jadi src/
+ditambahkan ke sys.path. Test yang butuh PostgreSQL memakai database sementara
+yang dibuat dari DSN di variabel lingkungan IOT_TEST_DSN, mis.
+    IOT_TEST_DSN="host=localhost user=postgres dbname=postgres" python -m pytest -q
+dan dilewati (skip) jika variabel itu tidak di-set.
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+
+@pytest.fixture(scope="session")
+def pg_conn_kwargs():
+    """kwargs psycopg2.connect() untuk database test baru (dihapus di akhir sesi)."""
+    dsn = os.environ.get("IOT_TEST_DSN")
+    if not dsn:
+        pytest.skip("IOT_TEST_DSN tidak di-set")
+    psycopg2 = pytest.importorskip("psycopg2")
+    from psycopg2.extensions import parse_dsn
+
+    name = f"iot_test_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(dsn)
+    admin.autocommit = True
+    admin.cursor().execute(f"CREATE DATABASE {name}")
+    kwargs = parse_dsn(dsn)
+    kwargs.pop("dbname", None)
+    kwargs["database"] = name
+    try:
+        yield kwargs
+    finally:
+        admin.cursor().execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+        admin.close()
+
+
+@pytest.fixture(scope="session")
+def api(pg_conn_kwargs):
+    """Modul api.py yang diarahkan ke database test, dengan skema dari init_db()."""
+    api = pytest.importorskip("api")
+    from db_pool import ConnectionPool
+
+    pool = ConnectionPool(minconn=1, maxconn=10, timeout=5,
+                          options="-c timezone=Asia/Jakarta", **pg_conn_kwargs)
+    api.db_pool = api.export_pool = api.last_seen_writer.pool = api.ingest_queue.pool = pool
+    api.PG_CONN_KWARGS.clear()
+    api.PG_CONN_KWARGS.update(pg_conn_kwargs)
+    api.init_db()
+    yield api
+    api.last_seen_writer.stop()
+    pool.closeall()
+
+
+@pytest.fixture
+def async_client(api, pg_conn_kwargs, monkeypatch):
+    """TestClient Starlette untuk api_async.py pada database test yang sama dengan `api`."""
+    api_async = pytest.importorskip("api_async")
+    testclient = pytest.importorskip("starlette.testclient")
+
+    monkeypatch.setattr(api_async, "PG_HOST", pg_conn_kwargs.get("host", "localhost"))
+    monkeypatch.setattr(api_async, "PG_PORT", int(pg_conn_kwargs.get("port", 5432)))
+    monkeypatch.setattr(api_async, "PG_USER", pg_conn_kwargs.get("user"))
+    monkeypatch.setattr(api_async, "PG_PASSWORD", pg_conn_kwargs.get("password"))
+    monkeypatch.setattr(api_async, "PG_DATABASE", pg_conn_kwargs["database"])
+    monkeypatch.setattr(api_async, "POOL_MIN_SIZE", 1)
+    # Tanpa listener: keputusan ticket hanya dari check-in test (deterministik)
+    monkeypatch.setattr(api_async, "TICKET_EVENTS_ENABLED", False)
+    with testclient.TestClient(api_async.app) as client:
+        yield client
@@ -0,0 +1,121 @@
+"""Paritas api.py (Flask) dan api_async.py (ASGI) pada database yang sama."""
+import pytest
+
+# (detik sejak awal, status): pantulan online <-> error sampai flapping, lalu online tenang
+BOUNCE = [(0, "online"), (10, "error"), (20, "online"), (30, "error"), (40, "online"),
+          (50, "error"), (60, "online"), (70, "error"), (80, "online"), (90, "error"),
+          (100, "error"), (200, "online"), (600, "online")]
+# Debounce menahan pantulan awal; ticket baru dibuka saat flapping dan ditutup setelah FLAP_QUIET
+EXPECTED_TICKET = [False] * 7 + [True, False, True, True, False, False]
+
+
+@pytest.fixture
+def clock(api, monkeypatch):
+    now = [api.local_timestamp() + 50_000]
+    monkeypatch.setattr(api, "local_timestamp", lambda: now[0])
+    api_async = pytest.importorskip("api_async")
+    monkeypatch.setattr(api_async, "local_timestamp", lambda: now[0])
+    return now
+
+
+def run_bounce(client, clock, device_id):
+    start, responses = clock[0], []
+    for offset, status in BOUNCE:
+        clock[0] = start + offset
+        response = client.post("/api/v1/checkin", json={
+            "device_id": device_id, "status": status, "message": f"{status} state"})
+        assert response.status_code == 200
+        # Flask: response.json (property); Starlette/httpx: response.json()
+        responses.append(response.json() if callable(response.json) else response.json)
+    return responses
+
+
+def tickets_of(api, device_id):
+    with api.db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT is_active, flap_count FROM tickets WHERE device_id = %s",
+                       (device_id,))
+        rows = cursor.fetchall()
+        conn.commit()
+    return rows
+
+
+def test_flask_and_async_open_the_same_tickets_for_a_bounce(api, async_client, clock):
+    flask = run_bounce(api.app.test_client(), clock, "BOUNCE-FLASK-1")
+    asgi = run_bounce(async_client, clock, "BOUNCE-ASYNC-1")
+
+    assert ["ticket_created" in r for r in flask] == EXPECTED_TICKET
+    assert ["ticket_created" in r for r in asgi] == EXPECTED_TICKET
+    for device_id in ("BOUNCE-FLASK-1", "BOUNCE-ASYNC-1"):
+        (is_active, flap_count), = tickets_of(api, device_id)   # satu ticket untuk semua pantulan
+        assert is_active is False and flap_count >= 4
+
+
+def history_count(api, device_id):
+    with api.db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM device_history WHERE device_id = %s", (device_id,))
+        count = cursor.fetchone()[0]
+        conn.commit()
+    return count
+
+
+def test_async_retries_are_rejected_by_the_database_guards(api, async_client, monkeypatch):
+    from dedup import DedupWindow
+    api_async = pytest.importorskip("api_async")
+    body = {"device_id": "ASYNC-SEQ-1", "status": "online", "message": "System OK", "seq": 5}
+    assert async_client.post("/api/v1/checkin", json=body).status_code == 200
+
+    # Retry yang tiba di worker lain (jendela memori kosong): ditolak oleh devices.last_seq
+    monkeypatch.setattr(api_async, "dedup_window", DedupWindow())
+    response = async_client.post("/api/v1/checkin", json=body)
+    assert response.status_code == 200 and response.json()["duplicate"] is True
+    assert response.json()["last_seq"] == 5
+    monkeypatch.setattr(api_async, "dedup_window", DedupWindow())
+    assert async_client.post("/api/v1/checkin", json=dict(body, seq=4)).status_code == 409
+
+    # Seq yang sudah diterapkan server Flask juga duplikat bagi server async
+    assert api.app.test_client().post("/api/v1/checkin", json=dict(body, seq=6)).status_code == 200
+    response = async_client.post("/api/v1/checkin", json=dict(body, seq=6))
+    assert response.json()["duplicate"] is True
+
+    # Kunci idempotensi: baris checkin_idempotency yang sama
+    keyed = {"device_id": "ASYNC-SEQ-1", "status": "online", "message": "System OK"}
+    headers = {"Idempotency-Key": "retry-1"}
+    assert async_client.post("/api/v1/checkin", json=keyed, headers=headers).status_code == 200
+    monkeypatch.setattr(api_async, "dedup_window", DedupWindow())
+    response = async_client.post("/api/v1/checkin", json=keyed, headers=headers)
+    assert response.status_code == 200 and response.json()["duplicate"] is True
+
+    assert history_count(api, "ASYNC-SEQ-1") == 3
+
+
+@pytest.mark.parametrize("fmt,encoding", [("msgpack", "gzip"), ("cbor", "deflate"), ("json", "gzip")])
+def test_async_accepts_compact_binary_payloads(async_client, fmt, encoding):
+    pytest.importorskip({"msgpack": "msgpack", "cbor": "cbor2", "json": "json"}[fmt])
+    import codec
+    device_id = f"ASYNC-CODEC-{fmt}"
+    body, headers = codec.encode_body(codec.encode_checkin(device_id, "online", "System OK", seq=1),
+                                      fmt, encoding)
+    response = async_client.post("/api/v1/checkin", content=body, headers=headers)
+    assert response.status_code == 200 and response.json()["device"] == device_id
+
+
+def test_non_text_message_is_a_bad_request_in_both_apps(api, async_client):
+    import codec
+    body, headers = codec.encode_body({"d": "CBOR-MAP-1", "s": 0, "m": {"text": "System OK"}}, "cbor")
+    assert api.app.test_client().post("/api/v1/checkin", data=body, headers=headers).status_code == 400
+    assert async_client.post("/api/v1/checkin", content=body, headers=headers).status_code == 400
+
+
+def test_async_tickets_in_the_same_second_get_distinct_ids(async_client, clock):
+    devices = ["ASYNC-PUMP-000001-ICU", "ASYNC-PUMP-000002-ICU"]
+    start, created = clock[0], []
+    for offset in (0, 40):
+        clock[0] = start + offset
+        for device_id in devices:
+            body = async_client.post("/api/v1/checkin", json={
+                "device_id": device_id, "status": "error", "message": "Sensor Error 502"}).json()
+            if "ticket_created" in body:
+                created.append(body["ticket_created"])
+    assert len(created) == 2 and created[0] != created[1]
@@ -0,0 +1,27 @@
+from dedup import DedupWindow
+
+
+def history_count(api, device_id):
+    with api.db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM device_history WHERE device_id = %s", (device_id,))
+        count = cursor.fetchone()[0]
+        conn.commit()
+    return count
+
+
+def test_fast_path_retry_on_other_worker_is_not_written_twice(api, monkeypatch):
+    client = api.app.test_client()
+    body = {"device_id": "FAST-SEQ-1", "status": "online", "message": "System OK", "seq": 10}
+    assert client.post("/api/v1/checkin", json=body).status_code == 200
+    body["seq"] = 11
+    assert client.post("/api/v1/checkin", json=body).status_code == 200   # jalur cepat
+    assert history_count(api, "FAST-SEQ-1") == 2
+
+    # Retry yang sama tiba di worker lain (atau setelah entri LRU terbuang)
+    monkeypatch.setattr(api, "dedup_window", DedupWindow())
+    response = client.post("/api/v1/checkin", json=body)
+    assert response.status_code == 200 and response.get_json()["duplicate"] is True
+    body["seq"] = 9
+    assert client.post("/api/v1/checkin", json=body).status_code == 409
+    assert history_count(api, "FAST-SEQ-1") == 2
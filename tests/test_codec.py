@@ -0,0 +1,20 @@
+import pytest
+
+import codec
+
+
+def test_short_form_is_expanded():
+    item = codec.normalize_checkin({"d": "BED-1", "s": 1, "m": 2, "q": 7})
+    assert item == {"device_id": "BED-1", "status": "error", "message": "Sensor Error 502", "seq": 7}
+
+
+@pytest.mark.parametrize("message", [{"text": "x"}, b"System OK", ["System OK"], 1.5])
+def test_non_text_message_is_rejected(message):
+    with pytest.raises(codec.PayloadError) as e:
+        codec.normalize_checkin({"device_id": "BED-1", "status": "online", "message": message})
+    assert e.value.status == 400
+
+
+def test_non_text_device_id_is_rejected():
+    with pytest.raises(codec.PayloadError):
+        codec.normalize_checkin({"d": {"id": 1}, "s": 0})
@@ -0,0 +1,71 @@
+import pandas as pd
+
+from delta_snapshot import DeltaSnapshot
+
+
+def device_snapshot(api, prefix):
+    """Snapshot devices dengan query delta seperti live_monitor.fetch_devices.
+
+    Dibatasi ke device test ini agar check-in test lain tidak menggeser high-water mark.
+    """
+    def fetch(since):
+        with api.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            if since is None:
+                cursor.execute("SELECT device_id, status, last_seen, row_updated_at FROM devices "
+                               "WHERE device_id LIKE %s", (prefix + "%",))
+            else:
+                cursor.execute("SELECT device_id, status, last_seen, row_updated_at FROM devices "
+                               "WHERE device_id LIKE %s AND row_updated_at > %s", (prefix + "%", since))
+            df = pd.DataFrame(cursor.fetchall(), columns=[c.name for c in cursor.description])
+            conn.commit()
+        return df
+    return DeltaSnapshot(fetch, key='device_id', hwm_column='row_updated_at',
+                         overlap=0, min_interval=0)
+
+
+def status_of(df, device_id):
+    return df.set_index('device_id').loc[device_id, 'status']
+
+
+def test_watchdog_flip_is_visible_to_delta_fetch(api, monkeypatch):
+    t0 = api.local_timestamp()
+    monkeypatch.setattr(api, "local_timestamp", lambda: t0)
+    client = api.app.test_client()
+    assert client.post("/api/v1/checkin", json={"device_id": "WD-DELTA-1", "status": "online",
+                                                "message": "System OK"}).status_code == 200
+
+    snapshot = device_snapshot(api, "WD-DELTA-")
+    assert status_of(snapshot.get(), "WD-DELTA-1") == "online"
+
+    # Watchdog: last_seen tidak berubah, hanya status (dan row_updated_at)
+    with api.db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT last_seen FROM devices WHERE device_id = %s FOR UPDATE", ("WD-DELTA-1",))
+        last_seen = cursor.fetchone()[0]
+        api.mark_device_offline(conn, "WD-DELTA-1", last_seen, t0 + 200)
+
+    df = snapshot.get()
+    assert snapshot.delta_loads == 1 and snapshot.last_delta_rows >= 1
+    assert status_of(df, "WD-DELTA-1") == "offline"
+    assert df.set_index('device_id').loc["WD-DELTA-1", 'last_seen'] == t0
+
+
+def test_idle_snapshot_is_not_queried_until_marked_stale():
+    calls = []
+
+    def fetch(since):
+        calls.append(since)
+        return pd.DataFrame({"device_id": ["A"], "row_updated_at": [100 + len(calls)]})
+
+    snapshot = DeltaSnapshot(fetch, key='device_id', hwm_column='row_updated_at',
+                             overlap=0, min_interval=0)
+    for _ in range(5):
+        snapshot.get(max_age=60)          # listener tersambung, tidak ada event
+    assert calls == [None]
+
+    snapshot.mark_stale()                 # event dari listener
+    snapshot.get(max_age=60)
+    assert calls == [None, 101] and snapshot.delta_loads == 1
+    snapshot.get()                        # tanpa max_age: tetap per min_interval
+    assert len(calls) == 3
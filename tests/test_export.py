@@ -0,0 +1,24 @@
+from db_pool import ConnectionPool
+
+
+def test_export_streams_from_the_export_pool(api, pg_conn_kwargs, monkeypatch):
+    pool = ConnectionPool(minconn=0, maxconn=1, timeout=0.2, **pg_conn_kwargs)
+    monkeypatch.setattr(api, "export_pool", pool)
+    client = api.app.test_client()
+    assert client.post("/api/v1/checkin", json={"device_id": "EXPORT-1", "status": "online",
+                                                "message": "System OK"}).status_code == 200
+
+    for _ in range(2):   # koneksi yang sama dipakai ulang, bukan connect per request
+        response = client.get("/api/v1/export/history?device_id=EXPORT-1")
+        assert response.status_code == 200
+        assert "EXPORT-1" in response.get_data(as_text=True)
+        response.close()
+        assert pool.stats() == {"size": 1, "idle": 1, "in_use": 0, "waiting": 0, "maxconn": 1}
+
+    # Pool ekspor penuh: 503 sebelum stream dimulai
+    held = pool.getconn()
+    try:
+        assert client.get("/api/v1/export/history").status_code == 503
+    finally:
+        pool.putconn(held)
+    pool.closeall()
@@ -0,0 +1,89 @@
+from contextlib import contextmanager
+
+import ingest
+from flap_detector import FlapDetector
+from ingest_queue import IngestQueue
+
+
+class FakeConn:
+    def commit(self):
+        pass
+
+
+class FakePool:
+    @contextmanager
+    def connection(self):
+        yield FakeConn()
+
+
+def bounce(device_id, start, count, step=10):
+    """Check-in bergantian error/online setiap `step` detik."""
+    return [{"device_id": device_id, "status": "error" if n % 2 == 0 else "online",
+             "message": "", "last_seen": start + n * step} for n in range(count)]
+
+
+def test_uncommitted_transaction_leaves_state_untouched():
+    detector = FlapDetector(open_debounce=30)
+    flaps = detector.begin()
+    for item in bounce("BED-1", 1000, 8):
+        flaps.observe(item["device_id"], item["status"], item["last_seen"])
+    # Transaksi database gagal: flaps tidak di-commit
+    assert detector.stats()["tracked"] == 0
+    assert not detector.pending("BED-1")
+
+
+def test_failed_batch_then_per_item_retry_counts_each_checkin_once(monkeypatch):
+    detector = FlapDetector(open_debounce=30, flap_high=100)
+
+    def write_checkins(conn, items, now, flaps=None, **kwargs):
+        for item in items:
+            flaps.observe(item["device_id"], item["status"], item["last_seen"])
+        if any(item["device_id"] == "POISON" for item in items):
+            raise ValueError("item buruk")
+        return {}, []
+
+    monkeypatch.setattr(ingest, "write_checkins", write_checkins)
+    queue = IngestQueue(FakePool(), now_fn=lambda: 2000, flap_detector=detector)
+    batch = bounce("BED-1", 1000, 7) + [{"device_id": "POISON", "status": "error",
+                                         "message": "", "last_seen": 1070}]
+    queue._flush(batch)
+
+    assert queue.metrics()["written"] == 7
+    assert queue.metrics()["dropped"] == 1
+    # 7 check-in bergantian = 6 perpindahan, bukan 12 (batch gagal + ulang per item)
+    assert len(detector._devices["BED-1"].flips) == 6
+    assert detector._devices["BED-1"].since == 1060
+    assert "POISON" not in detector._devices
+
+
+def test_ticket_resolves_from_transaction_without_listener():
+    detector = FlapDetector(open_debounce=30, resolve_debounce=60)
+    flaps = detector.begin()
+    decision = flaps.observe("PUMP-1", "offline", 1000, force=True)
+    assert decision.action == "ticket"
+    flaps.ticket_opened("PUMP-1", "TKT-1000-MP-1")
+    flaps.commit()
+
+    flaps = detector.begin()
+    assert flaps.observe("PUMP-1", "online", 1010).action is None
+    flaps.commit()
+    flaps = detector.begin()
+    assert flaps.observe("PUMP-1", "online", 1070).action == "resolve"
+    flaps.ticket_resolved("PUMP-1")
+    flaps.commit()
+
+    # Setelah ditutup tidak ada lagi UPDATE resolve per heartbeat
+    flaps = detector.begin()
+    assert flaps.observe("PUMP-1", "online", 1200).action is None
+    assert not detector.pending("PUMP-1")
+
+
+def test_unknown_ticket_state_is_resolved_by_device():
+    # Proses baru tanpa listener/reload: ticket aktif dari proses lain tidak diketahui
+    detector = FlapDetector(resolve_debounce=60)
+    flaps = detector.begin()
+    assert flaps.observe("VENT-1", "online", 1000).action is None
+    flaps.commit()
+    assert detector.pending("VENT-1")
+    flaps = detector.begin()
+    assert flaps.observe("VENT-1", "online", 1060).action == "resolve"
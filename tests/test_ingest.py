@@ -0,0 +1,94 @@
+import ingest
+
+
+def checkin(device_id, status, last_seen, seq=None, key=None):
+    return {"device_id": device_id, "status": status, "message": "", "last_seen": last_seen,
+            "seq": seq, "idempotency_key": key}
+
+
+def device_row(conn, device_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT last_seq, status FROM devices WHERE device_id = %s", (device_id,))
+    row = cursor.fetchone()
+    cursor.execute("SELECT COUNT(*) FROM device_history WHERE device_id = %s", (device_id,))
+    history = cursor.fetchone()[0]
+    conn.commit()
+    return row, history
+
+
+def test_late_queued_item_does_not_move_last_seq_backwards(api):
+    with api.db_pool.connection() as conn:
+        ingest.write_checkins(conn, [checkin("Q-SEQ-1", "online", 1000, seq=7)], 1000)
+        conn.commit()
+        late = checkin("Q-SEQ-1", "error", 1005, seq=5)
+        ingest.write_checkins(conn, [late], 1005)
+        conn.commit()
+        assert late["rejected"] == "stale"
+        assert device_row(conn, "Q-SEQ-1") == ((7, "online"), 1)
+
+        # Dalam satu batch: seq yang sama diulang dan seq mundur ikut dibuang
+        batch = [checkin("Q-SEQ-1", "online", 1010, seq=8), checkin("Q-SEQ-1", "online", 1010, seq=8),
+                 checkin("Q-SEQ-1", "error", 1010, seq=6)]
+        ingest.write_checkins(conn, batch, 1010)
+        conn.commit()
+        assert [i.get("rejected") for i in batch] == [None, "duplicate", "stale"]
+        assert device_row(conn, "Q-SEQ-1") == ((8, "online"), 2)
+
+
+def test_idempotency_key_is_written_once(api):
+    with api.db_pool.connection() as conn:
+        first = checkin("Q-KEY-1", "error", 2000, key="retry-1")
+        ingest.write_checkins(conn, [first], 2000)
+        conn.commit()
+        again = checkin("Q-KEY-1", "error", 2003, key="retry-1")
+        ingest.write_checkins(conn, [again], 2003)
+        conn.commit()
+        assert "rejected" not in first and again["rejected"] == "duplicate"
+        assert device_row(conn, "Q-KEY-1")[1] == 1
+
+
+def test_batch_endpoint_forwards_seq_and_key(api, monkeypatch):
+    client = api.app.test_client()
+    body = [{"device_id": "B-SEQ-1", "status": "online", "seq": 3, "idempotency_key": "k-3"}]
+    assert client.post("/api/v1/checkin/batch", json=body).get_json()["duplicates"] == 0
+    monkeypatch.setattr(api, "dedup_window", type(api.dedup_window)())   # retry ke worker lain
+    response = client.post("/api/v1/checkin/batch", json=body).get_json()
+    assert response["duplicates"] == 1
+    assert response["results"][0]["duplicate"] is True
+    with api.db_pool.connection() as conn:
+        assert device_row(conn, "B-SEQ-1") == ((3, "online"), 1)
+
+
+def test_change_only_batches_extend_the_latest_run_per_device(api):
+    with api.db_pool.connection() as conn:
+        for now, status in ((3000, "online"), (3010, "error"), (3020, "error"), (3030, "error")):
+            batch = [checkin("C-RUN-1", status, now), checkin("C-RUN-2", "online", now)]
+            ingest.write_checkins(conn, batch, now, history_mode="changes")
+            conn.commit()
+        cursor = conn.cursor()
+        cursor.execute("SELECT device_id, timestamp, status, last_seen, heartbeat_count "
+                       "FROM device_history WHERE device_id LIKE 'C-RUN-%%' "
+                       "ORDER BY device_id, timestamp")
+        assert cursor.fetchall() == [("C-RUN-1", 3000, "online", 3000, 1),
+                                     ("C-RUN-1", 3010, "error", 3030, 3),
+                                     ("C-RUN-2", 3000, "online", 3030, 4)]
+        conn.commit()
+
+
+def test_rejected_batch_retry_keeps_the_device_cache_entry(api, monkeypatch):
+    from device_cache import DeviceState, DeviceStateCache
+
+    monkeypatch.setattr(api, "device_cache", DeviceStateCache(ttl=60))
+    client = api.app.test_client()
+    body = [{"device_id": "B-CACHE-1", "status": "online", "seq": 1},
+            {"device_id": "B-CACHE-2", "status": "online", "seq": 1}]
+    client.post("/api/v1/checkin/batch", json=body)
+    for device_id in ("B-CACHE-1", "B-CACHE-2"):
+        api.device_cache.set(device_id, DeviceState("online", "", None, None))
+
+    monkeypatch.setattr(api, "dedup_window", type(api.dedup_window)())   # retry ke worker lain
+    body[1]["seq"] = 2
+    response = client.post("/api/v1/checkin/batch", json=body).get_json()
+    assert response["duplicates"] == 1
+    assert api.device_cache.get("B-CACHE-1") is not None    # duplikat: tidak ada yang ditulis
+    assert api.device_cache.get("B-CACHE-2") is None
@@ -0,0 +1,97 @@
+from contextlib import contextmanager
+
+import psycopg2
+
+import ingest
+from db_pool import PoolTimeout
+from dedup import DedupWindow
+from ingest_queue import IngestQueue
+
+
+class FakeConn:
+    def commit(self):
+        pass
+
+
+class FakePool:
+    @contextmanager
+    def connection(self):
+        yield FakeConn()
+
+
+def checkins(count, prefix="BED"):
+    return [{"device_id": f"{prefix}-{n}", "status": "online", "message": "",
+             "last_seen": 1000 + n, "seq": n} for n in range(count)]
+
+
+def test_outage_requeues_the_batch_instead_of_dropping_it(monkeypatch):
+    calls = []
+
+    def write_checkins(conn, items, now, **kwargs):
+        calls.append(len(items))
+        raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    monkeypatch.setattr(ingest, "write_checkins", write_checkins)
+    dropped = []
+    queue = IngestQueue(FakePool(), now_fn=lambda: 2000, on_dropped=dropped.extend,
+                        retry_initial=0.5, retry_max=4)
+    queue._items.append({"device_id": "LATE", "status": "online", "message": "", "last_seen": 1100})
+    batch = checkins(3)
+    queue._flush(batch)
+
+    # Satu percobaan untuk seluruh batch, tanpa ulang per item yang menunggu timeout pool
+    assert calls == [3]
+    assert not dropped
+    assert list(queue._items)[:3] == batch
+    assert queue._items[3]["device_id"] == "LATE"
+    metrics = queue.metrics()
+    assert metrics["dropped"] == 0 and metrics["retries"] == 1 and metrics["depth"] == 4
+
+    # Backoff berlipat sampai retry_max
+    for _ in range(5):
+        queue._flush([queue._items.popleft()])
+    assert queue._retry_delay == 4
+
+
+def test_data_error_splits_the_batch_and_reports_only_the_bad_item(monkeypatch):
+    def write_checkins(conn, items, now, **kwargs):
+        if any(i["device_id"] == "POISON" for i in items):
+            raise psycopg2.DataError("value too long")
+        return {}, []
+
+    monkeypatch.setattr(ingest, "write_checkins", write_checkins)
+    dedup = DedupWindow()
+    batch = checkins(2) + [{"device_id": "POISON", "status": "online", "message": "",
+                            "last_seen": 1010, "seq": 7, "idempotency_key": "k-7"}]
+    for i in batch:
+        dedup.record(i["device_id"], i["seq"], i.get("idempotency_key"), now=1010)
+
+    def forget(items):
+        for i in items:
+            dedup.forget(i["device_id"], i.get("seq"), i.get("idempotency_key"))
+
+    queue = IngestQueue(FakePool(), now_fn=lambda: 2000, on_dropped=forget)
+    queue._flush(batch)
+
+    metrics = queue.metrics()
+    assert metrics["written"] == 2 and metrics["dropped"] == 1 and metrics["retries"] == 0
+    # Retry gateway untuk item yang dibuang tidak dijawab "duplicate"
+    assert dedup.check("POISON", 7, "k-7", now=1020) is None
+    assert dedup.check("BED-1", 1, now=1020).reason == "duplicate"
+
+
+def test_pool_timeout_during_split_requeues_the_rest(monkeypatch):
+    def write_checkins(conn, items, now, **kwargs):
+        if len(items) > 1:
+            raise psycopg2.IntegrityError("duplicate key")
+        if items[0]["device_id"] == "BED-1":
+            raise PoolTimeout("Tidak ada koneksi bebas")
+        return {}, []
+
+    monkeypatch.setattr(ingest, "write_checkins", write_checkins)
+    queue = IngestQueue(FakePool(), now_fn=lambda: 2000)
+    batch = checkins(3)
+    queue._flush(batch)
+
+    assert [i["device_id"] for i in queue._items] == ["BED-1", "BED-2"]
+    assert queue.metrics()["written"] == 1 and queue.metrics()["dropped"] == 0
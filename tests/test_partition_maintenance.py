@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+
+import partition_maintenance as pm
+
+DAY = 86400
+
+
+def history(cursor, device_id):
+    cursor.execute("SELECT id, timestamp, status, message FROM device_history "
+                   "WHERE device_id = %s ORDER BY timestamp", (device_id,))
+    return cursor.fetchall()
+
+
+def test_retention_keeps_the_open_run_of_a_quiet_device(api):
+    now = int(datetime.now(pm.LOCAL_TZ).timestamp())
+    with api.db_pool.connection() as conn:
+        cursor = conn.cursor()
+        pm.ensure_partitions(cursor, ahead=0, since=datetime.now(pm.LOCAL_TZ) - timedelta(days=95))
+        cursor.execute("""
+            INSERT INTO device_history (device_id, timestamp, status, message, last_seen)
+            VALUES ('RET-QUIET-1', %(old)s, 'online', 'System OK', %(old)s + 60),
+                   ('RET-ACTIVE-1', %(old)s, 'error', 'Sensor Error 502', %(old)s),
+                   ('RET-ACTIVE-1', %(recent)s, 'online', 'System OK', %(recent)s)
+        """, {"old": now - 94 * DAY, "recent": now - DAY})
+        (open_run_id, _, _, _), = history(cursor, 'RET-QUIET-1')
+
+        expired = pm.apply_retention(cursor, 90)
+        conn.commit()
+
+        assert expired
+        (run_id, ts, status, message), = history(cursor, 'RET-QUIET-1')
+        lower = min(lo for _, lo, _ in pm.list_partitions(cursor))
+        assert (run_id, ts, status, message) == (open_run_id, lower, 'online', 'System OK')
+        # Device yang punya run lebih baru tidak dibawa
+        assert [row[2] for row in history(cursor, 'RET-ACTIVE-1')] == ['online']
+        conn.commit()
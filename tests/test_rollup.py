@@ -0,0 +1,83 @@
+"""device_rollup_totals harus sama dengan perhitungan mentah, termasuk di tepi retensi."""
+import pytest
+
+import rollup
+
+DAY, HOUR = 86400, 3600
+
+
+def bucket(ts, size):
+    return ts - ((ts + 25200) % size)    # sama dengan rollup_bucket() (WIB)
+
+
+D0 = bucket(1_600_000_000, DAY)
+# (timestamp, status) ROLLUP-1; ROLLUP-IDLE hanya punya satu baris sebelum D0
+HISTORY = [(D0 - 500, "online"), (D0 + DAY + 3017, "error"), (D0 + DAY + 5 * HOUR + 30, "online"),
+           (D0 + 2 * DAY + 50, "offline"), (D0 + 2 * DAY + 4000, "online"),
+           (D0 + 2 * DAY + 4010, "online")]
+
+
+@pytest.fixture
+def rolled(api):
+    """Rollup 3 hari pertama; semuanya di-rollback di akhir test (watermark bersifat global)."""
+    with api.db_pool.connection() as conn:
+        cursor = conn.cursor()
+        rollup.ensure_rollup_schema(conn)
+        cursor.execute("""
+            INSERT INTO devices (device_id, last_seen, status, message)
+            VALUES ('ROLLUP-1', 0, 'online', ''), ('ROLLUP-IDLE', 0, 'online', '')
+        """)
+        rows = [("ROLLUP-1", ts, status) for ts, status in HISTORY] + [("ROLLUP-IDLE", D0 - 900, "online")]
+        for device_id, ts, status in rows:
+            cursor.execute("INSERT INTO device_history (device_id, timestamp, status, message, last_seen) "
+                           "VALUES (%s, %s, %s, '', %s)", (device_id, ts, status, ts))
+        for granularity in rollup.GRANULARITIES:
+            cursor.execute("SELECT refresh_device_rollup(%s, %s, %s)", (granularity, D0 + 3 * DAY - 100, D0))
+        yield cursor
+        conn.rollback()
+
+
+def totals(cursor, start, end):
+    cursor.execute("SELECT online_seconds, error_seconds, offline_seconds, transitions "
+                   "FROM device_rollup_totals(%s, %s, 'ROLLUP-1')", (start, end))
+    return cursor.fetchone()
+
+
+def expected(start, end):
+    """Detik per status dan transisi langsung dari HISTORY."""
+    seconds = {"online": 0, "error": 0, "offline": 0}
+    for (ts, status), (next_ts, _) in zip(HISTORY, HISTORY[1:] + [(end, None)]):
+        seconds[status] += max(0, min(next_ts, end) - max(ts, start))
+    transitions = sum(1 for (ts, status), (_, prev) in zip(HISTORY[1:], HISTORY)
+                      if start <= ts < end and status != prev)
+    return seconds["online"], seconds["error"], seconds["offline"], transitions
+
+
+@pytest.mark.parametrize("start, end", [
+    (D0 + 2 * HOUR + 17 * 60, D0 + 2 * DAY + 7 * HOUR + 45 * 60),   # tepi menit di dalam retensi
+    (D0 + 7 * 60, D0 + 3 * DAY + 1000),                                # lewat watermark
+    (D0 + DAY + 3017, D0 + DAY + 3018 + 60),                           # < 1 menit di sekitar transisi
+])
+def test_totals_match_raw_spans(rolled, start, end):
+    assert totals(rolled, start, end) == expected(start, end)
+
+
+def test_edges_older_than_rollup_retention_are_not_lost(rolled):
+    start, end = D0 + 3 * HOUR + 12 * 60, D0 + 2 * DAY + 7 * HOUR
+    # Seperti refresh_rollups: rollup menit dan jam lama dibuang, retained_from ikut naik
+    rolled.execute("DELETE FROM device_rollup_minute")
+    rolled.execute("DELETE FROM device_rollup_hour WHERE bucket_start < %s", (D0 + DAY + 2 * HOUR,))
+    rolled.execute("UPDATE rollup_watermarks SET retained_from = %s WHERE granularity = 'minute'",
+                   (D0 + 3 * DAY,))
+    rolled.execute("UPDATE rollup_watermarks SET retained_from = %s WHERE granularity = 'hour'",
+                   (D0 + DAY + 2 * HOUR,))
+    assert totals(rolled, start, end) == expected(start, end)
+
+
+def test_minute_rollup_only_keeps_active_minutes(rolled):
+    rolled.execute("SELECT device_id, COUNT(*) FROM device_rollup_minute "
+                   "WHERE device_id LIKE 'ROLLUP-%%' GROUP BY 1")
+    minutes = {bucket(ts, 60) for ts, _ in HISTORY if ts >= D0}
+    assert dict(rolled.fetchall()) == {"ROLLUP-1": len(minutes)}
+    rolled.execute("SELECT COUNT(*) FROM device_rollup_hour WHERE device_id = 'ROLLUP-IDLE'")
+    assert rolled.fetchone()[0] == 3 * 24 - 1
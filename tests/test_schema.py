@@ -0,0 +1,48 @@
+import os
+
+import rollup
+import status_spans
+import uptime
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "src", "database_schema.sql")
+
+
+def schema_text():
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_schema_file_contains_rollup_ddl_verbatim():
+    assert rollup.ROLLUP_DDL.strip() in schema_text()
+
+
+def test_schema_file_contains_generated_spans_function():
+    assert status_spans.SPANS_FUNCTION_DDL.strip() in schema_text()
+
+
+def test_spans_function_matches_spans_sql(api):
+    with api.db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(status_spans.SPANS_FUNCTION_DDL)
+        cursor.execute("""
+            INSERT INTO devices (device_id, last_seen, status, message)
+            VALUES ('SCHEMA-SPAN-1', 1300, 'online', 'System OK')
+            ON CONFLICT (device_id) DO NOTHING
+        """)
+        cursor.execute("""
+            INSERT INTO device_history (device_id, timestamp, status, message, last_seen)
+            VALUES ('SCHEMA-SPAN-1', 900, 'online', 'System OK', 900),
+                   ('SCHEMA-SPAN-1', 1100, 'error', 'Sensor Error 502', 1100),
+                   ('SCHEMA-SPAN-1', 1300, 'online', 'System OK', 1300)
+        """)
+        params = {"start": 1000, "end": 2000, "device_id": "SCHEMA-SPAN-1"}
+        cursor.execute(uptime.SPANS_SQL + " ORDER BY span_start", params)
+        expected = cursor.fetchall()
+        cursor.execute("SELECT * FROM device_status_spans(%(start)s, %(end)s, %(device_id)s) "
+                       "ORDER BY span_start", params)
+        assert cursor.fetchall() == expected == [
+            ('SCHEMA-SPAN-1', 'online', 1000, 1100),
+            ('SCHEMA-SPAN-1', 'error', 1100, 1300),
+            ('SCHEMA-SPAN-1', 'online', 1300, 2000),
+        ]
+        conn.rollback()
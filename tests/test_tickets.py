@@ -0,0 +1,49 @@
+"""ticket_id unik walau banyak device berakhiran sama membuka ticket di detik yang sama."""
+import ingest
+from staleness import StalenessWatchdog
+
+# Seperti fleet simulator: 4 karakter terakhir adalah nama ruangan
+FLEET = ["SIM-PUMP-000001-ICU", "SIM-PUMP-000002-ICU", "SIM-VENT-000003-ICU"]
+
+
+def active_tickets(api, device_ids):
+    with api.db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT device_id, ticket_id FROM tickets "
+                       "WHERE is_active = TRUE AND device_id = ANY(%s)", (device_ids,))
+        rows = dict(cursor.fetchall())
+        conn.commit()
+    return rows
+
+
+def test_batches_in_the_same_second_get_distinct_ticket_ids(api):
+    devices = [f"BATCH-{d}" for d in FLEET]
+    with api.db_pool.connection() as conn:
+        for device_id in devices:     # satu batch per device: bentrok lintas batch
+            created, _ = ingest.write_checkins(conn, [{
+                "device_id": device_id, "status": "error", "message": "Sensor Error 502",
+                "last_seen": 7000}], 7000)
+            conn.commit()
+            assert list(created) == [device_id]
+    tickets = active_tickets(api, devices)
+    assert sorted(tickets) == sorted(devices)
+    assert len(set(tickets.values())) == len(devices)
+
+
+def test_watchdog_tick_flips_devices_sharing_a_suffix(api, monkeypatch):
+    t0 = api.local_timestamp()
+    monkeypatch.setattr(api, "local_timestamp", lambda: t0)
+    devices = [f"WD-{d}" for d in FLEET]
+    client = api.app.test_client()
+    for device_id in devices:
+        assert client.post("/api/v1/checkin", json={"device_id": device_id, "status": "online",
+                                                    "message": "System OK"}).status_code == 200
+
+    watchdog = StalenessWatchdog(timeouts={}, default_timeout=60)
+    watchdog.touch_many((device_id, t0, "online") for device_id in devices)
+    with api.db_pool.connection() as conn:
+        marked = watchdog.check(conn, api.mark_device_offline, now=t0 + 120)
+
+    assert sorted(marked) == sorted(devices)
+    tickets = active_tickets(api, devices)
+    assert len(set(tickets.values())) == len(devices)
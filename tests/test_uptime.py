@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pandas as pd
+
+import uptime
+
+HOUR = 3600
+
+
+def ts(*args):
+    return int(datetime(*args, tzinfo=uptime.LOCAL_TZ).timestamp())
+
+
+def history(rows):
+    return pd.DataFrame(rows, columns=["device_id", "timestamp", "status"])
+
+
+def test_spans_start_from_the_row_before_the_window_and_stop_at_end():
+    start, end = 1000, 2000
+    spans = uptime.spans_from_history(history([
+        ("A", 400, "error"),      # sebelum jendela: status awal
+        ("A", 1500, "online"),
+        ("A", 2500, "offline"),   # setelah jendela: diabaikan
+        ("B", 1200, "online"),
+    ]), start, end)
+    assert spans.to_dict("records") == [
+        {"device_id": "A", "status": "error", "span_start": 1000, "span_end": 1500},
+        {"device_id": "A", "status": "online", "span_start": 1500, "span_end": 2000},
+        {"device_id": "B", "status": "online", "span_start": 1200, "span_end": 2000},
+    ]
+
+
+def test_status_seconds_groups_by_callable():
+    spans = uptime.spans_from_history(history([
+        ("PUMP-1", 0, "online"), ("PUMP-1", 600, "error"),
+        ("PUMP-2", 0, "offline"),
+        ("VENT-1", 0, "online"),
+    ]), 0, 1000)
+    table = uptime.status_seconds(spans, 0, 1000, by=lambda device_id: device_id.split("-")[0])
+    assert table.loc["PUMP"].to_dict() == {"online": 600, "error": 400, "offline": 1000}
+    assert table.loc["VENT"].to_dict() == {"online": 1000, "error": 0, "offline": 0}
+    assert uptime.availability(table).loc["PUMP", "uptime_pct"] == 30.0
+
+
+def test_night_shift_crosses_midnight():
+    start, end = ts(2026, 3, 1, 20), ts(2026, 3, 2, 8)
+    spans = uptime.spans_from_history(history([
+        ("BED-1", start, "online"),
+        ("BED-1", ts(2026, 3, 1, 23), "offline"),
+        ("BED-1", ts(2026, 3, 2, 1), "online"),
+    ]), start, end)
+    table = uptime.status_seconds_by_shift(spans, start, end)
+    # Malam 1 Mar 21:00 - 2 Mar 07:00 dihitung sebagai satu shift lintas tengah malam
+    assert table.loc[("BED-1", "Malam")].to_dict() == {"online": 8 * HOUR, "error": 0, "offline": 2 * HOUR}
+    assert table.loc[("BED-1", "Siang")].to_dict() == {"online": HOUR, "error": 0, "offline": 0}
+    assert table.loc[("BED-1", "Pagi")].to_dict() == {"online": HOUR, "error": 0, "offline": 0}
+    assert table.values.sum() == end - start